@@ -0,0 +1,742 @@
+import argparse
+import random
+import sys
+import time
+from collections import Counter, deque
+
+# =================== CPU OPPONENT ===================
+# Компьютерный противник: перебирает короткие варианты будущего боя
+# (удар рукой/ногой, удар на бегу, блок/парирование, дэш, прыжок,
+# сближение, отход, ожидание) на упрощённой модели правил Player /
+# check_attack.
+# Поиск — итеративное углубление в генераторе, который продолжается
+# с того же места в следующем кадре, поэтому за кадр тратится не больше
+# budget_ms, даже если весь перебор занимает несколько кадров.
+
+# «strike» первым: при равной оценке (противник далеко или ходы ведут в
+# одну позицию) выбирается он — его удар подстраивается под противника
+# каждый кадр, а не держится, как шаг, весь ход
+ACTIONS = ["strike", "wait", "approach", "step", "retreat", "backstep", "punch", "kick", "block", "dash",
+           "jump"]
+
+# «step»/«backstep» — короткий шаг к противнику или от него:
+# разворот и точная подстройка дистанции
+STEP_FRAMES = 2
+MOVE_ACTIONS = ["wait", "approach", "step", "retreat", "backstep"]
+
+# Глубже первого хода перебор уже: удар ногой отличается от удара рукой
+# только отбрасыванием, короткие шаги заменяет «подойти и ударить», а на
+# последнем ходу остаётся только то, что меняет исход удара
+INNER_ACTIONS = ["wait", "approach", "retreat", "strike", "punch", "block", "dash", "jump"]
+LEAF_ACTIONS = ["wait", "retreat", "strike", "punch", "block"]
+
+# Расстояние перед собой, на котором удар достаёт противника, и разброс,
+# при котором ещё достаёт (полширины удара и тела противника)
+STRIKE_DISTANCE = 45
+STRIKE_REACH = 25
+# Удар проверяется через столько кадров после нажатия (attack_timer 10 -> 5)
+STRIKE_FRAMES = 5
+
+DIFFICULTY_LEVELS = {
+    "easy": {"depth": 2, "reaction": 25, "budget_ms": 0.5},
+    "normal": {"depth": 2, "reaction": 12, "budget_ms": 1.0},
+    "hard": {"depth": 3, "reaction": 5, "budget_ms": 2.5},
+}
+
+# Сколько кадров удерживается выбранное действие в модели
+PLY_FRAMES = 6
+
+# Решение ждёт, пока перебор дойдёт до глубины уровня. Сколько кадров он
+# занял в прошлый раз, на столько вперёд и ищется следующее решение (не
+# меньше PLY_FRAMES); если и за MAX_THINK_FRAMES не успел, берётся лучший
+# ход меньшей глубины
+MAX_THINK_FRAMES = 3 * PLY_FRAMES
+
+# Ответы противника на первом ходу учитываются с весами (ожидание),
+# веса — наблюдаемая частота его ударов и блоков. Без этого модель
+# считает, что противник просто стоит на месте
+OPPONENT_REPLIES = ["wait", "punch", "block"]
+REPLY_PRIOR = {"punch": 0.02, "block": 0.01}
+REPLY_SMOOTHING = 1 / 120
+# Более редкие ответы не перебираются: каждый — целое поддерево
+REPLY_MIN_WEIGHT = 0.1
+
+WIN_SCORE = 1000
+# Урон удара без комбо (base_damage в FightScene.check_attack)
+PUNCH_DAMAGE = 7
+
+# Доля оценки промежуточной позиции в значении хода: без неё удар сейчас
+# и тот же удар ходом позже оцениваются одинаково, и ИИ тянет время
+EARLY_GAIN = 0.3
+
+
+class FighterModel:
+    # Снимок бойца для перебора. Копируется сотни раз за кадр, поэтому
+    # поля лежат в обычном __dict__ — так копия дешевле всего
+    @classmethod
+    def from_player(cls, p):
+        f = cls()
+        f.x = p.center_x
+        f.y = p.center_y
+        f.vx = p.change_x
+        f.vy = p.change_y
+        f.half_w = p.width / 2
+        f.half_h = p.height / 2
+        f.on_ground = p.on_ground
+        f.facing = 1 if p.facing_right else -1
+        f.state = p.state
+        f.attacking = p.attacking
+        f.attack_timer = p.attack_timer
+        f.attack_type = p.attack_type
+        f.hit_stun = p.hit_stun_timer
+        f.health = p.health
+        f.blocking = p.blocking
+        f.block_timer = p.block_timer
+        f.block_cooldown = p.block_cooldown
+        f.parry = p.parry_window
+        f.stunned = p.stunned
+        f.stun_timer = p.stun_timer
+        f.dashing = p.dashing
+        f.dash_timer = p.dash_timer
+        f.dash_cooldown = p.dash_cooldown
+        f.dash_invulnerable = p.dash_invulnerable
+        f.sliding = p.sliding
+        f.slide_timer = p.slide_timer
+        f.slide_dir = p.slide_direction
+        f.combo = p.combo_counter
+        f.combo_timer = p.combo_timer
+        if p.walking_left:
+            f.move = -1
+        elif p.walking_right:
+            f.move = 1
+        else:
+            f.move = 0
+        f.move_frames = -1
+        f.plan = None
+
+        # Хитбокс спрайта (по альфа-каналу текущего кадра) относительно
+        # центра и направления взгляда; в модели он не меняется
+        points = p.hit_box.get_adjusted_points()
+        xs = [(x - p.center_x) * f.facing for x, _ in points]
+        ys = [y - p.center_y for _, y in points]
+        f.hb_front = max(xs)
+        f.hb_back = -min(xs)
+        f.hb_bottom = -min(ys)
+        f.hb_top = max(ys)
+        return f
+
+    def copy(self):
+        f = FighterModel.__new__(FighterModel)
+        f.__dict__.update(self.__dict__)
+        return f
+
+
+class FightModel:
+    # Константы читаются из модуля с правилами при каждом новом поиске,
+    # чтобы модель видела те же значения, что и игра
+    def __init__(self, rules):
+        self.gravity = rules.GRAVITY
+        self.player_speed = rules.PLAYER_SPEED
+        self.jump_speed = rules.JUMP_SPEED
+        self.dash_speed = rules.DASH_SPEED
+        self.dash_duration = rules.DASH_DURATION
+        self.dash_cooldown = rules.DASH_COOLDOWN
+        self.ground_y = rules.GROUND_Y
+        self.level_left = rules.LEVEL_LEFT
+        self.level_right = rules.LEVEL_RIGHT
+        self.block_duration = rules.BLOCK_DURATION
+        self.block_cooldown = rules.BLOCK_COOLDOWN
+        self.parry_window = rules.PARRY_WINDOW
+        self.stun_duration = rules.STUN_DURATION
+        self.slide_duration = rules.SLIDE_DURATION
+        self.combo_timer_max = rules.COMBO_TIMER_MAX
+        self.forward_move = rules.PUNCH_FORWARD_MOVE
+        self.knockback = {
+            "punch": (rules.PUNCH_KNOCKBACK_X, rules.PUNCH_KNOCKBACK_Y),
+            "kick": (rules.KICK_KNOCKBACK_X, rules.KICK_KNOCKBACK_Y),
+        }
+
+    # ---------- действия (как player_action / Player.*) ----------
+    # Удары, блок, прыжок и дэш не отпускают направление — как игрок,
+    # который держит стрелку и жмёт удар. Возвращает False, если действие
+    # ничего не изменило (удар во время удара, дэш на перезарядке и т.п.)
+    def apply_action(self, f, action, target):
+        if action == "strike":
+            if f.plan == "strike":
+                return False
+            f.plan = "strike"
+            return True
+        # Любое другое действие отменяет «подойти и ударить»
+        planned = f.plan
+        f.plan = None
+        if action in MOVE_ACTIONS:
+            before = (f.move, f.move_frames)
+            f.move = 0
+            f.move_frames = -1
+            if action in ("approach", "step"):
+                f.move = 1 if target.x > f.x else -1
+            elif action in ("retreat", "backstep"):
+                f.move = -1 if target.x > f.x else 1
+            if action in ("step", "backstep"):
+                f.move_frames = STEP_FRAMES
+            return (f.move, f.move_frames) != before or planned is not None
+
+        if action == "jump":
+            if f.on_ground and f.state not in ("fatality", "dead", "slide"):
+                f.vy = self.jump_speed
+                f.state = "jump"
+                return True
+        elif action in ("punch", "kick"):
+            if f.state not in ("hit", "fatality", "dead", "dash", "block", "slide", "stunned"):
+                f.attacking = True
+                f.attack_timer = 10
+                f.attack_type = action
+                f.state = "attack"
+                return True
+        elif action == "block":
+            if (f.state not in ("hit", "fatality", "dead", "dash", "slide", "attack") and
+                    f.block_cooldown <= 0 and not f.stunned):
+                f.blocking = True
+                f.block_timer = self.block_duration
+                f.state = "block"
+                f.parry = True
+                return True
+        elif action == "dash":
+            if (f.state not in ("hit", "fatality", "dead", "slide") and
+                    f.dash_cooldown <= 0 and f.on_ground):
+                f.dashing = True
+                f.dash_timer = self.dash_duration
+                f.dash_cooldown = self.dash_cooldown
+                f.dash_invulnerable = True
+                f.state = "dash"
+                f.vx = f.facing * self.dash_speed
+                return True
+        return planned is not None
+
+    # ---------- «подойти и ударить» (так же ведёт бойца CpuOpponent) ----------
+    # Удар на бегу: боец бежит к цели и бьёт, когда удар достанет её через
+    # STRIKE_FRAMES кадров. Если цель слишком близко, боец сначала отходит
+    # (у стены — пробегает сквозь цель). Ходы по PLY_FRAMES кадров сами по
+    # себе слишком грубые: за ход боец пробегает больше, чем окно удара
+    def strike_plan(self, f, t):
+        dx = t.x + t.vx * STRIKE_FRAMES - f.x
+        toward = 1 if dx > 0 else -1
+        gap = abs(dx) - STRIKE_FRAMES * self.player_speed - self.forward_move
+        if abs(gap - STRIKE_DISTANCE) <= STRIKE_REACH and abs(t.y - f.y) <= 15:
+            return toward, True
+        if gap < STRIKE_DISTANCE:
+            # Отходить некуда — к другому боку цели
+            left = self.level_left + f.half_w + 30
+            right = self.level_right - f.half_w - 30
+            if left < f.x - toward * self.player_speed < right:
+                return -toward, False
+        return toward, False
+
+    def follow_strike(self, f, t):
+        move, ready = self.strike_plan(f, t)
+        f.move = move
+        f.move_frames = -1
+        if ready:
+            self.apply_action(f, "punch", t)
+
+    # ---------- один кадр (как update_fight) ----------
+    def step_fighter(self, f):
+        if f.state == "dead":
+            return
+
+        if f.blocking:
+            f.block_timer -= 1
+            if f.block_timer < self.block_duration - self.parry_window:
+                f.parry = False
+            if f.block_timer <= 0:
+                f.blocking = False
+                f.block_cooldown = self.block_cooldown
+                if f.state == "block":
+                    f.state = "idle"
+        if f.block_cooldown > 0:
+            f.block_cooldown -= 1
+        if f.stunned:
+            f.stun_timer -= 1
+            if f.stun_timer <= 0:
+                f.stunned = False
+                if f.state == "block":
+                    f.state = "idle"
+
+        if f.dashing:
+            f.dash_timer -= 1
+            if f.dash_timer <= 0:
+                f.dashing = False
+                f.dash_invulnerable = False
+                f.vx = 0
+                if f.state == "dash":
+                    f.state = "idle"
+        if f.dash_cooldown > 0:
+            f.dash_cooldown -= 1
+
+        if f.sliding:
+            f.slide_timer -= 1
+            f.vx = f.slide_dir * self.player_speed * (f.slide_timer / self.slide_duration) * 0.8
+            if f.slide_timer <= 0:
+                f.sliding = False
+                f.vx = 0
+                if f.state == "slide":
+                    f.state = "idle"
+
+        f.vy -= self.gravity
+        f.x += f.vx
+        f.y += f.vy
+        f.on_ground = False
+        if f.y <= self.ground_y + f.half_h:
+            f.y = self.ground_y + f.half_h
+            f.vy = 0
+            f.on_ground = True
+
+        left = self.level_left + f.half_w + 30
+        right = self.level_right - f.half_w - 30
+        if f.x < left:
+            f.x = left
+            f.vx = 0
+        if f.x > right:
+            f.x = right
+            f.vx = 0
+
+        if f.attacking:
+            f.attack_timer -= 1
+            if f.attack_timer <= 0:
+                f.attacking = False
+        if f.hit_stun > 0:
+            f.hit_stun -= 1
+            if f.hit_stun == 0 and f.state == "hit":
+                f.state = "idle"
+
+        if f.combo > 0:
+            f.combo_timer -= 1
+            if f.combo_timer <= 0:
+                f.combo = 0
+
+    def step_controls(self, f):
+        if f.move_frames == 0:
+            f.move = 0
+        f.move_frames -= 1
+        if f.state in ("hit", "fatality", "dead", "dash", "slide", "stunned"):
+            return
+        if f.move:
+            f.vx = f.move * self.player_speed
+            f.facing = f.move
+            f.state = "run"
+        elif f.vx != 0 and f.on_ground and not f.sliding:
+            if f.state not in ("hit", "fatality", "dead", "dash"):
+                f.sliding = True
+                f.slide_timer = self.slide_duration
+                f.slide_dir = 1 if f.vx > 0 else -1
+                f.state = "slide"
+                f.vx = f.slide_dir * self.player_speed * 0.8
+        elif not f.sliding:
+            f.vx = 0
+            if f.state == "run":
+                f.state = "idle"
+
+    # ---------- удар (как check_attack / take_hit) ----------
+    def overlaps(self, a, t):
+        hx = a.x + a.facing * 45
+        if t.facing > 0:
+            left, right = t.x - t.hb_back, t.x + t.hb_front
+        else:
+            left, right = t.x - t.hb_front, t.x + t.hb_back
+        return (hx - 20 <= right and hx + 20 >= left and
+                a.y - 15 <= t.y + t.hb_top and a.y + 15 >= t.y - t.hb_bottom)
+
+    def reaches(self, a, t):
+        # Достанет ли a, если повернётся к t и ударит (с выпадом или без)
+        a = a.copy()
+        a.facing = 1 if t.x >= a.x else -1
+        if self.overlaps(a, t):
+            return True
+        a.x += a.facing * self.forward_move
+        return self.overlaps(a, t)
+
+    def check_attack(self, a, t):
+        if not a.attacking:
+            return
+        if a.attack_timer == 8 and not self.overlaps(a, t):
+            new_x = a.x + a.facing * self.forward_move
+            if self.level_left + a.half_w + 30 <= new_x <= self.level_right - a.half_w - 30:
+                a.x = new_x
+        if a.attack_timer == 5 and t.state not in ("fatality", "dead") and self.overlaps(a, t):
+            damage = PUNCH_DAMAGE
+            if a.combo > 1:
+                damage = int(damage * (1.0 + (a.combo - 1) * 0.15))
+
+            if t.dash_invulnerable:
+                result = False
+            elif t.blocking and t.parry:
+                t.block_timer = 0
+                t.block_cooldown = self.block_cooldown
+                t.state = "block"
+                t.hit_stun = 10
+                result = "parry"
+            else:
+                multiplier = 0.5 if t.blocking else 1.0
+                if t.blocking:
+                    t.state = "block"
+                    t.hit_stun = 5
+                t.health -= int(damage * multiplier)
+                t.facing = -a.facing
+                kx, ky = self.knockback[a.attack_type]
+                t.vx = a.facing * kx
+                t.vy = ky
+                if t.health <= 0:
+                    t.health = 0
+                    t.state = "dead"
+                elif not t.blocking:
+                    t.state = "hit"
+                    t.hit_stun = 12
+                result = False
+
+            if result == "parry":
+                a.stunned = True
+                a.stun_timer = self.stun_duration
+                a.state = "block"
+            else:
+                a.combo += 1
+                a.combo_timer = self.combo_timer_max
+            a.attacking = False
+            a.attack_timer = 0
+
+    def step(self, me, opp):
+        if me.plan:
+            self.follow_strike(me, opp)
+        self.step_fighter(me)
+        self.step_fighter(opp)
+        self.check_attack(me, opp)
+        self.check_attack(opp, me)
+        self.step_controls(me)
+        self.step_controls(opp)
+
+
+def evaluate(me, opp):
+    if opp.state == "dead":
+        return WIN_SCORE
+    if me.state == "dead":
+        return -WIN_SCORE
+
+    score = me.health - opp.health
+    if opp.stunned:
+        score += 15
+    if me.stunned:
+        score -= 15
+    # Пока противника отбрасывает после удара, дистанция не в счёт — иначе
+    # отбрасывание «штрафует» сам удар
+    if opp.state == "hit":
+        return score
+
+    # Держимся на дистанции удара, на одной высоте и лицом к противнику.
+    # Штраф за разворот спиной небольшой, иначе прижатый к стене противник
+    # «не пускает» отойти на нужную дистанцию
+    dx = opp.x - me.x
+    score -= abs(abs(dx) - STRIKE_DISTANCE) * 0.05
+    score -= abs(opp.y - me.y) * 0.05
+    if dx * me.facing < 0:
+        score -= 2
+    return score
+
+
+class CpuOpponent:
+    def __init__(self, player, opponent, level="normal"):
+        self.player = player
+        self.opponent = opponent
+        self.set_level(level)
+
+        # Модуль с правилами (main или __main__), откуда взят класс Player
+        self.rules = sys.modules[type(player).__module__]
+
+        self.held = set()
+        self.hold_frames = 0
+        self.reply_rates = dict(REPLY_PRIOR)
+        self.seen_attacking = False
+        self.seen_blocking = False
+        self.action = "wait"
+        self.striking = False
+        self.model = FightModel(self.rules)
+        self.frame = 0
+        self.search = None
+        self.search_started = 0
+        self.lookahead = PLY_FRAMES
+        self.best_action = None
+        self.completed_depth = 0
+        # Глубина перебора у принятых решений: {глубина: сколько решений}
+        self.decisions = Counter()
+        self.threat = 0.0
+        self.think_time = 0.0
+
+    def set_level(self, level):
+        params = DIFFICULTY_LEVELS[level]
+        self.level = level
+        self.depth = params["depth"]
+        self.reaction = params["reaction"]
+        self.budget = params["budget_ms"] / 1000
+        self.perceived = deque(maxlen=self.reaction + 1)
+
+    def update(self, fight):
+        self.frame += 1
+        start = time.perf_counter()
+        self.observe()
+        self.perceived.append(FighterModel.from_player(self.opponent))
+
+        if self.hold_frames > 0:
+            self.hold_frames -= 1
+            if self.hold_frames == 0:
+                self.held.clear()
+        if self.striking:
+            self.follow_strike(fight)
+
+        if self.search is None and self.best_action is None:
+            self.start_search()
+
+        deadline = start + self.budget
+        while self.search is not None and time.perf_counter() < deadline:
+            try:
+                next(self.search)
+            except StopIteration:
+                self.search = None
+
+        # Решение — в тот кадр, от которого шёл перебор, и только после
+        # перебора на полную глубину (или по истечении MAX_THINK_FRAMES)
+        waited = self.frame - self.search_started
+        searched = self.completed_depth == self.depth
+        if searched and self.search is None:
+            self.lookahead = min(max(waited, PLY_FRAMES), MAX_THINK_FRAMES)
+        ready = searched and waited >= self.lookahead or waited >= MAX_THINK_FRAMES
+        if self.best_action is not None and ready:
+            self.decisions[self.completed_depth] += 1
+            self.commit(fight, self.best_action)
+            self.search = None
+            self.best_action = None
+
+        self.think_time = time.perf_counter() - start
+
+    def start_search(self):
+        # Здесь только снимок; модель шагает уже в think, по кусочку в
+        # бюджете кадра
+        me = FighterModel.from_player(self.player)
+        if self.striking:
+            me.plan = "strike"
+        self.search = self.think(me, self.perceived[0].copy(), len(self.perceived) - 1, self.lookahead)
+        self.search_started = self.frame
+        self.best_action = None
+        self.completed_depth = 0
+
+    def think(self, me, opp, reaction, lookahead):
+        model = self.model = FightModel(self.rules)
+
+        # Время реакции: противника видим таким, каким он был reaction
+        # кадров назад, и достраиваем его движение моделью
+        for i in range(reaction):
+            model.step_fighter(opp)
+            model.step_controls(opp)
+            if i % PLY_FRAMES == PLY_FRAMES - 1:
+                yield
+
+        # Решение вступит в силу только через lookahead кадров:
+        # ищем от состояния, в котором окажемся к этому моменту
+        for i in range(lookahead):
+            model.step(me, opp)
+            if i % PLY_FRAMES == PLY_FRAMES - 1:
+                yield
+
+        yield from self.iterative_search((me, opp))
+
+    def reply_weights(self):
+        weights = {}
+        for reply in ["punch", "block"]:
+            weights[reply] = 1 - (1 - self.reply_rates[reply]) ** PLY_FRAMES
+        weights["wait"] = max(0.0, 1 - weights["punch"] - weights["block"])
+        return {reply: w for reply, w in weights.items() if w >= REPLY_MIN_WEIGHT}
+
+    def observe(self):
+        o = self.opponent
+        started = {
+            "punch": o.attacking and not self.seen_attacking,
+            "block": o.blocking and not self.seen_blocking,
+        }
+        for reply, event in started.items():
+            rate = self.reply_rates[reply]
+            self.reply_rates[reply] = rate + REPLY_SMOOTHING * (event - rate)
+        self.seen_attacking = o.attacking
+        self.seen_blocking = o.blocking
+
+    def iterative_search(self, root):
+        weights = self.reply_weights()
+        self.threat = (1 - (1 - self.reply_rates["punch"]) ** PLY_FRAMES) * PUNCH_DAMAGE
+        for depth in range(1, self.depth + 1):
+            best_action = None
+            best_score = None
+            # Как в play: из действий, которые ничего не меняют, считается первое
+            continued = False
+            for action in ACTIONS:
+                if not self.model.apply_action(root[0].copy(), action, root[1]):
+                    if continued:
+                        continue
+                    continued = True
+                score = 0.0
+                for reply, weight in weights.items():
+                    score += weight * (yield from self.value(root, action, depth, reply))
+                if best_score is None or score > best_score:
+                    best_action = action
+                    best_score = score
+            self.best_action = best_action
+            self.completed_depth = depth
+
+    def value(self, state, action, depth, reply="continue"):
+        me = state[0].copy()
+        opp = state[1].copy()
+        self.model.apply_action(me, action, opp)
+        if reply != "continue":
+            self.model.apply_action(opp, reply, me)
+        return (yield from self.play(me, opp, depth))
+
+    def play(self, me, opp, depth):
+        model = self.model
+        for _ in range(PLY_FRAMES):
+            model.step(me, opp)
+            if me.state == "dead" or opp.state == "dead":
+                break
+        yield
+
+        if depth <= 1 or me.state == "dead" or opp.state == "dead":
+            return self.evaluate(me, opp)
+
+        # Действия, которые сейчас ничего не меняют, ведут в одну и ту же
+        # позицию — её достаточно посчитать один раз
+        best = None
+        continued = False
+        for next_action in (LEAF_ACTIONS if depth == 2 else INNER_ACTIONS):
+            next_me = me.copy()
+            next_opp = opp.copy()
+            if not model.apply_action(next_me, next_action, next_opp):
+                if continued:
+                    continue
+                continued = True
+            score = yield from self.play(next_me, next_opp, depth - 1)
+            if best is None or score > best:
+                best = score
+        return (1 - EARLY_GAIN) * best + EARLY_GAIN * self.evaluate(me, opp)
+
+    def evaluate(self, me, opp):
+        # Стоять там, куда противник достаёт ударом, стоит его удара с той
+        # вероятностью, с какой он бьёт за ход
+        score = evaluate(me, opp)
+        if opp.state not in ("dead", "hit") and not opp.stunned and self.model.reaches(opp, me):
+            score -= self.threat
+        return score
+
+    def commit(self, fight, action):
+        if self.action == "block" and action != "block":
+            fight.player_release(self.player, "block")
+        self.striking = action == "strike"
+
+        if action in MOVE_ACTIONS:
+            self.held.clear()
+            self.hold_frames = 0
+        if action in ("approach", "step", "retreat", "backstep"):
+            toward_right = self.opponent.center_x > self.player.center_x
+            if action in ("step", "backstep"):
+                self.hold_frames = STEP_FRAMES
+            if (action in ("approach", "step")) == toward_right:
+                self.held.add("right")
+            else:
+                self.held.add("left")
+        elif action == "strike":
+            self.hold_frames = 0
+            self.follow_strike(fight)
+        elif action != "wait":
+            fight.player_action(self.player, action)
+
+        self.action = action
+
+    def follow_strike(self, fight):
+        # Как FightModel.follow_strike, но клавишами; противник — каким его
+        # видно с задержкой реакции
+        me = FighterModel.from_player(self.player)
+        target = self.perceived[0]
+        move, ready = self.model.strike_plan(me, target)
+        self.held.clear()
+        self.held.add("right" if move > 0 else "left")
+        if ready and self.model.apply_action(me, "punch", target):
+            fight.player_action(self.player, "punch")
+            self.striking = False
+
+
+# =================== SANITY CHECK ===================
+# Бои каждого уровня против агента FightEnv, который стоит на месте
+# (idle) или каждый кадр держит случайную клавишу (random). Нижняя
+# граница доли побед — только там, где она есть: easy и normal видят
+# противника с опозданием в 25 и 12 кадров, и случайные нажатия им не
+# предугадать
+SANITY_AGENTS = ["idle", "random"]
+SANITY_MIN_WIN_RATE = {
+    ("easy", "idle"): 1.0,
+    ("normal", "idle"): 1.0,
+    ("hard", "idle"): 1.0,
+    ("hard", "random"): 0.5,
+}
+# Решений, принятых до полной глубины перебора (по MAX_THINK_FRAMES)
+SANITY_MAX_SHALLOW = 0.05
+
+
+def sanity_fight(level, agent, seed):
+    from fight_env import FightEnv
+
+    env = FightEnv(opponent=level, side=0, seed=seed)
+    env.reset(seed)
+    cpu = env.fight.p2.cpu
+    rng = random.Random(seed)
+    think = []
+    terminated = False
+    while not terminated:
+        action = rng.randrange(env.action_count) if agent == "random" else 0
+        _, _, terminated, _, info = env.step(action)
+        think.append(cpu.think_time)
+    return info["winner"] == 1, cpu.decisions, think
+
+
+def sanity_check(fights):
+    ok = True
+    for level, params in DIFFICULTY_LEVELS.items():
+        for agent in SANITY_AGENTS:
+            wins = 0
+            decisions = Counter()
+            think = []
+            for seed in range(fights):
+                won, fight_decisions, fight_think = sanity_fight(level, agent, seed)
+                wins += won
+                decisions.update(fight_decisions)
+                think.extend(fight_think)
+
+            rate = wins / fights
+            shallow = 1 - decisions[params["depth"]] / max(1, sum(decisions.values()))
+            think.sort()
+            p99 = think[int(len(think) * 0.99)] * 1000
+            print(f"{level:6} против {agent:6}: побед {wins}/{fights}, "
+                  f"решений не на полной глубине {shallow:.0%}, "
+                  f"думает p99 {p99:.2f} мс (бюджет {params['budget_ms']} мс)")
+
+            min_rate = SANITY_MIN_WIN_RATE.get((level, agent))
+            if min_rate is not None and rate < min_rate:
+                print(f"  доля побед {rate:.0%} ниже {min_rate:.0%}")
+                ok = False
+            if shallow > SANITY_MAX_SHALLOW:
+                print(f"  перебор не доходит до глубины {params['depth']}")
+                ok = False
+    return ok
+
+
+def main_cli(argv=None):
+    parser = argparse.ArgumentParser(description="Проверка силы компьютерного противника")
+    parser.add_argument("--fights", type=int, default=8, help="боёв на уровень и агента")
+    args = parser.parse_args(argv)
+    return 0 if sanity_check(args.fights) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
@@ -0,0 +1,132 @@
+import array
+import ctypes
+import struct
+import wave
+
+from pyglet import media
+
+# =================== AUDIO ===================
+# Звук без декодеров pyglet: WAV, которые не читает декодер WAV pyglet
+# (24/32 бит, float, WAVE_FORMAT_EXTENSIBLE), переводятся в 16-битный PCM
+# здесь; музыка по кругу без паузы на стыке — MusicLoop. Модуль не
+# импортирует main.
+
+MUSIC_PREBUFFER_SECONDS = 2.0
+
+
+def audio_bytes(audio):
+    return ctypes.string_at(audio.pointer, audio.length)
+
+
+def plain_wav(path):
+    # Такой WAV читает декодер pyglet (модуль wave)
+    try:
+        with wave.open(path, "rb") as f:
+            return f.getsampwidth() <= 2
+    except (wave.Error, EOFError):
+        return False
+
+
+def read_wav(path):
+    # ((формат, каналы, частота, бит), данные) из RIFF; у
+    # WAVE_FORMAT_EXTENSIBLE формат — из подформата
+    with open(path, "rb") as f:
+        data = f.read()
+    if data[:4] != b"RIFF" or data[8:12] != b"WAVE":
+        raise ValueError(f"{path}: не WAV")
+    fmt = pcm = None
+    pos = 12
+    while pos + 8 <= len(data):
+        chunk, size = data[pos:pos + 4], int.from_bytes(data[pos + 4:pos + 8], "little")
+        body = data[pos + 8:pos + 8 + size]
+        if chunk == b"fmt ":
+            tag, channels, rate, _, _, bits = struct.unpack_from("<HHIIHH", body)
+            if tag == 0xFFFE:
+                tag = struct.unpack_from("<H", body, 24)[0]
+            fmt = (tag, channels, rate, bits)
+        elif chunk == b"data":
+            pcm = body
+        pos += 8 + size + (size & 1)
+    if fmt is None or pcm is None:
+        raise ValueError(f"{path}: нет fmt или data")
+    return fmt, pcm
+
+
+def pcm16(tag, bits, pcm):
+    # Целый PCM — старшие два байта сэмпла, float — масштабом
+    if tag == 1 and bits in (16, 24, 32):
+        step = bits // 8
+        pcm = pcm[:len(pcm) - len(pcm) % step]
+        out = bytearray(len(pcm) // step * 2)
+        out[0::2] = pcm[step - 2::step]
+        out[1::2] = pcm[step - 1::step]
+        return bytes(out)
+    if tag == 1 and bits == 8:
+        out = bytearray(len(pcm) * 2)
+        out[1::2] = pcm.translate(bytes(range(128, 256)) + bytes(range(128)))
+        return bytes(out)
+    if tag == 3 and bits == 32:
+        samples = array.array("f", pcm[:len(pcm) - len(pcm) % 4])
+        return array.array("h", (round(max(-1.0, min(1.0, x)) * 32767) for x in samples)).tobytes()
+    raise ValueError(f"формат WAV {tag}, {bits} бит не поддерживается")
+
+
+class MusicLoop(media.StreamingSource):
+    # Трек по кругу для одного Player. Плееру отдаются сплошные данные, конца
+    # он не видит: на стыке звучит начало из памяти (head), а декодер тем
+    # временем возвращается к началу и проходит ту же длину вхолостую
+    def __init__(self, path, prebuffer=MUSIC_PREBUFFER_SECONDS):
+        self.decoder = media.load(path, streaming=True)
+        self.audio_format = self.decoder.audio_format
+        self.video_format = None
+        self.info = self.decoder.info
+        self.carry = b""
+        self.head = self.read(self.audio_format.align(round(prebuffer * self.audio_format.bytes_per_second)))
+        self.head_pos = 0
+        # Сколько байт декодер должен пройти вхолостую, чтобы стоять за head
+        self.skip = 0
+        self.played = 0
+        self.loops = 0
+
+    def read(self, size):
+        # До size байт из декодера; меньше — трек кончился
+        while len(self.carry) < size:
+            audio = self.decoder.get_audio_data(size - len(self.carry))
+            if audio is None:
+                break
+            self.carry += audio_bytes(audio)
+        data, self.carry = self.carry[:size], self.carry[size:]
+        return data
+
+    def seek(self, timestamp):
+        # Плеер перематывает только к началу
+        self.carry = b""
+        self.decoder.seek(0.0)
+        self.head_pos = 0
+        self.skip = len(self.head)
+
+    def get_audio_data(self, num_bytes, compensation_time=0.0):
+        if not self.head:
+            return None
+        data = bytearray()
+        while len(data) < num_bytes:
+            want = num_bytes - len(data)
+            if self.head_pos < len(self.head):
+                chunk = self.head[self.head_pos:self.head_pos + want]
+                self.head_pos += len(chunk)
+                data += chunk
+                if self.skip:
+                    self.skip -= len(self.read(min(self.skip, len(chunk))))
+                continue
+            chunk = self.read(want)
+            data += chunk
+            if len(chunk) < want:
+                self.seek(0.0)
+                self.loops += 1
+        timestamp = self.played / self.audio_format.bytes_per_second
+        self.played += len(data)
+        return media.codecs.AudioData(bytes(data), len(data), timestamp,
+                                      len(data) / self.audio_format.bytes_per_second)
+
+    def delete(self):
+        self.decoder.delete()
@@ -0,0 +1,840 @@
+import argparse
+import sys
+import time
+
+import numpy as np
+
+import main
+
+# =================== BATCH SIMULATION ===================
+# N независимых боёв в массивах NumPy: один вызов step() продвигает все бои
+# на кадр по тем же правилам, что Player / FightSimulation.update_fight /
+# check_attack. Столкновения считаются тем же методом разделяющих осей, что
+# arcade.check_for_collision. Хитбокс бойца arcade строит один раз, по
+# первой назначенной текстуре (Stand_R_1), и дальше он не меняется ни от
+# анимации, ни от направления взгляда — поэтому кадры анимации здесь не
+# нужны. Звук, частицы, камера и мигание при ударе на бой не влияют и не
+# моделируются.
+# С fixed=True — целочисленная физика main (FIXED-POINT PHYSICS):
+# положение и скорости в int64 долях пикселя, множители правил — целые
+# с делением вниз, хитбоксы — FixedGeometry.
+
+# Управление бойцом — маска зажатых клавиш, бит на действие
+CONTROLS = ["left", "right", "jump", "punch", "kick", "block", "dash"]
+KEY = {name: 1 << i for i, name in enumerate(CONTROLS)}
+PRESS_ORDER = ["jump", "punch", "kick", "block", "dash"]
+
+STATES = ["idle", "run", "jump", "attack", "block", "dash", "slide", "hit", "fatality", "dead"]
+IDLE, RUN, JUMP, ATTACK, BLOCK, DASH, SLIDE, HIT, FATALITY, DEAD = range(len(STATES))
+ATTACK_TYPES = [None, "punch", "kick"]
+PUNCH, KICK = 1, 2
+
+# Поле массива -> атрибут Player
+PLAYER_FIELDS = [
+    ("x", "center_x", np.float64),
+    ("y", "center_y", np.float64),
+    ("vx", "change_x", np.float64),
+    ("vy", "change_y", np.float64),
+    ("facing_right", "facing_right", np.bool_),
+    ("on_ground", "on_ground", np.bool_),
+    ("state", "state", np.int8),
+    ("health", "health", np.int32),
+    ("attacking", "attacking", np.bool_),
+    ("attack_timer", "attack_timer", np.int32),
+    ("attack_type", "attack_type", np.int8),
+    ("attack_index", "attack_index", np.int32),
+    ("hit_stun", "hit_stun_timer", np.int32),
+    ("blocking", "blocking", np.bool_),
+    ("block_timer", "block_timer", np.int32),
+    ("block_cooldown", "block_cooldown", np.int32),
+    ("parry", "parry_window", np.bool_),
+    ("stunned", "stunned", np.bool_),
+    ("stun_timer", "stun_timer", np.int32),
+    ("dashing", "dashing", np.bool_),
+    ("dash_timer", "dash_timer", np.int32),
+    ("dash_cooldown", "dash_cooldown", np.int32),
+    ("dash_invulnerable", "dash_invulnerable", np.bool_),
+    ("sliding", "sliding", np.bool_),
+    ("slide_timer", "slide_timer", np.int32),
+    ("slide_dir", "slide_direction", np.float64),
+    ("combo", "combo_counter", np.int32),
+    ("combo_timer", "combo_timer", np.int32),
+    ("walking_left", "walking_left", np.bool_),
+    ("walking_right", "walking_right", np.bool_),
+    ("fatality_phase", "fatality_phase", np.int32),
+    ("fatality_timer", "fatality_timer", np.int32),
+    ("bounce_count", "bounce_count", np.int32),
+    ("fatality_bounce_timer", "fatality_ground_bounce_timer", np.int32),
+    ("fatality_vy", "fatality_velocity_y", np.float64),
+    ("stats_hits", "stats_hits", np.int32),
+    ("stats_combos", "stats_combos", np.int32),
+]
+
+# Поля, которые в целочисленном режиме берутся из sub_* бойца
+FIXED_FIELDS = {
+    "x": "sub_x",
+    "y": "sub_y",
+    "vx": "sub_vx",
+    "vy": "sub_vy",
+    "fatality_vy": "sub_fall_vy",
+}
+
+FIGHT_FIELDS = [
+    ("hit_stop", np.int32),
+    ("slow_motion", np.int32),
+    ("round_time_left", np.int32),
+    ("round_frame_timer", np.int32),
+    ("frame", np.int64),
+]
+
+
+def player_fields(fixed=False):
+    if not fixed:
+        return PLAYER_FIELDS
+    return [(name, FIXED_FIELDS[name], np.int64) if name in FIXED_FIELDS else (name, attr, dtype)
+            for name, attr, dtype in PLAYER_FIELDS]
+
+
+# =================== GEOMETRY ===================
+def polygons_intersect(a, b):
+    # Как arcade.geometry.are_polygons_intersecting, но для M пар сразу:
+    # a, b — (M, K, 2) точки хитбоксов. Порядок операций тот же, что в
+    # arcade, поэтому результат совпадает и на границе
+    result = np.ones(len(a), dtype=bool)
+    for poly in (a, b):
+        nxt = np.roll(poly, -1, axis=1)
+        n0 = (nxt[..., 1] - poly[..., 1])[:, :, None]
+        n1 = (poly[..., 0] - nxt[..., 0])[:, :, None]
+        proj_a = n0 * a[:, None, :, 0] + n1 * a[:, None, :, 1]
+        proj_b = n0 * b[:, None, :, 0] + n1 * b[:, None, :, 1]
+        separated = ((proj_a.max(axis=2) <= proj_b.min(axis=2)) |
+                     (proj_b.max(axis=2) <= proj_a.min(axis=2)))
+        result &= ~separated.any(axis=1)
+    return result
+
+
+def sprite_polygon(sprite):
+    points = np.array(sprite.hit_box.get_adjusted_points(), dtype=np.float64)
+    return {
+        "points": points,
+        "left": sprite.left,
+        "right": sprite.right,
+        "bottom": sprite.bottom,
+        "top": sprite.top,
+        "center_x": sprite.center_x,
+    }
+
+
+def local_polygon(sprite):
+    # Точки хитбокса относительно центра, уже умноженные на масштаб —
+    # в том же порядке операций, что HitBox.get_adjusted_points
+    scale_x, scale_y = sprite.hit_box.scale
+    return np.array([(x * scale_x, y * scale_y) for x, y in sprite.hit_box.points], dtype=np.float64)
+
+
+# =================== BATCH FIGHT ===================
+class BatchFight:
+    def __init__(self, n, level="main", template=None, fixed=False):
+        self.n = n
+        self.fixed = fixed
+        self.fields = player_fields(fixed)
+        self.template = template or main.HeadlessFight(level, fixed=fixed)
+        self.settings_slowmo = self.template.settings_slowmo
+
+        if fixed:
+            geometry = self.template.fixed_geometry
+            self.platforms = [dict(s, points=np.array(s["points"])) for s in geometry.platforms]
+            self.walls = [dict(s, points=np.array(s["points"])) for s in geometry.walls]
+            self.attack_box = np.array(geometry.attack_box)
+            self.body = np.array(geometry.body)
+        else:
+            self.platforms = [sprite_polygon(s) for s in self.template.platforms]
+            self.walls = [sprite_polygon(s) for s in self.template.border_sprites]
+            self.attack_box = local_polygon(main.arcade.SpriteSolidColor(40, 30))
+            self.body = local_polygon(self.template.p1)
+
+        p = self.template.p1
+        self.body_left = self.body[:, 0].min()
+        self.body_right = self.body[:, 0].max()
+        self.body_bottom = self.body[:, 1].min()
+        self.body_top = self.body[:, 1].max()
+
+        self.max_health = p.max_health
+        self.half_h = self.fx(p.height / 2)
+        self.ground = self.fx(main.GROUND_Y + p.height / 2)
+        self.clamp_left = self.fx(main.LEVEL_LEFT + p.width / 2 + 30)
+        self.clamp_right = self.fx(main.LEVEL_RIGHT - p.width / 2 - 30)
+
+        for name, _, dtype in self.fields:
+            setattr(self, name, np.zeros((n, 2), dtype=dtype))
+        for name, dtype in FIGHT_FIELDS:
+            setattr(self, name, np.zeros(n, dtype=dtype))
+        self.fighting = np.zeros(n, dtype=bool)
+        self.winner = np.full(n, -1, dtype=np.int8)
+        self.held = np.zeros((n, 2), dtype=np.uint8)
+
+        # Как Player.__init__: то, что reset_for_round не трогает
+        self.facing_right[:] = True
+        self.reset()
+
+    # ---------- единицы ----------
+    def fx(self, value):
+        # Значение правил в единицах полей: пиксели или доли пикселя, как
+        # main.to_fixed (rint тоже округляет к чётному)
+        if not self.fixed:
+            return value
+        return np.rint(np.multiply(value, main.SUBPIXEL)).astype(np.int64)
+
+    def mul(self, value, factor):
+        # Как main.fixed_mul в целочисленном режиме
+        if not self.fixed:
+            return value * factor
+        return value * self.fx(factor) // main.SUBPIXEL
+
+    # ---------- состояние ----------
+    def reset(self, mask=None):
+        # Как HeadlessFight.reset + Player.reset_for_round
+        m = np.ones(self.n, dtype=bool) if mask is None else np.asarray(mask, dtype=bool)
+
+        self.x[m] = (self.fx(200), self.fx(400))
+        self.y[m] = self.ground
+        for name in ("vx", "vy", "attack_timer", "block_timer", "block_cooldown", "dash_timer",
+                     "dash_cooldown", "slide_timer", "stun_timer", "combo", "combo_timer",
+                     "hit_stun", "attack_index", "stats_hits", "stats_combos"):
+            getattr(self, name)[m] = 0
+        for name in ("on_ground", "attacking", "blocking", "dashing", "dash_invulnerable",
+                     "sliding", "stunned"):
+            getattr(self, name)[m] = False
+        self.health[m] = self.max_health
+        self.state[m] = IDLE
+        self.facing_right[m] = True
+
+        self.hit_stop[m] = 0
+        self.slow_motion[m] = 0
+        self.round_time_left[m] = main.ROUND_TIME
+        self.round_frame_timer[m] = 0
+        self.frame[m] = 0
+        self.winner[m] = -1
+        self.fighting[m] = True
+        self.held[m] = 0
+
+    def snapshot(self):
+        names = [name for name, _, _ in self.fields] + [name for name, _ in FIGHT_FIELDS] + \
+            ["fighting", "winner", "held"]
+        return {name: getattr(self, name).copy() for name in names}
+
+    def load_from(self, i, fight):
+        for name, value in read_fight(fight, self.fixed).items():
+            getattr(self, name)[i] = value
+
+    def store_to(self, i, fight, snapshot=None):
+        data = snapshot or self.snapshot()
+        for j, p in enumerate((fight.p1, fight.p2)):
+            for name, attr, _ in self.fields:
+                value = data[name][i, j].item()
+                if name == "state":
+                    value = STATES[value]
+                elif name == "attack_type":
+                    value = ATTACK_TYPES[value]
+                setattr(p, attr, value)
+            if self.fixed:
+                p.sync_fixed()
+        for name, _ in FIGHT_FIELDS:
+            setattr(fight, name, data[name][i].item())
+        fight.state = "FIGHT" if data["fighting"][i] else "RESULTS"
+        fight.winner = [None, fight.p1, fight.p2][data["winner"][i] + 1]
+        fight.keys = {p.controls[action] for j, p in enumerate((fight.p1, fight.p2))
+                      for action, bit in KEY.items() if data["held"][i, j] & bit}
+
+    def diff(self, i, fight):
+        diffs = []
+        for name, value in read_fight(fight, self.fixed).items():
+            mine = getattr(self, name)[i]
+            if np.ndim(value):
+                for j in range(2):
+                    if mine[j] != value[j]:
+                        diffs.append((f"p{j + 1}.{name}", mine[j].item(), value[j]))
+            elif mine != value:
+                diffs.append((name, mine.item(), value))
+        return diffs
+
+    # ---------- шаг ----------
+    def step(self, held):
+        # held — (N, 2) маски зажатых клавиш (биты KEY). Нажатия и
+        # отпускания получаются из разницы с прошлым кадром и применяются
+        # до кадра, как события клавиатуры перед on_update
+        held = np.asarray(held, dtype=np.uint8)
+        pressed = held & ~self.held
+        released = self.held & ~held
+        self.held = held.copy()
+
+        fighting = self.fighting.copy()
+        f2 = fighting[:, None]
+        self.player_release_block(f2 & (released & KEY["block"] != 0))
+        for action in PRESS_ORDER:
+            self.player_action(action, f2 & (pressed & KEY[action] != 0))
+
+        self.frame += fighting
+        self.update_fight(fighting)
+        return self.fighting
+
+    def update_fight(self, active):
+        self.slow_motion -= active & (self.slow_motion > 0)
+        stopped = active & (self.hit_stop > 0)
+        self.hit_stop -= stopped
+        run = active & ~stopped
+
+        self.round_frame_timer += run
+        second = run & (self.round_frame_timer >= 60)
+        self.round_frame_timer[second] = 0
+        self.round_time_left -= second
+        timeout = second & (self.round_time_left <= 0)
+        if timeout.any():
+            h1, h2 = self.health[:, 0], self.health[:, 1]
+            self.end_fight(timeout & (h1 > h2), 0)
+            self.end_fight(timeout & (h2 > h1), 1)
+            self.end_fight(timeout & (h1 == h2), -1)
+
+        slow = 1.0
+        if self.settings_slowmo:
+            slow = np.where(self.slow_motion > 0, 0.5, 1.0)[:, None]
+
+        run2 = run[:, None]
+        falling = run2 & ((self.state == FATALITY) | (self.state == DEAD))
+        if falling.any():
+            self.update_fatality(falling & (self.state == FATALITY))
+            self.update_combo(falling)
+            self.clamp_player_in_level(falling)
+
+        alive = run2 & ~falling
+        self.update_block(alive)
+        self.update_dash(alive)
+        self.update_slide(alive)
+
+        old_y = self.y.copy()
+        self.vy = np.where(alive, self.vy - self.fx(main.GRAVITY * slow), self.vy)
+        self.x = np.where(alive, self.x + self.mul(self.vx, slow), self.x)
+        self.y = np.where(alive, self.y + self.mul(self.vy, slow), self.y)
+        self.on_ground &= ~alive
+
+        self.resolve_platform_collisions(alive, old_y)
+
+        grounded = alive & (self.y <= self.ground)
+        self.y[grounded] = self.ground
+        self.vy[grounded] = 0
+        self.on_ground |= grounded
+
+        self.resolve_border_collisions(alive)
+        self.clamp_player_in_level(alive)
+
+        self.update_attack(alive)
+        self.update_combo(alive)
+
+        self.check_attack(0, 1, run)
+        self.check_attack(1, 0, run)
+
+        self.update_player_controls(run2 & self.fighting[:, None])
+
+    def end_fight(self, mask, winner):
+        self.fighting &= ~mask
+        self.winner[mask] = winner
+
+    # ---------- Player ----------
+    def update_block(self, m):
+        b = m & self.blocking
+        self.block_timer -= b
+        self.parry &= ~(b & (self.block_timer < main.BLOCK_DURATION - main.PARRY_WINDOW))
+        done = b & (self.block_timer <= 0)
+        self.blocking &= ~done
+        self.block_cooldown[done] = main.BLOCK_COOLDOWN
+        self.state[done & (self.state == BLOCK)] = IDLE
+
+        self.block_cooldown -= m & (self.block_cooldown > 0)
+
+        s = m & self.stunned
+        self.stun_timer -= s
+        done = s & (self.stun_timer <= 0)
+        self.stunned &= ~done
+        self.state[done & (self.state == BLOCK)] = IDLE
+
+    def update_dash(self, m):
+        d = m & self.dashing
+        self.dash_timer -= d
+        done = d & (self.dash_timer <= 0)
+        self.dashing &= ~done
+        self.dash_invulnerable &= ~done
+        self.vx[done] = 0
+        self.state[done & (self.state == DASH)] = IDLE
+
+        self.dash_cooldown -= m & (self.dash_cooldown > 0)
+
+    def update_slide(self, m):
+        s = m & self.sliding
+        if not s.any():
+            return
+        self.slide_timer -= s
+        if self.fixed:
+            speed = self.slide_dir.astype(np.int64) * (
+                self.fx(main.PLAYER_SPEED * 0.8) * self.slide_timer // main.SLIDE_DURATION)
+        else:
+            speed = self.slide_dir * main.PLAYER_SPEED * (self.slide_timer / main.SLIDE_DURATION) * 0.8
+        self.vx = np.where(s, speed, self.vx)
+        done = s & (self.slide_timer <= 0)
+        self.sliding &= ~done
+        self.vx[done] = 0
+        self.state[done & (self.state == SLIDE)] = IDLE
+
+    def update_attack(self, m):
+        a = m & self.attacking
+        self.attack_timer -= a
+        done = a & (self.attack_timer <= 0)
+        self.attacking &= ~done
+        self.attack_type[done] = 0
+
+        h = m & (self.hit_stun > 0)
+        self.hit_stun -= h
+        self.state[h & (self.hit_stun == 0) & (self.state == HIT)] = IDLE
+
+    def update_combo(self, m):
+        c = m & (self.combo > 0)
+        self.combo_timer -= c
+        done = c & (self.combo_timer <= 0)
+        self.combo[done] = 0
+        self.attack_index[done] = 0
+
+    def update_fatality(self, m):
+        g = main.GRAVITY
+        phase1 = m & (self.fatality_phase == 1)
+        phase2 = m & (self.fatality_phase == 2)
+        phase3 = m & (self.fatality_phase == 3)
+
+        if phase1.any():
+            self.fatality_vy = np.where(phase1, self.fatality_vy - self.fx(g * 0.7), self.fatality_vy)
+            self.x = np.where(phase1, self.x + self.mul(self.vx, 0.8), self.x)
+            self.y = np.where(phase1, self.y + self.fatality_vy, self.y)
+            self.fatality_timer -= phase1
+            done = phase1 & (self.fatality_timer <= 0)
+            self.fatality_phase[done] = 2
+            self.fatality_timer[done] = 25
+            self.vx = np.where(done, self.mul(self.vx, 0.4), self.vx)
+            self.fatality_vy[done] = self.fx(8)
+
+        if phase2.any():
+            self.fatality_vy = np.where(phase2, self.fatality_vy - self.fx(g * 1.3), self.fatality_vy)
+            self.x = np.where(phase2, self.x + self.mul(self.vx, 0.6), self.x)
+            self.y = np.where(phase2, self.y + self.fatality_vy, self.y)
+            landed = phase2 & (self.y <= self.ground)
+            self.y[landed] = self.ground
+            self.fatality_phase[landed] = 3
+            self.bounce_count[landed] = 0
+            self.fatality_bounce_timer[landed] = main.FATALITY_BOUNCE_DELAY
+            self.vx = np.where(landed, self.mul(np.abs(self.vx), 0.4), self.vx)
+            self.fatality_vy[landed] = 0
+            self.on_ground |= landed
+
+        if phase3.any():
+            lying = phase3 & self.on_ground
+            wait = lying & (self.fatality_bounce_timer > 0)
+            self.fatality_bounce_timer -= wait
+            lying &= ~wait
+
+            heights = main.FATALITY_BOUNCE_HEIGHTS
+            bounce = lying & (self.bounce_count < len(heights))
+            index = np.minimum(self.bounce_count, len(heights) - 1)
+            self.fatality_vy = np.where(bounce, self.fx(np.take(heights, index)), self.fatality_vy)
+            self.on_ground &= ~bounce
+            self.bounce_count += bounce
+
+            dead = lying & ~bounce
+            self.vx[dead] = 0
+            self.state[dead] = DEAD
+
+            air = phase3 & ~wait & ~dead & ~self.on_ground
+            self.fatality_vy = np.where(air, self.fatality_vy - self.fx(g * 1.5), self.fatality_vy)
+            self.y = np.where(air, self.y + self.fatality_vy, self.y)
+            self.x = np.where(air, self.x + self.mul(self.vx, 1.0 - self.bounce_count * 0.4), self.x)
+            landed = air & (self.y <= self.ground)
+            self.y[landed] = self.ground
+            self.fatality_vy[landed] = 0
+            self.on_ground |= landed
+            self.fatality_bounce_timer[landed] = main.FATALITY_BOUNCE_DELAY
+
+    def start_fatality(self, fights, t, from_right):
+        self.state[fights, t] = FATALITY
+        self.fatality_phase[fights, t] = 1
+        self.fatality_timer[fights, t] = 12
+        self.facing_right[fights, t] = from_right
+        direction = np.where(from_right, 1, -1)
+        self.vx[fights, t] = self.fx(-direction * main.FATALITY_KNOCKBACK_X)
+        self.fatality_vy[fights, t] = self.fx(main.FATALITY_KNOCKBACK_Y)
+        self.bounce_count[fights, t] = 0
+        self.fatality_bounce_timer[fights, t] = 0
+        self.on_ground[fights, t] = False
+        self.health[fights, t] = 0
+
+    # ---------- столкновения ----------
+    def clamp_player_in_level(self, m):
+        low = m & (self.x < self.clamp_left)
+        self.x[low] = self.clamp_left
+        self.vx[low] = 0
+        high = m & (self.x > self.clamp_right)
+        self.x[high] = self.clamp_right
+        self.vx[high] = 0
+
+    def body_points(self, x, y):
+        points = np.empty((len(x),) + self.body.shape, dtype=self.body.dtype)
+        points[:, :, 0] = self.body[:, 0] + x[:, None]
+        points[:, :, 1] = self.body[:, 1] + y[:, None]
+        return points
+
+    def touching(self, m, solid):
+        # Пересечение прямоугольных границ необходимо для пересечения
+        # многоугольников, точный тест — только для прошедших фильтр.
+        # Грубую проверку по радиусу из arcade повторять не нужно: для
+        # спрайтов 100x100 она не отбрасывает ни одной настоящей пары
+        candidates = (m & (self.x + self.body_left < solid["right"]) &
+                      (self.x + self.body_right > solid["left"]) &
+                      (self.y + self.body_bottom < solid["top"]) &
+                      (self.y + self.body_top > solid["bottom"]))
+        fights, players = np.nonzero(candidates)
+        if len(fights) == 0:
+            return fights, players
+        points = self.body_points(self.x[fights, players], self.y[fights, players])
+
+        # Платформы и стены — прямоугольники: если вершина хитбокса заметно
+        # внутри, пересечение есть и без SAT (так почти всегда у стоящих
+        # на платформе). Запас много больше ошибки округления в arcade
+        eps = 1e-6
+        hit = ((points[..., 0] > solid["left"] + eps) & (points[..., 0] < solid["right"] - eps) &
+               (points[..., 1] > solid["bottom"] + eps) & (points[..., 1] < solid["top"] - eps)).any(axis=1)
+        unsure = np.flatnonzero(~hit)
+        if len(unsure):
+            other = np.broadcast_to(solid["points"], (len(unsure),) + solid["points"].shape)
+            hit[unsure] = polygons_intersect(points[unsure], other)
+        return fights[hit], players[hit]
+
+    def resolve_platform_collisions(self, m, old_y):
+        pending = m & (self.vy <= 0)
+        hits = [self.touching(pending, plat) for plat in self.platforms]
+        for plat, (fights, players) in zip(self.platforms, hits):
+            keep = pending[fights, players]
+            fights, players = fights[keep], players[keep]
+            plat_top = plat["top"]
+            bottom = self.y[fights, players] + self.body_bottom
+            old_bottom = old_y[fights, players] - self.half_h
+            margin = self.fx(5)
+            land = (old_bottom >= plat_top - margin) & (bottom <= plat_top + margin)
+            fights, players, bottom = fights[land], players[land], bottom[land]
+            self.y[fights, players] -= bottom - plat_top
+            self.vy[fights, players] = 0
+            self.on_ground[fights, players] = True
+            pending[fights, players] = False
+
+    def resolve_border_collisions(self, m):
+        hits = [self.touching(m, wall) for wall in self.walls]
+        for wall, (fights, players) in zip(self.walls, hits):
+            x = self.x[fights, players]
+            right = x + self.body_right
+            left = x + self.body_left
+            self.x[fights, players] = np.where(x < wall["center_x"], x - (right - wall["left"]),
+                                               x + (wall["right"] - left))
+            self.vx[fights, players] = 0
+
+    # ---------- удары ----------
+    def attack_hits(self, fights, a, t):
+        direction = np.where(self.facing_right[fights, a], 1, -1)
+        hx = self.x[fights, a] + direction * self.fx(45)
+        hy = self.y[fights, a]
+        tx, ty = self.x[fights, t], self.y[fights, t]
+        box = self.attack_box
+        near = ((hx + box[:, 0].min() < tx + self.body_right) &
+                (hx + box[:, 0].max() > tx + self.body_left) &
+                (hy + box[:, 1].min() < ty + self.body_top) &
+                (hy + box[:, 1].max() > ty + self.body_bottom))
+        result = np.zeros(len(fights), dtype=bool)
+        if near.any():
+            box_points = np.empty((near.sum(),) + box.shape, dtype=box.dtype)
+            box_points[:, :, 0] = box[:, 0] + hx[near][:, None]
+            box_points[:, :, 1] = box[:, 1] + hy[near][:, None]
+            result[near] = polygons_intersect(box_points, self.body_points(tx[near], ty[near]))
+        return result
+
+    def check_attack(self, a, t, run):
+        attacking = run & self.attacking[:, a]
+
+        whiff = np.flatnonzero(attacking & (self.attack_timer[:, a] == 8))
+        if len(whiff):
+            whiff = whiff[~self.attack_hits(whiff, a, t)]
+            direction = np.where(self.facing_right[whiff, a], 1, -1)
+            new_x = self.x[whiff, a] + direction * self.fx(main.PUNCH_FORWARD_MOVE)
+            inside = (self.clamp_left <= new_x) & (new_x <= self.clamp_right)
+            self.x[whiff[inside], a] = new_x[inside]
+
+        strike = np.flatnonzero(attacking & (self.attack_timer[:, a] == 5) &
+                                (self.state[:, t] != FATALITY) & (self.state[:, t] != DEAD))
+        if len(strike):
+            strike = strike[self.attack_hits(strike, a, t)]
+            if len(strike):
+                self.take_hits(strike, a, t)
+
+        self.end_fight(run & (self.state[:, t] == DEAD), a)
+
+    def take_hits(self, fights, a, t):
+        combo = self.combo[fights, a]
+        damage = np.where(combo <= 1, 7, (7 * (1.0 + (combo - 1) * 0.15)).astype(np.int32))
+        attacker_right = self.facing_right[fights, a]
+
+        # Player.take_hit
+        state = self.state[fights, t]
+        blocking = self.blocking[fights, t]
+        landed = (state != FATALITY) & (state != DEAD) & ~self.dash_invulnerable[fights, t]
+        parried = landed & blocking & self.parry[fights, t]
+        struck = landed & ~parried
+
+        f = fights[parried]
+        self.block_timer[f, t] = 0
+        self.block_cooldown[f, t] = main.BLOCK_COOLDOWN
+        self.state[f, t] = BLOCK
+        self.hit_stun[f, t] = 10
+
+        f = fights[struck & blocking]
+        self.state[f, t] = BLOCK
+        self.hit_stun[f, t] = 5
+
+        f = fights[struck]
+        right = attacker_right[struck]
+        multiplier = np.where(blocking[struck], 0.5, 1.0)
+        self.health[f, t] -= (damage[struck] * multiplier).astype(np.int32)
+        self.facing_right[f, t] = ~right
+        punch = self.attack_type[f, a] == PUNCH
+        direction = np.where(right, 1, -1)
+        self.vx[f, t] = self.fx(direction * np.where(punch, main.PUNCH_KNOCKBACK_X, main.KICK_KNOCKBACK_X))
+        self.vy[f, t] = self.fx(np.where(punch, main.PUNCH_KNOCKBACK_Y, main.KICK_KNOCKBACK_Y))
+
+        fall = np.zeros(len(fights), dtype=bool)
+        fall[struck] = self.health[f, t] <= 0
+        self.start_fatality(fights[fall], t, ~attacker_right[fall])
+        f = fights[struck & ~fall & ~blocking]
+        self.state[f, t] = HIT
+        self.hit_stun[f, t] = 12
+
+        # FightSimulation.check_attack: ответ на результат удара
+        self.stats_hits[fights, a] += 1
+
+        f = fights[fall]
+        self.hit_stop[f] = 20
+        if self.settings_slowmo:
+            self.slow_motion[f] = main.FATALITY_SLOW_MO_DURATION
+
+        f = fights[parried]
+        self.stunned[f, a] = True
+        self.stun_timer[f, a] = main.STUN_DURATION
+        self.state[f, a] = BLOCK
+        self.hit_stop[f] = 15
+
+        f = fights[~fall & ~parried]
+        self.hit_stop[f] = 6
+        self.combo[f, a] += 1
+        self.combo_timer[f, a] = main.COMBO_TIMER_MAX
+        self.stats_combos[f[self.combo[f, a] == 2], a] += 1
+
+        self.attacking[fights, a] = False
+        self.attack_timer[fights, a] = 0
+
+    # ---------- управление ----------
+    def update_player_controls(self, m):
+        state = self.state
+        c = m & (state != HIT) & (state != FATALITY) & (state != DEAD) & (state != DASH) & (state != SLIDE)
+        self.walking_left &= ~c
+        self.walking_right &= ~c
+
+        left = self.held & KEY["left"] != 0
+        right = self.held & KEY["right"] != 0
+        go_left = c & left & ~right
+        go_right = c & right & ~left
+        self.vx[go_left] = self.fx(-main.PLAYER_SPEED)
+        self.vx[go_right] = self.fx(main.PLAYER_SPEED)
+        self.facing_right[go_left] = False
+        self.facing_right[go_right] = True
+        self.walking_left |= go_left
+        self.walking_right |= go_right
+        self.state[go_left | go_right] = RUN
+
+        rest = c & ~go_left & ~go_right
+        slide = rest & (self.vx != 0) & self.on_ground & ~self.sliding
+        if slide.any():
+            direction = np.sign(self.vx)
+            self.sliding |= slide
+            self.slide_timer[slide] = main.SLIDE_DURATION
+            self.slide_dir = np.where(slide, direction, self.slide_dir)
+            self.state[slide] = SLIDE
+            self.vx = np.where(slide, self.fx(direction * main.PLAYER_SPEED * 0.8), self.vx)
+
+        stop = rest & ~slide & ~self.sliding
+        self.vx[stop] = 0
+        self.state[stop & (self.state == RUN)] = IDLE
+
+    def player_action(self, action, m):
+        if not m.any():
+            return
+        state = self.state
+        if action == "jump":
+            ok = m & self.on_ground & (state != FATALITY) & (state != DEAD) & (state != SLIDE)
+            self.vy[ok] = self.fx(main.JUMP_SPEED)
+            self.state[ok] = JUMP
+
+        elif action in ("punch", "kick"):
+            # Ограничения player_action и Player.attack вместе
+            ok = m & (state != HIT) & (state != FATALITY) & (state != DEAD) & (state != DASH) & \
+                (state != BLOCK) & (state != SLIDE)
+            self.attacking |= ok
+            self.attack_timer[ok] = 10
+            self.attack_type[ok] = PUNCH if action == "punch" else KICK
+            self.state[ok] = ATTACK
+            frames = len(self.template.p1.punch_textures_r if action == "punch"
+                         else self.template.p1.kick_textures_r)
+            self.attack_index = np.where(ok, (self.attack_index + 1) % frames, self.attack_index)
+
+        elif action == "block":
+            ok = m & (state != HIT) & (state != FATALITY) & (state != DEAD) & (state != DASH) & \
+                (state != SLIDE) & (state != ATTACK) & (self.block_cooldown <= 0) & ~self.stunned
+            self.blocking |= ok
+            self.block_timer[ok] = main.BLOCK_DURATION
+            self.state[ok] = BLOCK
+            self.parry |= ok
+
+        elif action == "dash":
+            ok = m & (state != HIT) & (state != FATALITY) & (state != DEAD) & (state != SLIDE) & \
+                (self.dash_cooldown <= 0) & self.on_ground
+            self.dashing |= ok
+            self.dash_timer[ok] = main.DASH_DURATION
+            self.dash_cooldown[ok] = main.DASH_COOLDOWN
+            self.dash_invulnerable |= ok
+            self.state[ok] = DASH
+            self.vx = np.where(ok, self.fx(np.where(self.facing_right, 1, -1) * main.DASH_SPEED), self.vx)
+
+    def player_release_block(self, m):
+        self.block_timer[m & self.blocking] = 0
+
+
+def read_fight(fight, fixed=False):
+    # Состояние скалярного боя в тех же полях, что у BatchFight
+    players = (fight.p1, fight.p2)
+    data = {}
+    for name, attr, _ in player_fields(fixed):
+        values = [getattr(p, attr) for p in players]
+        if name == "state":
+            values = [STATES.index(v) for v in values]
+        elif name == "attack_type":
+            values = [ATTACK_TYPES.index(v) for v in values]
+        data[name] = values
+    for name, _ in FIGHT_FIELDS:
+        data[name] = getattr(fight, name)
+    data["fighting"] = fight.state == "FIGHT"
+    data["winner"] = {None: -1, fight.p1: 0, fight.p2: 1}[fight.winner]
+    data["held"] = [sum(bit for action, bit in KEY.items() if p.controls[action] in fight.keys)
+                    for p in players]
+    return data
+
+
+# =================== INPUT ===================
+def random_inputs(rng, held, rate=1 / 6):
+    # Каждый боец с вероятностью rate нажимает или отпускает одну клавишу
+    toggle = rng.random(held.shape) < rate
+    bits = np.left_shift(1, rng.integers(0, len(CONTROLS), held.shape)).astype(np.uint8)
+    return held ^ np.where(toggle, bits, 0).astype(np.uint8)
+
+
+def apply_held(fight, held):
+    # Тот же порядок событий, что в BatchFight.step: отпускания, затем нажатия
+    players = (fight.p1, fight.p2)
+    for p, mask in zip(players, held):
+        for action in CONTROLS:
+            if p.controls[action] in fight.keys and not mask & KEY[action]:
+                fight.release(p.controls[action])
+    for p, mask in zip(players, held):
+        for action in ["left", "right"] + PRESS_ORDER:
+            if p.controls[action] not in fight.keys and mask & KEY[action]:
+                fight.press(p.controls[action])
+
+
+# =================== CROSS-CHECK ===================
+def cross_check(fights, frames, level="main", seed=1, out=sys.stdout, fixed=False):
+    # Перед каждым кадром скалярный HeadlessFight получает состояние боя
+    # из пакета, делает тот же шаг, и все поля сравниваются на точное
+    # равенство. Так проверяется каждый кадр каждого боя одним экземпляром
+    template = main.HeadlessFight(level, fixed=fixed)
+    batch = BatchFight(fights, level, template, fixed)
+    for i in range(fights):
+        batch.load_from(i, template)
+
+    rng = np.random.default_rng(seed)
+    held = batch.held.copy()
+    for frame in range(frames):
+        held = random_inputs(rng, held)
+        before = batch.snapshot()
+        batch.step(held)
+
+        for i in range(fights):
+            batch.store_to(i, template, before)
+            apply_held(template, held[i])
+            template.step()
+            diffs = batch.diff(i, template)
+            if diffs:
+                print(f"Расхождение: кадр {frame + 1}, бой {i}", file=out)
+                for name, mine, theirs in diffs:
+                    print(f"  {name}: пакет={mine} скаляр={theirs}", file=out)
+                return False
+
+        ended = ~batch.fighting
+        if ended.any():
+            batch.reset(ended)
+            held[ended] = 0
+
+    print(f"Совпадение: {fights} боёв x {frames} кадров", file=out)
+    return True
+
+
+# =================== THROUGHPUT ===================
+def measure(fights, frames, level="main", seed=1, template=None, fixed=False):
+    batch = BatchFight(fights, level, template, fixed)
+    rng = np.random.default_rng(seed)
+    inputs = np.zeros((frames, fights, 2), dtype=np.uint8)
+    held = batch.held.copy()
+    for frame in range(frames):
+        held = random_inputs(rng, held)
+        inputs[frame] = held
+
+    start = time.perf_counter()
+    for frame in range(frames):
+        batch.step(inputs[frame])
+        ended = ~batch.fighting
+        if ended.any():
+            batch.reset(ended)
+            inputs[frame + 1:, ended] = 0
+    elapsed = time.perf_counter() - start
+    return fights * frames / elapsed
+
+
+def main_cli(argv=None):
+    parser = argparse.ArgumentParser(description="Пакетная симуляция боёв на NumPy")
+    parser.add_argument("--fights", type=int, default=8192, help="боёв в пакете")
+    parser.add_argument("--frames", type=int, default=600, help="кадров")
+    parser.add_argument("--level", default="main")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--cross-check", action="store_true",
+                        help="сверять каждый кадр с правилами Player (медленно)")
+    parser.add_argument("--fixed", action="store_true", help="целочисленная физика (physics=fixed)")
+    args = parser.parse_args(argv)
+
+    if args.cross_check:
+        return 0 if cross_check(args.fights, args.frames, args.level, args.seed, fixed=args.fixed) else 1
+
+    rate = measure(args.fights, args.frames, args.level, args.seed, fixed=args.fixed)
+    mode = "целочисленная физика" if args.fixed else "float"
+    print(f"{rate:,.0f} бой-кадров/с ({args.fights} боёв x {args.frames} кадров, {mode})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
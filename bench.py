@@ -0,0 +1,391 @@
+import os
+
+# Окно (если понадобится для on_draw) создаём без дисплея: pyglet + EGL
+os.environ.setdefault("ARCADE_HEADLESS", "1")
+
+import argparse
+import contextlib
+import datetime
+import gc
+import json
+import platform
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+
+import arcade
+
+import main
+
+BASELINE_FILE = "bench_baseline.json"
+DEFAULT_THRESHOLD = 0.15
+
+PARTICLE_COUNTS = [100, 1000, 10000]
+PLATFORM_COUNTS = [10, 100, 1000]
+
+
+# =================== HELPERS ===================
+def metric(value, unit, better):
+    return {"value": round(value, 4), "unit": unit, "better": better}
+
+
+def median_time(func, repeats=5):
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+def scripted_keys(fight):
+    return list(fight.p1.controls.values()) + list(fight.p2.controls.values())
+
+
+def drive_scripted_input(press, release, held, keys, rng, frame):
+    # Каждые 6 кадров один случайный «игрок» нажимает или отпускает клавишу
+    if frame % 6 != 0:
+        return
+    key = rng.choice(keys)
+    if key in held:
+        held.discard(key)
+        release(key)
+    else:
+        held.add(key)
+        press(key)
+
+
+# =================== BENCHMARKS ===================
+def bench_simulation(frames):
+    random.seed(1)
+    rng = random.Random(1)
+    fight = main.HeadlessFight()
+    keys = scripted_keys(fight)
+    held = set()
+
+    start = time.perf_counter()
+    for frame in range(frames):
+        drive_scripted_input(fight.press, fight.release, held, keys, rng, frame)
+        if not fight.step():
+            fight.reset()
+            held.clear()
+    elapsed = time.perf_counter() - start
+
+    return {"sim_fps": metric(frames / elapsed, "frames/s", "higher")}
+
+
+def bench_batch(fights, frames):
+    try:
+        import batch_sim
+    except ImportError as e:
+        return {}, {"batch_sim": f"нет numpy: {e}"}
+    rate = batch_sim.measure(fights, frames)
+    return {"batch_sim": metric(rate, "fight-frames/s", "higher")}, {}
+
+
+def bench_particles(iterations):
+    results = {}
+    for count in PARTICLE_COUNTS:
+        random.seed(1)
+        system = main.ParticleSystem()
+
+        times = []
+        for _ in range(3):
+            system.particles = [
+                main.Particle(random.uniform(0, 1000), random.uniform(0, 600),
+                              random.uniform(-3, 3), random.uniform(-3, 3),
+                              lifetime=iterations + 1)
+                for _ in range(count)
+            ]
+            start = time.perf_counter()
+            for _ in range(iterations):
+                system.update()
+            times.append(time.perf_counter() - start)
+
+        per_update = statistics.median(times) / iterations
+        results[f"particles_update_{count}"] = metric(per_update * 1e6, "us/update", "lower")
+    return results
+
+
+def bench_collisions(iterations):
+    results = {}
+    rng = random.Random(1)
+    fight = main.HeadlessFight()
+    p = fight.p1
+
+    for count in PLATFORM_COUNTS:
+        fight.platforms = arcade.SpriteList(use_spatial_hash=True)
+        for _ in range(count):
+            s = arcade.Sprite(fight.platform_texture)
+            s.width = rng.uniform(80, 320)
+            s.height = 40
+            s.center_x = rng.uniform(main.LEVEL_LEFT, main.LEVEL_RIGHT)
+            s.center_y = rng.uniform(main.GROUND_Y + 60, main.GROUND_Y + 700)
+            fight.platforms.append(s)
+
+        def run():
+            for i in range(iterations):
+                p.center_x = main.LEVEL_LEFT + (i * 37) % (main.LEVEL_RIGHT - main.LEVEL_LEFT)
+                p.center_y = main.GROUND_Y + 60 + (i * 53) % 700
+                p.change_y = -5
+                old_y = p.center_y + 5
+                fight.resolve_platform_collisions(p, old_y)
+                fight.resolve_border_collisions(p)
+
+        elapsed = median_time(run, repeats=3)
+        results[f"collision_platforms_{count}"] = metric(elapsed / iterations * 1e6, "us/check", "lower")
+    return results
+
+
+def bench_assets():
+    results = {}
+    skipped = {}
+
+    # texture_load — как раньше, декодирование PNG кадров бойца; с атласом
+    # игра их не декодирует, но эталоны до атласа сравниваются с этим замером
+    paths = [os.path.join(main.TEXTURES_PATH, name) for name in main.CHARACTER_TEXTURES]
+    paths = [path for path in paths if os.path.exists(path)]
+
+    def decode_textures():
+        for path in paths:
+            arcade.load_texture(path)
+
+    texture_time = median_time(decode_textures, repeats=3)
+    results["texture_load"] = metric(texture_time * 1000, "ms/player", "lower")
+
+    player = main.Player(200)
+
+    def load_textures():
+        # Кадры общие для бойцов и кэшируются: замер — без кэша
+        main.CHARACTER_ATLAS.forget(main.CHARACTER_TEXTURES)
+        player.load_textures()
+
+    texture_time = median_time(load_textures, repeats=3)
+    results["texture_load_atlas"] = metric(texture_time * 1000, "ms/player", "lower")
+
+    sound_files = [f for f in sorted(os.listdir(main.SOUNDS_PATH))
+                   if f.lower().endswith((".wav", ".mp3", ".ogg"))] if os.path.isdir(main.SOUNDS_PATH) else []
+    failed = []
+
+    def load_all():
+        failed.clear()
+        for filename in sound_files:
+            try:
+                # Как в игре: не-PCM звуки — из кэша декодированного PCM
+                main.load_effect(os.path.join(main.SOUNDS_PATH, filename))
+            except Exception:
+                failed.append(filename)
+
+    sound_time = median_time(load_all, repeats=3)
+    if sound_files and len(failed) < len(sound_files):
+        results["sound_load"] = metric(sound_time * 1000, "ms/all", "lower")
+    else:
+        skipped["sound_load"] = "нет декодера для звуковых файлов"
+    if failed:
+        skipped["sound_load_failed"] = ", ".join(failed)
+    return results, skipped
+
+
+def read_rss():
+    # Linux: /proc/self/statm, второе поле — резидентные страницы
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def bench_player_memory(count=10):
+    gc.collect()
+    rss_before = read_rss()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    players = [main.Player(200) for _ in range(count)]
+    gc.collect()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    rss_after = read_rss()
+    del players
+
+    # tracemalloc видит только кучу Python; пиксели PIL/текстур видны в RSS
+    results = {"player_memory": metric((after - before) / count / 1024, "KiB/player", "lower")}
+    if rss_before is not None and rss_after is not None:
+        results["player_rss"] = metric((rss_after - rss_before) / count / 1024, "KiB/player", "lower")
+    return results
+
+
+def bench_draw(frames, warmup):
+    try:
+        # GameWindow печатает отчёт о загрузке, он не должен смешиваться с JSON
+        with contextlib.redirect_stdout(sys.stderr):
+            window = main.GameWindow()
+    except Exception as e:
+        return {}, {"draw_frame": f"нет GL-контекста: {e}"}
+
+    # Кадр меряется на лучшем качестве: иначе регулятор снизит его на
+    # медленной машине посреди замера
+    window.settings_quality = "high"
+    window.create_quality_governor()
+    random.seed(1)
+    rng = random.Random(1)
+    window.p1_name = "P1"
+    window.p2_name = "P2"
+    # Бой и первый кадр тоже печатают (звуки, проверка папок)
+    with contextlib.redirect_stdout(sys.stderr):
+        window.start_game()
+        window.state = "FIGHT"
+        window.on_draw()
+    keys = scripted_keys(window)
+    held = set()
+
+    def press(key):
+        window.on_key_press(key, 0)
+
+    def release(key):
+        window.on_key_release(key, 0)
+
+    times = []
+    for frame in range(warmup + frames):
+        drive_scripted_input(press, release, held, keys, rng, frame)
+        window.on_update(1 / 60)
+        if window.state != "FIGHT":
+            window.start_game()
+            window.state = "FIGHT"
+        start = time.perf_counter()
+        window.on_draw()
+        window.ctx.finish()
+        if frame >= warmup:
+            times.append(time.perf_counter() - start)
+
+    renderer = window.ctx.info.RENDERER
+    window.close()
+    return {"draw_frame": metric(statistics.median(times) * 1000, "ms/frame", "lower")}, \
+        {"renderer": renderer}
+
+
+# =================== BASELINE ===================
+def load_baseline(path):
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def compare(results, baseline, default_threshold, overrides):
+    thresholds = dict(baseline.get("thresholds", {}))
+    thresholds.update(overrides)
+
+    report = {}
+    for name, cur in results["metrics"].items():
+        base = baseline.get("metrics", {}).get(name)
+        if not base or not base["value"]:
+            continue
+        threshold = thresholds.get(name, default_threshold)
+        if cur["better"] == "higher":
+            change = (base["value"] - cur["value"]) / base["value"]
+        else:
+            change = (cur["value"] - base["value"]) / base["value"]
+        report[name] = {
+            "baseline": base["value"],
+            "current": cur["value"],
+            "regression": round(change, 4),
+            "threshold": threshold,
+            "failed": change > threshold,
+        }
+    return report
+
+
+def parse_thresholds(items):
+    overrides = {}
+    for item in items:
+        name, _, value = item.partition("=")
+        overrides[name] = float(value)
+    return overrides
+
+
+def run(args):
+    results = {
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        "machine": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "processor": platform.processor(),
+            "arcade": arcade.version.VERSION,
+        },
+        "metrics": {},
+        "skipped": {},
+    }
+
+    results["metrics"].update(bench_simulation(args.frames))
+    batch, skipped = bench_batch(args.batch_fights, args.batch_frames)
+    results["metrics"].update(batch)
+    results["skipped"].update(skipped)
+    results["metrics"].update(bench_particles(args.particle_iterations))
+    results["metrics"].update(bench_collisions(args.collision_iterations))
+    assets, skipped = bench_assets()
+    results["metrics"].update(assets)
+    results["skipped"].update(skipped)
+    results["metrics"].update(bench_player_memory())
+
+    if not args.no_draw:
+        draw, info = bench_draw(args.draw_frames, warmup=30)
+        results["metrics"].update(draw)
+        if "draw_frame" in draw:
+            results["machine"].update(info)
+        else:
+            results["skipped"].update(info)
+    return results
+
+
+def main_cli(argv=None):
+    parser = argparse.ArgumentParser(description="Бенчмарки Stickman Fighter без дисплея")
+    parser.add_argument("--out", help="куда записать результаты (JSON), по умолчанию stdout")
+    parser.add_argument("--baseline", default=BASELINE_FILE, help="файл с эталонными результатами")
+    parser.add_argument("--save-baseline", action="store_true",
+                        help="сохранить текущие результаты как эталон")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="допустимое ухудшение (доля), по умолчанию 0.15")
+    parser.add_argument("--metric-threshold", action="append", default=[], metavar="NAME=VALUE",
+                        help="порог для отдельной метрики, можно повторять")
+    parser.add_argument("--frames", type=int, default=6000, help="кадров симуляции боя")
+    parser.add_argument("--batch-fights", type=int, default=8192, help="боёв в пакетной симуляции")
+    parser.add_argument("--batch-frames", type=int, default=120)
+    parser.add_argument("--particle-iterations", type=int, default=60)
+    parser.add_argument("--collision-iterations", type=int, default=2000)
+    parser.add_argument("--draw-frames", type=int, default=120)
+    parser.add_argument("--no-draw", action="store_true", help="не измерять on_draw")
+    args = parser.parse_args(argv)
+
+    results = run(args)
+    overrides = parse_thresholds(args.metric_threshold)
+
+    baseline = load_baseline(args.baseline)
+    status = 0
+    if args.save_baseline:
+        thresholds = baseline.get("thresholds", {}) if baseline else {}
+        thresholds.update(overrides)
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(dict(results, thresholds=thresholds), f, indent=2, ensure_ascii=False)
+    elif baseline:
+        results["comparison"] = compare(results, baseline, args.threshold, overrides)
+        if any(r["failed"] for r in results["comparison"].values()):
+            status = 1
+
+    text = json.dumps(results, indent=2, ensure_ascii=False)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text)
+    else:
+        print(text)
+
+    for name, r in results.get("comparison", {}).items():
+        if r["failed"]:
+            print(f"РЕГРЕССИЯ {name}: {r['baseline']} -> {r['current']} "
+                  f"({r['regression']:+.1%} > {r['threshold']:.0%})", file=sys.stderr)
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
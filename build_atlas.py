@@ -0,0 +1,127 @@
+import argparse
+import json
+import os
+import sys
+
+from PIL import Image
+
+import main
+from character_atlas import (ATLAS_FILE_NAME, ATLAS_SCALES, ATLAS_VERSION, canvas_size, file_crc,
+                             shrink_frame, source_hit_box)
+
+# =================== BUILD ATLAS ===================
+# Сборка атласа бойцов (character_atlas.py) из Game/textures:
+# каждый кадр обрезается по альфе, уменьшается до всех ATLAS_SCALES и
+# раскладывается полками по страницам PAGE_SIZE. В characters.json —
+# страница и место кадра, точка привязки, простой хитбокс исходника и crc
+# PNG: по нему игра узнаёт кадры, изменившиеся после сборки. Запускать
+# после правки кадров; без атласа игра уменьшает кадры сама при загрузке.
+
+PAGE_SIZE = 1024
+PADDING = 2
+
+
+def pack(sizes, page_size=PAGE_SIZE, padding=PADDING):
+    # Полки: кадры от высоких к низким слева направо, новая полка — когда
+    # ряд кончился, новая страница — когда кончилась высота.
+    # Возвращает (страница, x, y) в порядке sizes и число страниц
+    order = sorted(range(len(sizes)), key=lambda i: (-sizes[i][1], -sizes[i][0]))
+    places = [None] * len(sizes)
+    page, x, y, shelf = 0, padding, padding, 0
+    for i in order:
+        w, h = sizes[i]
+        if w + 2 * padding > page_size or h + 2 * padding > page_size:
+            raise ValueError(f"кадр {w}x{h} больше страницы {page_size}")
+        if x + w + padding > page_size:
+            x, y, shelf = padding, y + shelf + padding, 0
+        if y + h + padding > page_size:
+            page, x, y, shelf = page + 1, padding, padding, 0
+        places[i] = (page, x, y)
+        x += w + padding
+        shelf = max(shelf, h)
+    return places, page + 1 if sizes else 0
+
+
+def build(names=main.CHARACTER_TEXTURES, textures_path=main.TEXTURES_PATH, out_path=main.ATLAS_PATH,
+          scales=ATLAS_SCALES):
+    frames = {}
+    sources = {}
+    source_size = None
+    for name in names:
+        path = os.path.join(textures_path, name)
+        with Image.open(path) as image:
+            image = image.convert("RGBA")
+        if source_size is None:
+            source_size = image.size
+        elif image.size != source_size:
+            raise ValueError(f"{name}: {image.size[0]}x{image.size[1]}, а остальные кадры "
+                             f"{source_size[0]}x{source_size[1]}")
+        sources[name] = image
+        frames[name] = {"crc": file_crc(path), "hit_box": source_hit_box(image),
+                        "rects": {}, "anchors": {}}
+
+    os.makedirs(out_path, exist_ok=True)
+    meta = {"version": ATLAS_VERSION, "source_size": list(source_size), "scales": {}, "frames": frames}
+    stats = []
+    for factor in scales:
+        canvas = canvas_size(source_size, factor, main.PLAYER_SCALE)
+        shrunk = {name: shrink_frame(image, canvas) for name, image in sources.items()}
+        places, page_count = pack([shrunk[name][0].size for name in names])
+        # Страница обрезается по занятому месту: меньше читать при загрузке
+        used = [[0, 0] for _ in range(page_count)]
+        for name, (page, x, y) in zip(names, places):
+            w, h = shrunk[name][0].size
+            used[page] = [max(used[page][0], x + w + PADDING), max(used[page][1], y + h + PADDING)]
+        pages = [Image.new("RGBA", tuple(size)) for size in used]
+        for name, (page, x, y) in zip(names, places):
+            region, (ox, oy) = shrunk[name]
+            pages[page].paste(region, (x, y))
+            frames[name]["rects"][str(factor)] = [page, x, y, *region.size]
+            # Центр спрайта от левого верхнего угла обрезанного кадра
+            frames[name]["anchors"][str(factor)] = [canvas[0] // 2 - ox, canvas[1] // 2 - oy]
+
+        page_names = []
+        for i, page in enumerate(pages):
+            page_name = f"characters_{factor}x_{i}.png"
+            page.save(os.path.join(out_path, page_name), optimize=True)
+            page_names.append(page_name)
+        meta["scales"][str(factor)] = {"canvas": list(canvas), "pages": page_names}
+        stats.append((factor, canvas, len(pages)))
+
+    # Старые страницы от сборки с другим числом страниц не нужны
+    kept = {name for scale in meta["scales"].values() for name in scale["pages"]}
+    for name in os.listdir(out_path):
+        if name.startswith("characters_") and name.endswith(".png") and name not in kept:
+            os.remove(os.path.join(out_path, name))
+
+    with open(os.path.join(out_path, ATLAS_FILE_NAME), "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False, separators=(",", ":"))
+    return source_size, stats
+
+
+def main_cli(argv=None):
+    parser = argparse.ArgumentParser(description="Сборка атласа кадров бойца из Game/textures")
+    parser.add_argument("--textures", default=main.TEXTURES_PATH, help="папка с PNG кадров")
+    parser.add_argument("-o", "--output", default=main.ATLAS_PATH, help="папка атласа")
+    args = parser.parse_args(argv)
+
+    try:
+        source_size, stats = build(textures_path=args.textures, out_path=args.output)
+    except (OSError, ValueError) as e:
+        print(f"Ошибка: {e}", file=sys.stderr)
+        return 1
+
+    count = len(main.CHARACTER_TEXTURES)
+    source_bytes = count * source_size[0] * source_size[1] * 4
+    print(f"Кадров: {count}, исходники {source_size[0]}x{source_size[1]}: "
+          f"{source_bytes / 2 ** 20:.1f} МБ RGBA")
+    for factor, canvas, pages in stats:
+        frame_bytes = count * canvas[0] * canvas[1] * 4
+        print(f"  x{factor}: кадр {canvas[0]}x{canvas[1]}, страниц {pages}, "
+              f"{frame_bytes / 2 ** 20:.2f} МБ (-{100 - 100 * frame_bytes / source_bytes:.1f}%)")
+    print(f"Атлас: {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
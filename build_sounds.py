@@ -0,0 +1,78 @@
+import os
+
+# Декодер pyglet без окна
+os.environ.setdefault("ARCADE_HEADLESS", "1")
+
+import argparse
+import sys
+import time
+
+import main
+
+# =================== BUILD SOUNDS ===================
+# Проверка SOUND_FILES и MUSIC_FILES по папке звуков и заранее
+# декодированный PCM для коротких звуков, которые не грузятся как есть
+# (SOUND ASSETS в main.py):
+# игре на первом запуске не нужно ничего декодировать. Кэш — WAV под crc
+# исходника; записи для файлов, которых больше нет или которые
+# изменились, удаляются. Для MP3 нужен декодер pyglet: FFmpeg, GStreamer
+# или системный (Windows, macOS).
+
+
+def build(check_only=False):
+    problems, unused, music = main.check_sound_manifest()
+    for problem in problems:
+        print(f"✗ {problem}")
+    if not music:
+        print(f"Музыки нет (ищется {', '.join(main.MUSIC_FILES)}): игра будет без неё")
+    if unused:
+        print(f"Не используются: {', '.join(unused)}")
+    if check_only:
+        return problems, []
+
+    failed = []
+    kept = set()
+    for sound_name, filename in main.SOUND_FILES.items():
+        path = os.path.join(main.SOUNDS_PATH, filename)
+        if not os.path.exists(path) or filename.lower().endswith(".wav") and main.plain_wav(path):
+            continue
+        cache_file = main.sound_cache_file(path, main.file_crc(path))
+        kept.add(os.path.basename(cache_file))
+        if os.path.exists(cache_file):
+            print(f"  {filename}: уже в кэше")
+            continue
+        started = time.perf_counter()
+        try:
+            main.decode_to_cache(path, cache_file)
+        except Exception as e:
+            print(f"✗ {filename}: не декодируется ({e})")
+            failed.append(filename)
+            continue
+        decode_ms = (time.perf_counter() - started) * 1000
+        started = time.perf_counter()
+        main.arcade.load_sound(cache_file)
+        load_ms = (time.perf_counter() - started) * 1000
+        print(f"  {filename} -> {os.path.basename(cache_file)}: декодирование {decode_ms:.1f} мс, "
+              f"загрузка из кэша {load_ms:.1f} мс")
+
+    if os.path.isdir(main.SOUND_CACHE_PATH):
+        for name in os.listdir(main.SOUND_CACHE_PATH):
+            if name not in kept:
+                os.remove(os.path.join(main.SOUND_CACHE_PATH, name))
+                print(f"  удалён устаревший {name}")
+    return problems, failed
+
+
+def main_cli(argv=None):
+    parser = argparse.ArgumentParser(description="Проверка звуков и кэш декодированного PCM")
+    parser.add_argument("--check", action="store_true", help="только сверить манифест с папкой")
+    args = parser.parse_args(argv)
+
+    problems, failed = build(args.check)
+    if not problems and not failed:
+        print("Звуки в порядке")
+    return 1 if problems or failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
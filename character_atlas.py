@@ -0,0 +1,176 @@
+import json
+import os
+import zlib
+
+import arcade
+from PIL import Image
+
+# =================== CHARACTER ATLAS ===================
+# Кадры бойца — PNG 1000x1000, а на экране боец около 100x100. build_atlas.py
+# заранее обрезает прозрачные края, уменьшает кадры до нескольких размеров
+# (ATLAS_SCALES — во сколько раз больше экранного) и раскладывает их по
+# страницам атласа; в characters.json — где лежит кадр, его точка привязки
+# (центр спрайта относительно обрезанного кадра) и хитбокс исходника.
+# Игра берёт самый маленький размер, который не меньше бойца на экране при
+# самом близком приближении камеры. Хитбокс и размер спрайта те же, что у
+# PNG: бой и записи от размера атласа не зависят. Кадр, PNG которого
+# изменился после сборки (или атласа нет), уменьшается тем же способом при
+# загрузке. Зеркальные кадры — flip_horizontally: та же картинка в атласе
+# arcade, только другие текстурные координаты. Модуль не импортирует
+# main: папки, имена кадров и масштаб бойца передаёт игра.
+
+ATLAS_SCALES = (1, 2, 4)
+ATLAS_FILE_NAME = "characters.json"
+ATLAS_VERSION = 1
+
+
+def file_crc(path):
+    with open(path, "rb") as f:
+        return zlib.crc32(f.read())
+
+
+def canvas_size(source_size, factor, player_scale):
+    # Кадр в атласе — экранный размер бойца, умноженный на factor
+    return tuple(round(side * player_scale * factor) for side in source_size)
+
+
+def shrink_frame(image, canvas):
+    # Обрезанный по альфе кадр, уменьшенный до canvas, и его левый верхний
+    # угол на canvas. Уменьшается сразу нужный кусок исходника (box), фильтр
+    # берёт пиксели и за его краем — получается ровно кусок уменьшенного
+    # целиком кадра. Pillow уменьшает RGBA с умноженной на альфу яркостью:
+    # без тёмной каймы по краям
+    image = image.convert("RGBA")
+    (sw, sh), (cw, ch) = image.size, canvas
+    bbox = image.getchannel("A").getbbox()
+    if bbox is None:
+        return Image.new("RGBA", (1, 1)), (0, 0)
+    left, top, right, bottom = bbox
+    x0, y0 = left * cw // sw, top * ch // sh
+    x1, y1 = -(-right * cw // sw), -(-bottom * ch // sh)
+    box = (x0 * sw / cw, y0 * sh / ch, x1 * sw / cw, y1 * sh / ch)
+    return image.resize((x1 - x0, y1 - y0), Image.Resampling.LANCZOS, box), (x0, y0)
+
+
+def source_hit_box(image):
+    # Как у arcade.load_texture: простой хитбокс по альфе полного кадра
+    return [list(point) for point in arcade.hitbox.algo_simple.calculate(image)]
+
+
+class CharacterAtlas:
+    def __init__(self, atlas_path, textures_path, names, player_scale):
+        self.atlas_path = atlas_path
+        self.path = os.path.join(atlas_path, ATLAS_FILE_NAME)
+        self.textures_path = textures_path
+        self.names = names
+        self.player_scale = player_scale
+        self.meta = None
+        self.meta_loaded = False
+        self.factor = ATLAS_SCALES[0]
+        # Имя -> текстура; кадры общие для обоих бойцов
+        self.textures = {}
+        self.fresh = {}
+        self.pages = {}
+        self.source = None
+
+    def load_meta(self):
+        if self.meta_loaded:
+            return self.meta
+        self.meta_loaded = True
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            print(f"Атлас бойцов не найден ({self.path}): кадры уменьшаются при загрузке, "
+                  f"соберите его: python build_atlas.py")
+            return None
+        if meta.get("version") != ATLAS_VERSION:
+            print(f"Атлас бойцов другой версии ({meta.get('version')}): пересоберите build_atlas.py")
+            return None
+        self.meta = meta
+        return meta
+
+    def select(self, pixels_per_unit):
+        # Наименьший размер кадра, который не меньше бойца на экране
+        factor = next((f for f in ATLAS_SCALES if f >= pixels_per_unit), ATLAS_SCALES[-1])
+        if factor != self.factor:
+            self.factor = factor
+            self.textures = {}
+            self.pages = {}
+        return factor
+
+    @property
+    def sprite_scale(self):
+        # Кадр в factor раз больше экранного, спрайт во столько же раз меньше
+        return self.player_scale / self.ratio
+
+    @property
+    def ratio(self):
+        # Сторона кадра в атласе к стороне исходника: 0.1 при factor 1
+        source = self.source_size()
+        return canvas_size(source, self.factor, self.player_scale)[0] / source[0]
+
+    def source_size(self):
+        if self.source is None:
+            meta = self.load_meta()
+            if meta:
+                self.source = tuple(meta["source_size"])
+            else:
+                with Image.open(os.path.join(self.textures_path, self.names[0])) as image:
+                    self.source = image.size
+        return self.source
+
+    def forget(self, names):
+        # Горячая перезагрузка: кадры заново читаются и сверяются с PNG
+        for name in names:
+            self.textures.pop(name, None)
+            self.fresh.pop(name, None)
+
+    def texture(self, name):
+        if name not in self.textures:
+            self.textures[name] = self.load(name)
+        return self.textures[name]
+
+    def load(self, name):
+        path = os.path.join(self.textures_path, name)
+        meta = self.load_meta()
+        frame = meta["frames"].get(name) if meta else None
+        if frame is not None:
+            if name not in self.fresh:
+                self.fresh[name] = file_crc(path) == frame["crc"]
+                if not self.fresh[name]:
+                    print(f"{name} изменился после сборки атласа: кадр уменьшается при загрузке")
+            if self.fresh[name]:
+                return self.from_atlas(name, frame)
+
+        with Image.open(path) as image:
+            image.load()
+        canvas = canvas_size(image.size, self.factor, self.player_scale)
+        region, offset = shrink_frame(image, canvas)
+        points = source_hit_box(image)
+        return self.make_texture(name, region, offset, canvas, points, file_crc(path))
+
+    def from_atlas(self, name, frame):
+        meta = self.meta
+        scale = meta["scales"][str(self.factor)]
+        page_index, x, y, w, h = frame["rects"][str(self.factor)]
+        if page_index not in self.pages:
+            with Image.open(os.path.join(self.atlas_path, scale["pages"][page_index])) as page:
+                page.load()
+                self.pages[page_index] = page if page.mode == "RGBA" else page.convert("RGBA")
+        region = self.pages[page_index].crop((x, y, x + w, y + h))
+        canvas = tuple(scale["canvas"])
+        ax, ay = frame["anchors"][str(self.factor)]
+        offset = (canvas[0] // 2 - ax, canvas[1] // 2 - ay)
+        return self.make_texture(name, region, offset, canvas, frame["hit_box"], frame["crc"])
+
+    def make_texture(self, name, region, offset, canvas, points, crc):
+        image = Image.new("RGBA", canvas)
+        image.paste(region, offset)
+        ratio = self.ratio
+        hit_box = [(x * ratio, y * ratio) for x, y in points]
+        return arcade.Texture(image, hit_box_points=hit_box, hash=f"character:{name}:{canvas[0]}:{crc:08x}")
+
+    def release_pages(self):
+        # Страницы нужны только пока режутся кадры
+        self.pages = {}
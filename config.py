@@ -0,0 +1,129 @@
+import os
+import time
+
+from persist import DISK_WRITER
+
+# =================== CONFIG FILE ===================
+# Файл настроек вида имя=значение: поля с типом и значением по умолчанию
+# (SETTINGS_FIELDS в main.py) и клавиши управления игроков
+# (p1_left=97 ...). Файл читается один раз, дальше настройки — обычные
+# атрибуты GameConfig. Модуль не импортирует main.
+
+# Запись откладывается: серия переключений в SETTINGS — одна запись
+SETTINGS_SAVE_DELAY = 0.5
+SETTINGS_CHECK_INTERVAL = 1.0
+
+
+def parse_setting(kind, text):
+    if kind is bool:
+        if text not in ("True", "False"):
+            raise ValueError(text)
+        return text == "True"
+    if kind in (int, float):
+        return kind(text)
+    if text not in kind:
+        raise ValueError(text)
+    return text
+
+
+class GameConfig:
+    # Изменения из игры: атрибут меняется сразу, файл пишется через
+    # SETTINGS_SAVE_DELAY целиком потоком записи (persist.py), так что
+    # оборванная запись не портит настройки. Правки файла снаружи
+    # подхватываются poll() по mtime и возвращаются как набор имён.
+    # fields — {имя: (тип, по умолчанию)}, controls — {игрок: клавиши по
+    # умолчанию}, клавиши игрока — атрибут controls_<игрок>
+    def __init__(self, path, fields, controls):
+        self.path = path
+        self.fields = fields
+        for name, (kind, default) in fields.items():
+            setattr(self, name, default)
+        self.players = list(controls)
+        for player, defaults in controls.items():
+            setattr(self, f"controls_{player}", defaults.copy())
+        self.save_at = None
+        self.mtime = None
+        self.next_check = 0.0
+        self.load()
+
+    def file_mtime(self):
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except OSError:
+            return None
+
+    def load(self):
+        self.mtime = self.file_mtime()
+        if self.mtime is None:
+            return set()
+        values = {}
+        controls = {player: {} for player in self.players}
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                name, sep, text = line.strip().partition('=')
+                if not sep:
+                    continue
+                text = text.strip()
+                try:
+                    player, _, action = name.partition('_')
+                    if player in controls and action in getattr(self, f"controls_{player}"):
+                        controls[player][action] = int(text)
+                    elif name in self.fields:
+                        values[name] = parse_setting(self.fields[name][0], text)
+                except ValueError:
+                    print(f"Настройки: не понял строку {line.strip()!r}, оставляю прежнее значение")
+
+        changed = set()
+        for name, value in values.items():
+            if getattr(self, name) != value:
+                setattr(self, name, value)
+                changed.add(name)
+        # Словари управления меняются на месте: на них ссылаются бойцы
+        for player, keys in controls.items():
+            current = getattr(self, f"controls_{player}")
+            for action, key in keys.items():
+                if current[action] != key:
+                    current[action] = key
+                    changed.add("controls")
+        return changed
+
+    def save(self):
+        self.save_at = time.monotonic() + SETTINGS_SAVE_DELAY
+
+    def write(self):
+        lines = [f"{player}_{action}={key}\n" for player in self.players
+                 for action, key in getattr(self, f"controls_{player}").items()]
+        lines += [f"{name}={getattr(self, name)}\n" for name in self.fields]
+        DISK_WRITER.replace(self.path, "".join(lines), done=self.written)
+        self.save_at = None
+
+    def written(self):
+        # Своя запись — не правка снаружи
+        self.mtime = self.file_mtime()
+
+    def flush(self):
+        if self.save_at is not None:
+            self.write()
+
+    def poll(self):
+        now = time.monotonic()
+        if self.save_at is not None:
+            # Своя запись ещё не ушла — она и победит правку снаружи
+            if now >= self.save_at:
+                self.write()
+            return set()
+        if now < self.next_check:
+            return set()
+        self.next_check = now + SETTINGS_CHECK_INTERVAL
+        if self.file_mtime() == self.mtime:
+            return set()
+        changed = self.load()
+        if changed:
+            print(f"Настройки перечитаны из {self.path}: {', '.join(sorted(changed))}")
+        return changed
+
+
+def config_setting(name):
+    # settings_* у окна — те же атрибуты GameConfig (self.settings)
+    return property(lambda self: getattr(self.settings, name),
+                    lambda self, value: setattr(self.settings, name, value))
@@ -0,0 +1,98 @@
+import argparse
+import sys
+import time
+
+import main
+from replay import load_replay, play, prepare
+from statehash import StateHasher, diff_states, first_divergence, load_stream, save_stream, unpack_state
+
+# =================== DESYNC ===================
+# Поиск рассинхрона по хэшам состояния (statehash.py).
+#   desync.py fight.json            — бой из записи проигрывается здесь, его
+#                                     хэши сверяются с записанными игрой
+#   desync.py fight.json -o a.sync  — то же и сохранить поток вместе с
+#                                     состояниями кадров
+#   desync.py a.sync b.sync         — сравнить два потока (с разных машин,
+#                                     процессов, версий); если в обоих есть
+#                                     состояния — разница по полям
+# Номер кадра — сколько кадров боя прошло: хэш снимается в начале кадра.
+
+
+def simulate(replay):
+    fight = main.HeadlessFight(replay["level"])
+    prepare(replay, fight)
+    fight.state_hash = StateHasher(keep_states=True)
+    started = time.perf_counter()
+    for _ in play(replay, fight):
+        pass
+    return fight.state_hash, time.perf_counter() - started
+
+
+def local_stream(hasher):
+    return {"hashes": hasher.hashes, "states": hasher.states, "fingerprint": hasher.fingerprint}
+
+
+def print_state(state, out):
+    for name, value in unpack_state(state).items():
+        out(f"  {name:<36}{value}")
+
+
+def compare(a, b, names=("A", "B"), out=print):
+    frame = first_divergence(a["hashes"], b["hashes"])
+    if frame is None:
+        out(f"Совпадение: {len(a['hashes'])} кадров, fingerprint {a['fingerprint']:08x}")
+        return True
+
+    out(f"Расхождение с кадра {frame} (до него совпало {frame} кадров)")
+    for name, stream in zip(names, (a, b)):
+        if frame >= len(stream["hashes"]):
+            out(f"  {name}: поток кончился на {len(stream['hashes'])} кадрах")
+    if frame >= min(len(a["hashes"]), len(b["hashes"])):
+        return False
+
+    states = [s["states"][frame] if s["states"] else None for s in (a, b)]
+    if all(states):
+        out(f"{'поле':<36}{names[0]:>24}{names[1]:>24}")
+        for field, mine, theirs in diff_states(*states):
+            out(f"{field:<36}{str(mine):>24}{str(theirs):>24}")
+    else:
+        # Разницу по полям можно получить, записав второй поток там, где
+        # он получен: desync.py <запись> -o файл.sync
+        for name, state in zip(names, states):
+            if state:
+                out(f"Состояние {name} в кадре {frame} (у второго потока состояний нет):")
+                print_state(state, out)
+    return False
+
+
+def main_cli(argv=None):
+    parser = argparse.ArgumentParser(description="Поиск рассинхрона боя по хэшам состояния")
+    parser.add_argument("first", help="запись боя (replays/*.json) или поток хэшей (.sync)")
+    parser.add_argument("second", nargs="?", help="второй поток: сравнить с первым как есть")
+    parser.add_argument("-o", "--output", help="сохранить поток проигранного здесь боя с состояниями")
+    args = parser.parse_args(argv)
+
+    try:
+        if args.second:
+            ok = compare(load_stream(args.first), load_stream(args.second), (args.first, args.second))
+            return 0 if ok else 1
+
+        replay = load_replay(args.first)
+        hasher, elapsed = simulate(replay)
+        print(f"Проиграно кадров: {len(hasher.hashes)} за {elapsed:.2f} с, "
+              f"fingerprint {hasher.fingerprint:08x}")
+        if args.output:
+            save_stream(hasher, args.output, {"replay": args.first, "physics": replay.get("physics", "float")})
+            print(f"Поток сохранён в {args.output}")
+        if "hashes" not in replay:
+            print("В записи нет хэшей состояния: сравнивать не с чем")
+            return 0
+        ok = compare(load_stream(args.first), local_stream(hasher), ("запись", "здесь"))
+    except (OSError, ValueError) as e:
+        print(f"Ошибка: {e}", file=sys.stderr)
+        return 2
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
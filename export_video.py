@@ -0,0 +1,325 @@
+import os
+
+# Рисуем без дисплея: pyglet + EGL, на машине без GPU — программный llvmpipe
+os.environ.setdefault("ARCADE_HEADLESS", "1")
+
+import argparse
+import contextlib
+import math
+import multiprocessing
+import queue
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import arcade
+from pyglet import gl
+
+import main
+from replay import load_replay, play, prepare
+
+# =================== VIDEO EXPORT ===================
+# Запись боя (replays/*.json) -> видео. Бой заново проигрывается и
+# рисуется окном игры в свой кадровый буфер нужного размера; кадры
+# читаются glReadPixels в несколько заранее выделенных буферов и по каналу
+# уходят в ffmpeg (rawvideo rgb24), без промежуточных картинок. Длинная
+# запись делится на куски, которые рисуют отдельные процессы, а ffmpeg
+# потом склеивает их без перекодирования.
+
+SIM_FPS = 60
+READBACK_BUFFERS = 3
+
+
+def find_ffmpeg():
+    # Пакет ffmpeg из requirements.txt — обёртка без исполняемого файла,
+    # нужен сам ffmpeg в PATH или путь в FFMPEG_BINARY
+    path = os.environ.get("FFMPEG_BINARY") or shutil.which("ffmpeg")
+    if not path:
+        raise RuntimeError("ffmpeg не найден: установите его или укажите путь в FFMPEG_BINARY")
+    return path
+
+
+def output_size(height):
+    # Ширина по пропорциям окна игры, обе стороны чётные (нужно для yuv420p)
+    height -= height % 2
+    width = round(height * main.SCREEN_WIDTH / main.SCREEN_HEIGHT)
+    return width + width % 2, height
+
+
+def emitted(frame, fps):
+    # Сколько кадров видео приходится на первые frame кадров симуляции
+    return frame * fps // SIM_FPS
+
+
+class ExportWindow(main.GameWindow):
+    # Окно игры, которое рисует в свой кадровый буфер и ничего не сохраняет
+    def __init__(self, width, height):
+        super().__init__()
+        self.settings_sound = False
+        self.settings_music = False
+        # Видео всегда в полном разрешении и лучшем качестве
+        self.render_scaler = None
+        self.quality_governor = main.QualityGovernor(0)
+        self.quality = self.quality_governor.quality
+        # Видео — по константам из кода, без правок tuning.txt
+        if self.hot_reloader:
+            self.hot_reloader.restore()
+            self.hot_reloader = None
+
+        self.target = self.ctx.framebuffer(color_attachments=[self.ctx.texture((width, height))])
+        viewport = arcade.LBWH(0, 0, width, height)
+        for camera in (self.camera, self.ui_camera):
+            camera.render_target = self.target
+            camera.viewport = viewport
+
+        self.frame_bytes = width * height * 3
+        self.export_size = width, height
+
+    def character_pixels(self):
+        # Атлас бойцов — под размер видео, а не окна
+        return self.export_size[0] / main.SCREEN_WIDTH * main.CAMERA_MAX_ZOOM
+
+    def load_sounds(self):
+        self.sounds = {}
+
+    def play_background_music(self):
+        pass
+
+    def play_sound(self, sound_name, volume=1.0):
+        return None
+
+    def clear(self, *args, **kwargs):
+        self.target.clear(color=self.background_color)
+
+    def end_fight(self, winner_player):
+        # Без записи статистики и рекордов
+        self.state = "RESULTS"
+        self.winner = winner_player
+
+    # Управление боем, как у HeadlessFight
+    def step(self):
+        if self.state != "FIGHT":
+            return False
+        self.tick()
+        return self.state == "FIGHT"
+
+    def press(self, key):
+        if self.state == "FIGHT":
+            self.queue_input("press", key)
+        else:
+            self.keys.add(key)
+
+    def release(self, key):
+        if self.state == "FIGHT":
+            self.queue_input("release", key)
+        else:
+            self.keys.discard(key)
+
+    def load(self, replay):
+        self.selected_level = replay["level"]
+        self.settings_cpu = "off"
+        self.p1_name, self.p2_name = replay["names"]
+        self.start_game()
+        prepare(replay, self)
+
+    def render_into(self, buffer):
+        # Последний кадр рисуется как бой, а не как экран результатов
+        state = self.state
+        self.state = "FIGHT"
+        self.on_draw()
+        self.state = state
+
+        width, height = self.export_size
+        with self.target.activate():
+            gl.glPixelStorei(gl.GL_PACK_ALIGNMENT, 1)
+            gl.glReadBuffer(gl.GL_COLOR_ATTACHMENT0)
+            gl.glReadPixels(0, 0, width, height, gl.GL_RGB, gl.GL_UNSIGNED_BYTE, buffer)
+
+
+class FrameWriter:
+    # Отдельный поток пишет готовые кадры в ffmpeg, пока окно рисует
+    # следующие. Буферы ходят по кругу: свободные -> заполненные -> свободные
+    def __init__(self, command, frame_bytes, count=READBACK_BUFFERS):
+        self.free = queue.Queue()
+        for _ in range(count):
+            self.free.put((gl.GLubyte * frame_bytes)())
+        self.filled = queue.Queue()
+        self.process = subprocess.Popen(command, stdin=subprocess.PIPE) if command else None
+        self.error = None
+        self.frames = 0
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self):
+        while True:
+            buffer, repeat = self.filled.get()
+            if buffer is None:
+                break
+            try:
+                if self.process and not self.error:
+                    for _ in range(repeat):
+                        self.process.stdin.write(memoryview(buffer))
+            except OSError as e:
+                self.error = e
+            self.frames += repeat
+            self.free.put(buffer)
+
+    def acquire(self):
+        return self.free.get()
+
+    def submit(self, buffer, repeat=1):
+        self.filled.put((buffer, repeat))
+
+    def close(self):
+        self.filled.put((None, 0))
+        self.thread.join()
+        if self.process:
+            with contextlib.suppress(OSError):
+                self.process.stdin.close()
+            if self.process.wait() != 0 and not self.error:
+                self.error = RuntimeError(f"ffmpeg завершился с кодом {self.process.returncode}")
+        if self.error:
+            raise self.error
+
+
+def ffmpeg_command(ffmpeg, width, height, fps, path, crf):
+    return [ffmpeg, "-loglevel", "error", "-y",
+            "-f", "rawvideo", "-pix_fmt", "rgb24", "-s", f"{width}x{height}", "-r", str(fps), "-i", "-",
+            # glReadPixels отдаёт строки снизу вверх
+            "-vf", "vflip",
+            "-c:v", "libx264", "-preset", "veryfast", "-crf", str(crf), "-pix_fmt", "yuv420p",
+            path]
+
+
+def render_segment(replay_path, start, end, height, fps, path, ffmpeg, crf, tail):
+    # Один кусок: кадры симуляции (start, end]. До start бой проигрывается
+    # без отрисовки — это быстро, рисовать дороже
+    width, height = output_size(height)
+    with contextlib.redirect_stdout(sys.stderr):
+        window = ExportWindow(width, height)
+    replay = load_replay(replay_path)
+    window.load(replay)
+    random.seed(0)
+
+    command = ffmpeg_command(ffmpeg, width, height, fps, path, crf) if ffmpeg else None
+    writer = FrameWriter(command, window.frame_bytes)
+    started = time.perf_counter()
+    rendered = 0
+    try:
+        for frame in play(replay, window, until=end):
+            if frame <= start:
+                continue
+            count = emitted(frame, fps) - emitted(frame - 1, fps)
+            if count:
+                buffer = writer.acquire()
+                window.render_into(buffer)
+                writer.submit(buffer, count)
+                rendered += 1
+        if tail and rendered:
+            # Последний кадр держится tail секунд
+            buffer = writer.acquire()
+            window.render_into(buffer)
+            writer.submit(buffer, round(tail * fps))
+    finally:
+        writer.close()
+        window.close()
+    return path, writer.frames, rendered, time.perf_counter() - started
+
+
+def split_segments(first, last, parts):
+    size = math.ceil((last - first) / parts)
+    return [(s, min(s + size, last)) for s in range(first, last, size)]
+
+
+def concat(ffmpeg, paths, output, workdir):
+    listing = os.path.join(workdir, "segments.txt")
+    with open(listing, "w", encoding="utf-8") as f:
+        for path in paths:
+            f.write(f"file '{os.path.abspath(path)}'\n")
+    subprocess.run([ffmpeg, "-loglevel", "error", "-y", "-f", "concat", "-safe", "0", "-i", listing,
+                    "-c", "copy", output], check=True)
+
+
+def export(replay_path, output, height=720, fps=60, workers=1, start=0, end=None, crf=20, tail=1.0,
+           dry_run=False):
+    replay = load_replay(replay_path)
+    last = replay["frames"] if end is None else min(end, replay["frames"])
+    ffmpeg = None if dry_run else find_ffmpeg()
+
+    segments = split_segments(start, last, max(1, workers))
+    started = time.perf_counter()
+    with tempfile.TemporaryDirectory(prefix="stickman_export_") as workdir:
+        jobs = []
+        for i, (seg_start, seg_end) in enumerate(segments):
+            single = len(segments) == 1
+            path = output if single else os.path.join(workdir, f"segment_{i:03d}.mp4")
+            seg_tail = tail if i == len(segments) - 1 else 0
+            jobs.append((replay_path, seg_start, seg_end, height, fps, path, ffmpeg, crf, seg_tail))
+
+        if len(jobs) == 1:
+            results = [render_segment(*jobs[0])]
+        else:
+            # У каждого процесса свой GL-контекст. Упавший процесс даёт
+            # BrokenProcessPool, а не вечное ожидание
+            with ProcessPoolExecutor(len(jobs), mp_context=multiprocessing.get_context("spawn")) as pool:
+                results = list(pool.map(render_segment, *zip(*jobs)))
+
+        if ffmpeg and len(results) > 1:
+            concat(ffmpeg, [path for path, *_ in results], output, workdir)
+
+    elapsed = time.perf_counter() - started
+    video_frames = sum(r[1] for r in results)
+    rendered = sum(r[2] for r in results)
+    # Куски рисуются одновременно: чистое время отрисовки — самый долгий
+    render_seconds = max(r[3] for r in results)
+    return {
+        "frames": video_frames,
+        "rendered": rendered,
+        "seconds": elapsed,
+        "render_seconds": render_seconds,
+        "video_seconds": video_frames / fps,
+        "speed": video_frames / fps / elapsed,
+        "render_speed": video_frames / fps / render_seconds,
+        "size": output_size(height),
+        "segments": len(results),
+    }
+
+
+def main_cli(argv=None):
+    parser = argparse.ArgumentParser(description="Запись боя -> видео через ffmpeg")
+    parser.add_argument("replay", help="файл записи боя (replays/*.json)")
+    parser.add_argument("-o", "--output", default="fight.mp4")
+    parser.add_argument("--height", type=int, default=720, help="высота кадра, ширина по пропорциям игры")
+    parser.add_argument("--fps", type=int, default=60)
+    parser.add_argument("--workers", type=int, default=1, help="процессов, по куску записи на каждый")
+    parser.add_argument("--start", type=int, default=0, help="первый кадр боя")
+    parser.add_argument("--end", type=int, help="последний кадр боя")
+    parser.add_argument("--crf", type=int, default=20, help="качество x264 (меньше — лучше)")
+    parser.add_argument("--tail", type=float, default=1.0, help="секунд последнего кадра в конце")
+    parser.add_argument("--dry-run", action="store_true", help="только рисовать и читать кадры, без ffmpeg")
+    args = parser.parse_args(argv)
+
+    try:
+        result = export(args.replay, args.output, args.height, args.fps, args.workers, args.start, args.end,
+                        args.crf, args.tail, args.dry_run)
+    except (RuntimeError, OSError, subprocess.CalledProcessError, BrokenProcessPool) as e:
+        print(f"Ошибка: {e}", file=sys.stderr)
+        return 1
+
+    width, height = result["size"]
+    target = "без записи" if args.dry_run else args.output
+    print(f"{target}: {result['frames']} кадров {width}x{height} @ {args.fps} "
+          f"({result['video_seconds']:.1f} с видео) за {result['seconds']:.1f} с, "
+          f"x{result['speed']:.2f} к реальному времени (отрисовка без запуска окна: "
+          f"x{result['render_speed']:.2f}), кусков: {result['segments']}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
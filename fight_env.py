@@ -0,0 +1,403 @@
+import argparse
+import multiprocessing
+import sys
+import time
+
+import numpy as np
+
+import main
+from ai import DIFFICULTY_LEVELS
+from batch_sim import (CONTROLS, KEY, STATES, BatchFight, apply_held, random_inputs,
+                       read_fight)
+
+# =================== ENVIRONMENT ===================
+# Окружение в стиле Gym для обучения агентов: reset() -> (obs, info),
+# step(action) -> (obs, reward, terminated, truncated, info).
+# FightEnv — один бой на правилах HeadlessFight (можно играть против
+# CpuOpponent), VecFightEnv — N боёв сразу на BatchFight,
+# SubprocVecFightEnv — несколько VecFightEnv в отдельных процессах.
+# Окно и звук не создаются.
+
+# Дискретные действия: 0 — ничего не держать, дальше — держать одну клавишу
+ACTIONS = ["none"] + CONTROLS
+ACTION_KEYS = np.array([0] + [KEY[name] for name in CONTROLS], dtype=np.uint8)
+
+LEVEL_WIDTH = main.LEVEL_RIGHT - main.LEVEL_LEFT
+
+# Признаки одного бойца: (поле BatchFight, делитель)
+PLAYER_FEATURES = [
+    ("x", None),
+    ("y", None),
+    ("vx", main.DASH_SPEED),
+    ("vy", main.JUMP_SPEED),
+    ("health", 100),
+    ("facing_right", 1),
+    ("on_ground", 1),
+    ("attacking", 1),
+    ("attack_timer", 10),
+    ("hit_stun", 12),
+    ("blocking", 1),
+    ("parry", 1),
+    ("block_cooldown", main.BLOCK_COOLDOWN),
+    ("stunned", 1),
+    ("stun_timer", main.STUN_DURATION),
+    ("dashing", 1),
+    ("dash_cooldown", main.DASH_COOLDOWN),
+    ("sliding", 1),
+    ("combo", 5),
+]
+PLAYER_OBS_SIZE = len(PLAYER_FEATURES) + len(STATES)
+# [свой боец, соперник, dx, dy, время раунда, hit_stop, slow_motion]
+OBS_SIZE = 2 * PLAYER_OBS_SIZE + 5
+
+# Веса награды, меняются словарём reward={...}
+REWARD_WEIGHTS = {
+    "damage_dealt": 0.01,  # за единицу здоровья соперника
+    "damage_taken": -0.01,
+    "hit": 0.0,  # за каждый удар, дошедший до соперника
+    "combo": 0.0,  # за каждое начатое комбо
+    "win": 1.0,
+    "lose": -1.0,
+    "draw": 0.0,
+    "time": 0.0,  # за каждый шаг
+    "distance": 0.0,  # за каждый шаг, умножается на |dx| / ширину уровня
+}
+
+
+def observe(data, side):
+    # data — поля BatchFight формы (N, 2) и (N,), side — индекс своего
+    # бойца (0 или 1, скаляр или массив длины N). Возвращает (N, OBS_SIZE)
+    n = len(data["hit_stop"])
+    rows = np.arange(n)
+    side = np.broadcast_to(side, n)
+    obs = np.empty((n, OBS_SIZE), dtype=np.float32)
+
+    col = 0
+    for who in (side, 1 - side):
+        for name, scale in PLAYER_FEATURES:
+            value = data[name][rows, who]
+            if name == "x":
+                value = (value - main.LEVEL_LEFT) / LEVEL_WIDTH
+            elif name == "y":
+                value = (value - main.GROUND_Y) / main.SCREEN_HEIGHT
+            else:
+                value = value / scale
+            obs[:, col] = value
+            col += 1
+        obs[:, col:col + len(STATES)] = data["state"][rows, who][:, None] == np.arange(len(STATES))
+        col += len(STATES)
+
+    obs[:, col] = (data["x"][rows, 1 - side] - data["x"][rows, side]) / LEVEL_WIDTH
+    obs[:, col + 1] = (data["y"][rows, 1 - side] - data["y"][rows, side]) / main.SCREEN_HEIGHT
+    obs[:, col + 2] = data["round_time_left"] / main.ROUND_TIME
+    obs[:, col + 3] = data["hit_stop"] / 20
+    obs[:, col + 4] = data["slow_motion"] > 0
+    return obs
+
+
+def compute_reward(before, after, side, weights):
+    n = len(after["hit_stop"])
+    rows = np.arange(n)
+    side = np.broadcast_to(side, n)
+    other = 1 - side
+
+    def delta(name, who):
+        return (after[name][rows, who] - before[name][rows, who]).astype(np.float64)
+
+    reward = np.full(n, weights["time"])
+    reward -= weights["damage_dealt"] * delta("health", other)
+    reward -= weights["damage_taken"] * delta("health", side)
+    reward += weights["hit"] * delta("stats_hits", side)
+    reward += weights["combo"] * delta("stats_combos", side)
+    if weights["distance"]:
+        dx = np.abs(after["x"][rows, other] - after["x"][rows, side])
+        reward += weights["distance"] * dx / LEVEL_WIDTH
+
+    ended = before["fighting"] & ~after["fighting"]
+    winner = after["winner"]
+    reward += np.where(ended & (winner == side), weights["win"], 0.0)
+    reward += np.where(ended & (winner == other), weights["lose"], 0.0)
+    reward += np.where(ended & (winner == -1), weights["draw"], 0.0)
+    return reward
+
+
+def reward_weights(reward):
+    weights = dict(REWARD_WEIGHTS)
+    if reward:
+        unknown = set(reward) - set(weights)
+        if unknown:
+            raise ValueError(f"Неизвестные веса награды: {', '.join(sorted(unknown))}")
+        weights.update(reward)
+    return weights
+
+
+def action_mask(actions):
+    actions = np.asarray(actions)
+    if actions.min(initial=0) < 0 or actions.max(initial=0) >= len(ACTIONS):
+        raise ValueError(f"Действие должно быть от 0 до {len(ACTIONS) - 1}")
+    return ACTION_KEYS[actions]
+
+
+# =================== SINGLE FIGHT ===================
+class FightEnv:
+    # opponent: "idle" — стоит на месте, "random" — жмёт случайные клавиши,
+    # уровень сложности из DIFFICULTY_LEVELS — CpuOpponent, или функция
+    # obs -> действие (наблюдение со стороны соперника)
+    def __init__(self, level="main", opponent="idle", side=0, reward=None, frame_skip=1,
+                 max_steps=None, seed=None):
+        self.fight = main.HeadlessFight(level)
+        self.opponent = opponent
+        self.side = side
+        self.weights = reward_weights(reward)
+        self.frame_skip = frame_skip
+        self.max_steps = max_steps
+        self.rng = np.random.default_rng(seed)
+        self.opponent_held = np.zeros(1, dtype=np.uint8)
+        self.steps = 0
+        self.data = None
+
+        self.action_count = len(ACTIONS)
+        self.observation_size = OBS_SIZE
+
+    def read(self):
+        return {name: np.asarray(value)[None] for name, value in read_fight(self.fight).items()}
+
+    def reset(self, seed=None):
+        if seed is not None:
+            self.rng = np.random.default_rng(seed)
+        self.fight.reset()
+        if self.opponent in DIFFICULTY_LEVELS:
+            self.fight.attach_cpu("p2" if self.side == 0 else "p1", self.opponent)
+        else:
+            self.fight.attach_cpu("off", None)
+        self.opponent_held[:] = 0
+        self.steps = 0
+        self.data = self.read()
+        return observe(self.data, self.side)[0], {}
+
+    def opponent_mask(self):
+        # Функция-соперник видит бой на начало шага, как и агент
+        if callable(self.opponent):
+            return action_mask(self.opponent(observe(self.data, 1 - self.side)[0]))
+        if self.opponent == "random":
+            self.opponent_held = random_inputs(self.rng, self.opponent_held)
+            return self.opponent_held[0]
+        # "idle" и CpuOpponent (он держит клавиши сам)
+        return 0
+
+    def step(self, action):
+        before = self.data
+        held = [0, 0]
+        held[self.side] = action_mask(action)
+        for _ in range(self.frame_skip):
+            held[1 - self.side] = self.opponent_mask()
+            apply_held(self.fight, held)
+            if not self.fight.step():
+                break
+        self.data = self.read()
+        self.steps += 1
+
+        reward = compute_reward(before, self.data, self.side, self.weights)[0]
+        terminated = self.fight.state != "FIGHT"
+        truncated = not terminated and self.max_steps is not None and self.steps >= self.max_steps
+        info = {"winner": int(self.data["winner"][0]), "frame": self.fight.frame}
+        return observe(self.data, self.side)[0], reward, terminated, truncated, info
+
+
+# =================== VECTORIZED ===================
+class VecFightEnv:
+    # N боёв на BatchFight. Агент управляет бойцом side в каждом бою,
+    # opponent: "idle", "random" или "self" — тогда step() принимает
+    # действия (N, 2) за обоих, а наблюдения и награды тоже (N, 2, ...).
+    # Законченные бои сразу начинаются заново, последнее наблюдение
+    # лежит в info["final_observation"]
+    def __init__(self, n, level="main", opponent="idle", side=0, reward=None, frame_skip=1,
+                 max_steps=None, seed=None):
+        if opponent not in ("idle", "random", "self"):
+            raise ValueError(f"Неизвестный соперник: {opponent}")
+        self.n = n
+        self.batch = BatchFight(n, level)
+        self.opponent = opponent
+        self.side = side
+        self.weights = reward_weights(reward)
+        self.frame_skip = frame_skip
+        self.max_steps = max_steps
+        self.rng = np.random.default_rng(seed)
+        self.held = np.zeros((n, 2), dtype=np.uint8)
+        self.steps = np.zeros(n, dtype=np.int64)
+
+        self.action_count = len(ACTIONS)
+        self.observation_size = OBS_SIZE
+
+    def observe(self, data):
+        if self.opponent == "self":
+            return np.stack([observe(data, 0), observe(data, 1)], axis=1)
+        return observe(data, self.side)
+
+    def reward(self, before, after):
+        if self.opponent == "self":
+            return np.stack([compute_reward(before, after, 0, self.weights),
+                             compute_reward(before, after, 1, self.weights)], axis=1)
+        return compute_reward(before, after, self.side, self.weights)
+
+    def reset(self, seed=None):
+        if seed is not None:
+            self.rng = np.random.default_rng(seed)
+        self.batch.reset()
+        self.held[:] = 0
+        self.steps[:] = 0
+        return self.observe(self.batch.snapshot()), {}
+
+    def step(self, actions):
+        actions = np.asarray(actions)
+        if self.opponent == "self":
+            self.held = action_mask(actions.reshape(self.n, 2))
+        else:
+            self.held[:, self.side] = action_mask(actions.reshape(self.n))
+
+        before = self.batch.snapshot()
+        for _ in range(self.frame_skip):
+            if self.opponent == "random":
+                self.held[:, 1 - self.side] = random_inputs(self.rng, self.held[:, 1 - self.side])
+            # Закончившиеся бои batch.step не трогает
+            self.batch.step(self.held)
+        after = self.batch.snapshot()
+        self.steps += 1
+
+        obs = self.observe(after)
+        reward = self.reward(before, after)
+        terminated = ~after["fighting"]
+        truncated = ~terminated
+        if self.max_steps is not None:
+            truncated &= self.steps >= self.max_steps
+        else:
+            truncated[:] = False
+        info = {"winner": after["winner"].copy()}
+
+        done = terminated | truncated
+        if done.any():
+            info["final_observation"] = obs[done]
+            self.batch.reset(done)
+            self.held[done] = 0
+            self.steps[done] = 0
+            obs[done] = self.observe(self.batch.snapshot())[done]
+        return obs, reward, terminated, truncated, info
+
+    def close(self):
+        pass
+
+
+# =================== SUBPROCESS ===================
+def worker(pipe, n, kwargs):
+    env = VecFightEnv(n, **kwargs)
+    try:
+        while True:
+            command, arg = pipe.recv()
+            if command == "reset":
+                pipe.send(env.reset(arg))
+            elif command == "step":
+                pipe.send(env.step(arg))
+            elif command == "close":
+                break
+    except (EOFError, KeyboardInterrupt):
+        pass
+    finally:
+        pipe.close()
+
+
+class SubprocVecFightEnv:
+    # workers процессов по envs_per_worker боёв: шаги идут параллельно,
+    # результаты склеиваются в те же массивы, что у VecFightEnv
+    def __init__(self, workers, envs_per_worker, **kwargs):
+        self.n = workers * envs_per_worker
+        self.envs_per_worker = envs_per_worker
+        self.self_play = kwargs.get("opponent") == "self"
+        self.action_count = len(ACTIONS)
+        self.observation_size = OBS_SIZE
+
+        # spawn работает одинаково на Windows и Linux
+        context = multiprocessing.get_context("spawn")
+        seed = kwargs.pop("seed", None)
+        self.pipes = []
+        self.processes = []
+        for i in range(workers):
+            parent, child = context.Pipe()
+            worker_kwargs = dict(kwargs, seed=None if seed is None else seed + i)
+            process = context.Process(target=worker, args=(child, envs_per_worker, worker_kwargs),
+                                      daemon=True)
+            process.start()
+            child.close()
+            self.pipes.append(parent)
+            self.processes.append(process)
+
+    def reset(self, seed=None):
+        for i, pipe in enumerate(self.pipes):
+            pipe.send(("reset", None if seed is None else seed + i))
+        results = [pipe.recv() for pipe in self.pipes]
+        return np.concatenate([obs for obs, _ in results]), {}
+
+    def step(self, actions):
+        actions = np.asarray(actions)
+        for i, pipe in enumerate(self.pipes):
+            pipe.send(("step", actions[i * self.envs_per_worker:(i + 1) * self.envs_per_worker]))
+        results = [pipe.recv() for pipe in self.pipes]
+
+        obs, reward, terminated, truncated = (np.concatenate([r[k] for r in results]) for k in range(4))
+        info = {"winner": np.concatenate([r[4]["winner"] for r in results])}
+        finals = [r[4]["final_observation"] for r in results if "final_observation" in r[4]]
+        if finals:
+            info["final_observation"] = np.concatenate(finals)
+        return obs, reward, terminated, truncated, info
+
+    def close(self):
+        for pipe in self.pipes:
+            try:
+                pipe.send(("close", None))
+            except (BrokenPipeError, OSError):
+                pass
+        for process in self.processes:
+            process.join(timeout=5)
+        self.pipes = []
+        self.processes = []
+
+
+# =================== THROUGHPUT ===================
+def measure(env, steps, seed=1):
+    rng = np.random.default_rng(seed)
+    env.reset(seed)
+    shape = (env.n, 2) if (getattr(env, "opponent", None) == "self" or
+                           getattr(env, "self_play", False)) else (env.n,)
+    actions = rng.integers(0, len(ACTIONS), (steps,) + shape)
+
+    start = time.perf_counter()
+    for i in range(steps):
+        env.step(actions[i])
+    elapsed = time.perf_counter() - start
+    return env.n * steps / elapsed
+
+
+def main_cli(argv=None):
+    parser = argparse.ArgumentParser(description="Скорость окружения для обучения агентов")
+    parser.add_argument("--envs", type=int, default=4096, help="боёв в одном процессе")
+    parser.add_argument("--workers", type=int, default=0, help="процессов (0 — без подпроцессов)")
+    parser.add_argument("--steps", type=int, default=300)
+    parser.add_argument("--opponent", default="random", choices=["idle", "random", "self"])
+    parser.add_argument("--frame-skip", type=int, default=1)
+    parser.add_argument("--level", default="main")
+    args = parser.parse_args(argv)
+
+    kwargs = dict(level=args.level, opponent=args.opponent, frame_skip=args.frame_skip)
+    if args.workers:
+        env = SubprocVecFightEnv(args.workers, args.envs, **kwargs)
+    else:
+        env = VecFightEnv(args.envs, **kwargs)
+    try:
+        rate = measure(env, args.steps)
+    finally:
+        env.close()
+    print(f"{rate:,.0f} шагов/с ({env.n} боёв, {args.workers or 1} процесс(ов))")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
@@ -0,0 +1,365 @@
+import os
+
+# Окно без дисплея: pyglet + EGL (для прогона в CI)
+os.environ.setdefault("ARCADE_HEADLESS", "1")
+
+import argparse
+import collections
+import contextlib
+import datetime
+import functools
+import json
+import random
+import sys
+import tempfile
+import threading
+
+import arcade
+import pyglet.gl
+from arcade.gl.backends.opengl.program import OpenGLProgram
+
+from persist import DISK_WRITER
+
+# =================== GL STATS ===================
+# Счётчики вызовов OpenGL по участкам кадра. Включаются по запросу
+# (gl_stats=True в game_settings.txt или этот модуль из командной строки):
+# функции pyglet.gl подменяются обёртками во всех модулях pyglet и arcade,
+# которые их импортировали, а методы рисования игры и функции arcade.draw_*
+# — метками участка. Каждый вызов GL записывается на текущий путь меток
+# (on_draw/draw_world/draw_ground/draw_texture_rect). Модуль не импортирует
+# main: классы и методы для меток передаёт игра.
+# Из командной строки: бой без окна с рисованием каждого кадра, сводка по
+# участкам и проверка бюджетов — для CI на программном рендере. Вызов GL
+# не из основного потока (контекст принадлежит ему) — отдельный провал:
+# с --sim-thread так проверяется, что бой в своём потоке GL не трогает.
+
+CAPTURE_DIR = "gl_captures"
+HISTORY_FRAMES = 120
+OUTSIDE = "(вне кадра)"
+
+GL_CATEGORIES = {
+    "draw_calls": ["glDrawArrays", "glDrawElements", "glDrawArraysInstanced", "glDrawElementsInstanced",
+                   "glMultiDrawArraysIndirect", "glMultiDrawElementsIndirect"],
+    "texture_binds": ["glBindTexture", "glBindSampler"],
+    "buffer_uploads": ["glBufferData", "glBufferSubData"],
+    "texture_uploads": ["glTexImage2D", "glTexSubImage2D"],
+    "state_changes": ["glUseProgram", "glBindVertexArray", "glBindFramebuffer", "glBindBuffer", "glBindBufferBase",
+                      "glBindBufferRange", "glActiveTexture", "glEnable", "glDisable", "glBlendFunc",
+                      "glBlendFuncSeparate", "glViewport", "glScissor", "glDrawBuffer", "glDrawBuffers",
+                      "glPolygonMode"],
+    "clears": ["glClear"],
+}
+# Размер загружаемых данных: номер аргумента size
+UPLOAD_SIZE_ARG = {"glBufferData": 1, "glBufferSubData": 2}
+COUNTERS = list(GL_CATEGORIES) + ["uniforms", "upload_bytes"]
+
+# Бюджет на кадр боя по умолчанию (максимум за прогон), с запасом над
+# текущими значениями
+DEFAULT_BUDGETS = {
+    "draw_calls": 100,
+    "texture_binds": 160,
+    "buffer_uploads": 180,
+    "state_changes": 800,
+}
+
+
+def empty_counts():
+    return dict.fromkeys(COUNTERS, 0)
+
+
+class GLStats:
+    def __init__(self, sections=(), frame_method=None):
+        # sections — пары (класс, имя метода); frame_method — метод, который
+        # рисует кадр целиком (GameWindow.on_draw)
+        self.sections = list(sections)
+        self.frame_method = frame_method
+        self.patches = []
+        self.stack = []
+        self.current = collections.defaultdict(empty_counts)
+        self.last_frame = None
+        self.history = collections.deque(maxlen=HISTORY_FRAMES)
+        self.frames = 0
+        self.capture_path = None
+        self.calls = None
+        # "поток: функция GL" -> сколько раз
+        self.off_thread = collections.Counter()
+
+    # ===== подмена =====
+    def patch(self, owner, name, wrapper):
+        original = owner.__dict__[name] if isinstance(owner, type) else getattr(owner, name)
+        setattr(owner, name, wrapper)
+        self.patches.append((owner, name, original))
+
+    def install(self):
+        modules = [m for name, m in list(sys.modules.items())
+                   if m is not None and (name == "pyglet" or name.startswith(("pyglet.", "arcade.")))]
+        for category, names in GL_CATEGORIES.items():
+            for name in names:
+                original = getattr(pyglet.gl, name, None)
+                if original is None:
+                    continue
+                wrapper = self.gl_wrapper(original, name, category)
+                for module in modules:
+                    if getattr(module, name, None) is original:
+                        self.patch(module, name, wrapper)
+
+        setitem = OpenGLProgram.__setitem__
+
+        def program_setitem(program, key, value):
+            self.count("uniforms", "uniform")
+            setitem(program, key, value)
+
+        self.patch(OpenGLProgram, "__setitem__", program_setitem)
+
+        for name in dir(arcade):
+            if name.startswith("draw_") and callable(getattr(arcade, name)):
+                self.patch(arcade, name, self.labeled(getattr(arcade, name), name))
+        # Методы окна — просто по имени, остальные — с именем класса
+        frame_class = self.frame_method[0] if self.frame_method else None
+        for cls, name in self.sections:
+            label = name if cls is frame_class else f"{cls.__name__}.{name}"
+            self.patch(cls, name, self.labeled(cls.__dict__[name], label))
+        if self.frame_method:
+            cls, name = self.frame_method
+            self.patch(cls, name, self.frame_wrapper(cls.__dict__[name], name))
+        return self
+
+    def uninstall(self):
+        for owner, name, original in reversed(self.patches):
+            setattr(owner, name, original)
+        self.patches.clear()
+
+    def gl_wrapper(self, original, name, category):
+        size_arg = UPLOAD_SIZE_ARG.get(name)
+
+        def wrapper(*args):
+            thread = threading.current_thread()
+            if thread is not threading.main_thread():
+                self.off_thread[f"{thread.name}: {name}"] += 1
+                return original(*args)
+            self.count(category, name)
+            if size_arg is not None:
+                self.current[self.path()]["upload_bytes"] += int(getattr(args[size_arg], "value", args[size_arg]))
+            return original(*args)
+
+        return wrapper
+
+    def labeled(self, func, label):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            self.stack.append(label)
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.stack.pop()
+
+        return wrapper
+
+    def frame_wrapper(self, func, label):
+        inner = self.labeled(func, label)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if self.capture_path:
+                self.calls = []
+            try:
+                return inner(*args, **kwargs)
+            finally:
+                self.end_frame()
+
+        return wrapper
+
+    # ===== счёт =====
+    def path(self):
+        return "/".join(self.stack) if self.stack else OUTSIDE
+
+    def count(self, category, name):
+        path = self.path()
+        self.current[path][category] += 1
+        if self.calls is not None:
+            self.calls.append([path, name])
+
+    def end_frame(self):
+        sections = {path: counts for path, counts in self.current.items()}
+        totals = empty_counts()
+        for counts in sections.values():
+            for key, value in counts.items():
+                totals[key] += value
+        self.last_frame = {"frame": self.frames, "totals": totals, "sections": sections}
+        self.history.append(totals)
+        self.frames += 1
+        self.current = collections.defaultdict(empty_counts)
+        if self.capture_path:
+            self.save_capture(self.capture_path)
+            self.capture_path = None
+            self.calls = None
+
+    # ===== вывод =====
+    def capture_next(self, directory=CAPTURE_DIR):
+        # Следующий кадр целиком, с порядком вызовов, — в JSON
+        stamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+        self.capture_path = os.path.join(directory, f"frame_{stamp}.json")
+        return self.capture_path
+
+    def save_capture(self, path):
+        # Из on_draw: JSON собирается и пишется в потоке записи игры
+        data = dict(self.last_frame, calls=self.calls or [])
+        DISK_WRITER.replace(path, lambda: json.dumps(data, ensure_ascii=False, indent=1),
+                            done=lambda: print(f"Кадр GL сохранён в {path}"))
+
+    def leaf_totals(self, frame=None, counter="draw_calls"):
+        # Участки по последней метке пути: все draw_text вместе
+        frame = frame or self.last_frame
+        leaves = collections.Counter()
+        for path, counts in frame["sections"].items():
+            leaves[path.rsplit("/", 1)[-1]] += counts[counter]
+        return leaves
+
+    def overlay_lines(self, top=4):
+        if not self.last_frame:
+            return []
+        t = self.last_frame["totals"]
+        lines = [f"GL: отрисовок {t['draw_calls']}  текстур {t['texture_binds']}  "
+                 f"буферов {t['buffer_uploads']} ({t['upload_bytes'] / 1024:.0f} КБ)  "
+                 f"состояний {t['state_changes']}  uniform {t['uniforms']}"]
+        leaders = [(name, n) for name, n in self.leaf_totals().most_common(top) if n]
+        if leaders:
+            lines.append("  " + ", ".join(f"{name} {n}" for name, n in leaders))
+        return lines
+
+
+# =================== CI RUN ===================
+def summarize(frames, section_frames):
+    result = {}
+    for counter in COUNTERS:
+        values = sorted(f[counter] for f in frames)
+        result[counter] = {
+            "mean": round(sum(values) / len(values), 1),
+            "p95": values[int(len(values) * 0.95) - 1 if len(values) > 1 else 0],
+            "max": values[-1],
+        }
+    sections = collections.defaultdict(lambda: collections.Counter())
+    for frame in section_frames:
+        for path, counts in frame.items():
+            sections[path].update(counts)
+    per_frame = {path: {k: round(v / len(section_frames), 2) for k, v in counts.items() if v}
+                 for path, counts in sections.items()}
+    return result, dict(sorted(per_frame.items(), key=lambda item: -item[1].get("draw_calls", 0)))
+
+
+def run(frames=600, seed=1, level="main", warmup=30, sim_thread=False):
+    import main
+    from bench import drive_scripted_input
+
+    rng = random.Random(seed)
+    random.seed(seed)
+    with tempfile.TemporaryDirectory(prefix="stickman_glstats_") as workdir:
+        assets = os.path.abspath(main.ASSET_PATH)
+        cwd = os.getcwd()
+        os.chdir(workdir)
+        try:
+            os.symlink(assets, main.ASSET_PATH, target_is_directory=True)
+            with contextlib.redirect_stdout(sys.stderr):
+                window = main.GameWindow()
+                window.settings_music = False
+                window.stop_background_music()
+                window.set_gl_stats(True)
+            # Бюджет — на лучшем качестве, счёт не должен зависеть от скорости машины
+            window.settings_quality = "high"
+            window.create_quality_governor()
+            stats = window.gl_stats
+            window.selected_level = level
+            window.settings.sim_thread = sim_thread
+            window.p1_name, window.p2_name = "GL1", "GL2"
+            window.start_game()
+
+            keys = list(window.controls_p1.values()) + list(window.controls_p2.values())
+            held = set()
+            totals, sections = [], []
+            frame = 0
+            while len(totals) < frames:
+                if window.state == "FIGHT":
+                    drive_scripted_input(lambda key: window.on_key_press(key, 0),
+                                         lambda key: window.on_key_release(key, 0), held, keys, rng, frame)
+                elif window.state not in ("COUNTDOWN",):
+                    with contextlib.redirect_stdout(sys.stderr):
+                        window.start_game()
+                    held.clear()
+                with contextlib.redirect_stdout(sys.stderr):
+                    window.on_update(1 / 60)
+                window.on_draw()
+                window.flip()
+                frame += 1
+                if frame > warmup and window.state == "FIGHT":
+                    totals.append(stats.last_frame["totals"])
+                    sections.append(stats.last_frame["sections"])
+            last = stats.last_frame
+            window.set_gl_stats(False)
+            window.close()
+            # Записи боёв — во временную папку, пока она есть
+            main.DISK_WRITER.flush()
+        finally:
+            os.chdir(cwd)
+    summary, per_section = summarize(totals, sections)
+    return {"frames": len(totals), "level": level, "summary": summary, "sections": per_section, "last_frame": last,
+            "off_thread": dict(stats.off_thread)}
+
+
+def check_budgets(result, budgets):
+    failed = []
+    for counter, limit in budgets.items():
+        worst = result["summary"][counter]["max"]
+        if worst > limit:
+            failed.append((counter, worst, limit))
+    return failed
+
+
+def parse_budget(text):
+    name, _, value = text.partition("=")
+    if name not in COUNTERS or not value.isdigit():
+        raise argparse.ArgumentTypeError(f"ожидается счётчик=число, счётчики: {', '.join(COUNTERS)}")
+    return name, int(value)
+
+
+def main_cli(argv=None):
+    parser = argparse.ArgumentParser(description="Вызовы GL за кадр боя по участкам и проверка бюджетов")
+    parser.add_argument("--frames", type=int, default=600, help="кадров боя в замере")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--level", default="main")
+    parser.add_argument("--budget", type=parse_budget, action="append", default=[],
+                        help="предел на кадр, например draw_calls=150 (можно несколько)")
+    parser.add_argument("--no-default-budgets", action="store_true", help="проверять только --budget")
+    parser.add_argument("--top", type=int, default=12, help="сколько участков показать")
+    parser.add_argument("--json", help="сохранить сводку и последний кадр в файл")
+    parser.add_argument("--sim-thread", action="store_true", help="бой в своём потоке (sim_thread=True)")
+    args = parser.parse_args(argv)
+
+    budgets = {} if args.no_default_budgets else dict(DEFAULT_BUDGETS)
+    budgets.update(args.budget)
+    result = run(args.frames, args.seed, args.level, sim_thread=args.sim_thread)
+
+    print(f"=== GL за кадр боя: {result['frames']} кадров, уровень {result['level']} ===")
+    print(f"{'счётчик':<18}{'среднее':>10}{'p95':>10}{'макс':>10}{'бюджет':>10}")
+    for counter, s in result["summary"].items():
+        limit = budgets.get(counter)
+        print(f"{counter:<18}{s['mean']:>10}{s['p95']:>10}{s['max']:>10}{limit if limit is not None else '':>10}")
+    print("\nУчастки (в среднем за кадр):")
+    for path, counts in list(result["sections"].items())[:args.top]:
+        print(f"  {path:<70} отрисовок {counts.get('draw_calls', 0):>6}  текстур {counts.get('texture_binds', 0):>6}")
+
+    failed = check_budgets(result, budgets)
+    result["budgets"] = budgets
+    result["ok"] = not failed and not result["off_thread"]
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=1)
+    for counter, worst, limit in failed:
+        print(f"ПРЕВЫШЕН БЮДЖЕТ: {counter} {worst} > {limit}")
+    for call, count in result["off_thread"].items():
+        print(f"GL НЕ ИЗ ОСНОВНОГО ПОТОКА: {call} x{count}")
+    print("\nOK" if result["ok"] else "\nПРОВАЛ")
+    return 0 if result["ok"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
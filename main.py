@@ -1,14 +1,46 @@
+import time
+
+# Отсчёт для --profile-startup (STARTUP PROFILE): до импорта arcade
+STARTUP_STARTED = time.perf_counter()
+
 import arcade
+from arcade.gl import geometry
+import pyglet
+from pyglet import gl, media
+from pyglet.math import Mat4, Vec3
+import ast
+import itertools
+import operator
 import os
 import random
 import math
 import datetime
+import subprocess
+import sys
+import wave
+from collections import deque, namedtuple
+
+from PIL import Image
+
+from ai import CpuOpponent, DIFFICULTY_LEVELS
+from audio import MusicLoop, audio_bytes, pcm16, plain_wav, read_wav
+from character_atlas import CharacterAtlas, file_crc
+from config import GameConfig, config_setting
+from persist import DISK_WRITER
+from replay import REPLAY_DIR, ReplayRecorder
+from sim_thread import SimThread
+from statehash import StateHasher
+
+STARTUP_IMPORTED = time.perf_counter()
 
 # =================== CONFIG ===================
 SCREEN_WIDTH = 1000
 SCREEN_HEIGHT = 650
 SCREEN_TITLE = "Stickman Fighter"
 
+# Экраны меню: без боя, без замеров качества
+MENU_STATES = ["MENU", "SETTINGS", "LEVELS", "NAME_INPUT", "RESULTS", "CONTROL_SETTINGS", "STATS"]
+
 PLAYER_SCALE = 0.1
 PLAYER_SPEED = 12
 DASH_SPEED = 25
@@ -55,14 +87,112 @@ SLIDE_DURATION = 8
 # Punch forward movement
 PUNCH_FORWARD_MOVE = 8
 
+# Input buffer: сколько кадров нажатие ждёт, пока боец сможет действовать
+INPUT_BUFFER_FRAMES = 6
+INPUT_LATENCY_SAMPLES = 600
+MOVE_LATENCY_TIMEOUT = 120
+
+# Dynamic resolution: мир рисуется в буфер 50-100% от окна, HUD — в полном
+RENDER_SCALE_MIN = 0.5
+RENDER_SCALE_MAX = 1.0
+RENDER_SCALE_STEP = 0.05
+WORLD_GPU_BUDGET_MS = 8.0
+# Масштаб растёт, только когда мир стал заметно дешевле бюджета
+RENDER_SCALE_RAISE = 0.6
+RENDER_SCALE_SAMPLES = 30
+RENDER_SCALE_QUERIES = 4
+
+# Эффекты на GPU: тряска в пикселях экрана, виньетка, обесцвечивание в
+# slow_motion, след рывка (в ширинах спрайта) и его число выборок
+SHAKE_INTENSITY = 6
+VIGNETTE_BASE = 0.2
+VIGNETTE_MAX = 0.6
+SLOWMO_DESATURATE = 0.7
+DASH_SMEAR_LENGTH = 0.6
+DASH_SMEAR_SAMPLES = 6
+
+# Уровни качества, от лучшего к худшему. particles — доля частиц от
+# заказанного числа, parallax — какие слои фона рисуются, ground_stretch —
+# во сколько раз шире (и реже) плитки земли, hud_effects — анимация комбо
+QUALITY_TIERS = [
+    {"name": "high", "particles": 1.0, "parallax": ("far", "mid", "near"), "ground_stretch": 1.0,
+     "hud_effects": True},
+    {"name": "medium", "particles": 0.6, "parallax": ("far", "near"), "ground_stretch": 1.0,
+     "hud_effects": True},
+    {"name": "low", "particles": 0.35, "parallax": ("far",), "ground_stretch": 1.5,
+     "hud_effects": False},
+    {"name": "minimal", "particles": 0.15, "parallax": ("far",), "ground_stretch": 2.5,
+     "hud_effects": False},
+]
+QUALITY_NAMES = [tier["name"] for tier in QUALITY_TIERS]
+# Бюджет работы процессора на кадр (update + draw), остальное — запас
+QUALITY_BUDGET_MS = 12.0
+QUALITY_DOWN_FRAMES = 60
+QUALITY_UP_FRAMES = 240
+QUALITY_UP_RATIO = 0.6
+QUALITY_COOLDOWN_FRAMES = 120
+
 # Обновленные пути
-ASSET_PATH = r".\Game"
+ASSET_PATH = "Game"
 SOUNDS_PATH = os.path.join(ASSET_PATH, "sounds")
 TEXTURES_PATH = os.path.join(ASSET_PATH, "textures")
+SOUND_CACHE_PATH = os.path.join(ASSET_PATH, "sound_cache")
+ATLAS_PATH = os.path.join(ASSET_PATH, "atlas")
 SETTINGS_FILE = "game_settings.txt"
 RECORDS_FILE = "game_stats.txt"
 BATTLE_HISTORY_FILE = "battle_history.txt"
 
+SOUND_FILES = {
+    "die": "Die.wav",
+    "punch1": "Punch_1.wav",
+    "punch2": "Punch_2.wav",
+    "punch3": "Punch_3.wav",
+    "punch_block": "Punch_block.wav",
+    "punch_miss": "Punch_miss.mp3",
+    "fall": "Fall.mp3",
+    "top": "Top.mp3",
+    "run": "Run.mp3",
+}
+# Первый найденный файл — фоновая музыка
+MUSIC_FILES = ["Music.mp3", "music.mp3", "background.mp3", "background_music.mp3"]
+
+# Режим разработки (dev_reload=True в game_settings.txt): правки текстур,
+# звуков и констант из TUNING_FILE подхватываются прямо в бою
+TUNING_FILE = "tuning.txt"
+TUNABLE = [
+    "PLAYER_SPEED", "DASH_SPEED", "DASH_DURATION", "DASH_COOLDOWN", "JUMP_SPEED", "GRAVITY",
+    "PUNCH_KNOCKBACK_X", "PUNCH_KNOCKBACK_Y", "KICK_KNOCKBACK_X", "KICK_KNOCKBACK_Y",
+    "FATALITY_KNOCKBACK_X", "FATALITY_KNOCKBACK_Y", "FATALITY_BOUNCE_HEIGHTS", "FATALITY_SLOW_MO_DURATION",
+    "FATALITY_BOUNCE_DELAY", "COMBO_TIMER_MAX", "IDLE_ANIMATION_SPEED", "HIT_FLASH_DURATION",
+    "BLOCK_DURATION", "BLOCK_COOLDOWN", "PARRY_WINDOW", "STUN_DURATION", "SLIDE_DURATION", "PUNCH_FORWARD_MOVE",
+]
+DEV_RELOAD_INTERVAL = 0.25
+# Файл применяется, когда его mtime и размер не менялись столько секунд
+DEV_RELOAD_SETTLE = 0.3
+
+# Какой слот занимает компьютерный противник
+CPU_SLOTS = ["off", "p2", "p1"]
+CPU_SLOT_NAMES = {"off": "ВЫКЛ", "p1": "P1", "p2": "P2"}
+
+DEFAULT_CONTROLS_P1 = {
+    "left": arcade.key.A,
+    "right": arcade.key.D,
+    "jump": arcade.key.W,
+    "punch": arcade.key.Q,
+    "kick": arcade.key.E,
+    "block": arcade.key.S,
+    "dash": arcade.key.LSHIFT
+}
+DEFAULT_CONTROLS_P2 = {
+    "left": arcade.key.LEFT,
+    "right": arcade.key.RIGHT,
+    "jump": arcade.key.UP,
+    "punch": arcade.key.K,
+    "kick": arcade.key.L,
+    "block": arcade.key.DOWN,
+    "dash": arcade.key.RSHIFT
+}
+
 
 # =================== PARTICLE SYSTEM ===================
 class Particle:
@@ -112,10 +242,15 @@ class Particle:
 class ParticleSystem:
     def __init__(self):
         self.particles = []
+        # Доля частиц от заказанного числа, её меняет QualityGovernor
+        self.density = 1.0
 
     def add_particle(self, particle):
         self.particles.append(particle)
 
+    def scaled(self, count):
+        return max(1, round(count * self.density)) if count else 0
+
     def create_blood_splash(self, x, y, count=15):
         colors = [
             arcade.color.RED,
@@ -124,7 +259,7 @@ class ParticleSystem:
             (139, 0, 0)
         ]
 
-        for _ in range(count):
+        for _ in range(self.scaled(count)):
             angle = random.uniform(0, math.pi * 2)
             speed = random.uniform(2, 8)
             velocity_x = math.cos(angle) * speed
@@ -141,7 +276,7 @@ class ParticleSystem:
             self.particles.append(particle)
 
     def create_dust_cloud(self, x, y, direction=1, count=10):
-        for _ in range(count):
+        for _ in range(self.scaled(count)):
             velocity_x = random.uniform(-1, 1) * direction
             velocity_y = random.uniform(-0.5, 0.5)
 
@@ -179,24 +314,6 @@ class ParticleSystem:
             )
             self.particles.append(particle)
 
-    def create_dash_trail(self, x, y, direction=1, count=5):
-        for _ in range(count):
-            offset_x = random.uniform(-10, 10)
-            offset_y = random.uniform(-5, 5)
-
-            particle = Particle(
-                x + offset_x,
-                y + offset_y,
-                -direction * random.uniform(0.5, 1.5),
-                0,
-                arcade.color.CYAN,
-                random.uniform(3, 6),
-                random.randint(20, 30),
-                gravity=0,
-                fade_out=True
-            )
-            self.particles.append(particle)
-
     def update(self):
         self.particles = [p for p in self.particles if p.update()]
 
@@ -335,22 +452,111 @@ class Platform:
         return self.rect.right
 
 
+# =================== FIXED-POINT PHYSICS ===================
+# Режим physics=fixed: положение и скорости бойцов — целые числа в долях
+# пикселя (1/SUBPIXEL), движение, столкновения и попадания считаются
+# только целой арифметикой и совпадают бит в бит на любой машине.
+# Константы правил и множители (0.8, 0.4 ...) переводятся в доли пикселя
+# в момент использования, так что tuning.txt действует и здесь. В пиксели
+# (center_x, change_x ...) значения переводит Player.sync_fixed — для
+# отрисовки, AI и телеметрии; обратно они не читаются.
+SUBPIXEL = 256
+
+
+def to_fixed(value):
+    # Умножение на степень двойки точное, round — к ближайшему чётному
+    return round(value * SUBPIXEL)
+
+
+def fixed_mul(value, factor):
+    # value * factor с округлением вниз, как // в NumPy
+    return value * to_fixed(factor) // SUBPIXEL
+
+
+def fixed_polygon(points):
+    return [(to_fixed(x), to_fixed(y)) for x, y in points]
+
+
+def shift_polygon(points, x, y):
+    return [(px + x, py + y) for px, py in points]
+
+
+def fixed_polygons_intersect(a, b):
+    # Разделяющие оси, как arcade.geometry.are_polygons_intersecting, но
+    # проекции целые и точные
+    for poly in (a, b):
+        for i, (x1, y1) in enumerate(poly):
+            x2, y2 = poly[(i + 1) % len(poly)]
+            n0, n1 = y2 - y1, x1 - x2
+            proj_a = [n0 * x + n1 * y for x, y in a]
+            proj_b = [n0 * x + n1 * y for x, y in b]
+            if max(proj_a) <= min(proj_b) or max(proj_b) <= min(proj_a):
+                return False
+    return True
+
+
+class FixedGeometry:
+    # Хитбоксы боя в долях пикселя. Хитбокс бойца arcade строит один раз по
+    # первой текстуре и дальше не меняет, поэтому он общий для обоих
+    def __init__(self, fight):
+        p = fight.p1
+        scale_x, scale_y = p.hit_box.scale
+        self.body = fixed_polygon((x * scale_x, y * scale_y) for x, y in p.hit_box.points)
+        self.body_left = min(x for x, _ in self.body)
+        self.body_right = max(x for x, _ in self.body)
+        self.body_bottom = min(y for _, y in self.body)
+        self.body_top = max(y for _, y in self.body)
+        self.attack_box = fixed_polygon(arcade.SpriteSolidColor(40, 30).hit_box.get_adjusted_points())
+        self.platforms = [self.solid(s) for s in fight.platforms]
+        self.walls = [self.solid(s) for s in fight.border_sprites]
+
+    @staticmethod
+    def solid(sprite):
+        points = fixed_polygon(sprite.hit_box.get_adjusted_points())
+        return {
+            "points": points,
+            "left": min(x for x, _ in points),
+            "right": max(x for x, _ in points),
+            "bottom": min(y for _, y in points),
+            "top": max(y for _, y in points),
+            "center_x": to_fixed(sprite.center_x),
+        }
+
+    def body_at(self, p):
+        return shift_polygon(self.body, p.sub_x, p.sub_y)
+
+    def touching(self, p, solid):
+        if (p.sub_x + self.body_right <= solid["left"] or p.sub_x + self.body_left >= solid["right"] or
+                p.sub_y + self.body_top <= solid["bottom"] or p.sub_y + self.body_bottom >= solid["top"]):
+            return False
+        return fixed_polygons_intersect(self.body_at(p), solid["points"])
+
+
+# =================== CHARACTER ATLAS ===================
+# Кадры бойца берутся из атласа, собранного build_atlas.py
+# (character_atlas.py); CAMERA_MAX_ZOOM — самое близкое приближение
+# камеры, по нему выбирается размер кадров.
+CHARACTER_TEXTURES = ([f"Stand_R_{i}.png" for i in range(1, 5)] + [f"Run_L_{i}.png" for i in range(1, 8)] +
+                      ["Jump_R.png", "Fall_R.png", "Punch_1_R.png", "Punch_2_R.png", "Kick_1_R.png",
+                       "Kick_2_R.png", "Slay_R.png", "Block_R.png", "Dash_R.png", "Fatality_R_1.png",
+                       "Fatality_R_2.png", "Fatality_R_3.png"])
+CAMERA_MAX_ZOOM = 1.2
+
+CHARACTER_ATLAS = CharacterAtlas(ATLAS_PATH, TEXTURES_PATH, CHARACTER_TEXTURES, PLAYER_SCALE)
+
+
 # =================== PLAYER ===================
 class Player(arcade.Sprite):
+    # Целочисленная физика (FIXED-POINT PHYSICS): включает бой через
+    # FightSimulation.set_fixed_physics
+    fixed = False
+
     def __init__(self, start_x, name="Player", name_color=arcade.color.BLUE, controls=None):
         super().__init__(scale=PLAYER_SCALE, hit_box_algorithm="None")
 
         self.name = name
         self.name_color = name_color
-        self.controls = controls or {
-            "left": arcade.key.A,
-            "right": arcade.key.D,
-            "jump": arcade.key.W,
-            "punch": arcade.key.Q,
-            "kick": arcade.key.E,
-            "block": arcade.key.S,
-            "dash": arcade.key.LSHIFT
-        }
+        self.controls = controls or DEFAULT_CONTROLS_P1.copy()
 
         self.center_x = start_x
         self.center_y = GROUND_Y
@@ -376,7 +582,6 @@ class Player(arcade.Sprite):
         self.attack_index = 0
         self.hit_stun_timer = 0
         self.hit_flash_timer = 0
-        self.hit_flash_visible = True
 
         self.blocking = False
         self.block_timer = 0
@@ -400,6 +605,8 @@ class Player(arcade.Sprite):
         self.show_combo = False
 
         self.state = "idle"
+        # CpuOpponent, если этим бойцом управляет компьютер
+        self.cpu = None
         self.fatality_phase = 0
         self.fatality_timer = 0
         self.bounce_count = 0
@@ -417,12 +624,17 @@ class Player(arcade.Sprite):
         self.center_y = GROUND_Y + self.height / 2
 
     def load_textures(self):
+        atlas = CHARACTER_ATLAS
+        # Кадр атласа в factor раз больше экранного — спрайт настолько же
+        # мельче: размер и хитбокс бойца те же
+        self.scale = atlas.sprite_scale
+
         self.idle_textures_right = []
         self.idle_textures_left = []
         for i in range(1, 5):
             texture_path = os.path.join(TEXTURES_PATH, f"Stand_R_{i}.png")
             if os.path.exists(texture_path):
-                texture = arcade.load_texture(texture_path)
+                texture = atlas.texture(f"Stand_R_{i}.png")
                 self.idle_textures_right.append(texture)
                 self.idle_textures_left.append(texture.flip_horizontally())
 
@@ -431,47 +643,61 @@ class Player(arcade.Sprite):
         for i in range(1, 8):
             texture_path = os.path.join(TEXTURES_PATH, f"Run_L_{i}.png")
             if os.path.exists(texture_path):
-                t = arcade.load_texture(texture_path)
+                t = atlas.texture(f"Run_L_{i}.png")
                 self.run_l.append(t)
                 self.run_r.append(t.flip_horizontally())
 
-        self.jump_r = arcade.load_texture(os.path.join(TEXTURES_PATH, "Jump_R.png"))
+        self.jump_r = atlas.texture("Jump_R.png")
         self.jump_l = self.jump_r.flip_horizontally()
 
-        self.fall_r = arcade.load_texture(os.path.join(TEXTURES_PATH, "Fall_R.png"))
+        self.fall_r = atlas.texture("Fall_R.png")
         self.fall_l = self.fall_r.flip_horizontally()
 
-        self.punch_textures_r = [
-            arcade.load_texture(os.path.join(TEXTURES_PATH, "Punch_1_R.png")),
-            arcade.load_texture(os.path.join(TEXTURES_PATH, "Punch_2_R.png"))
-        ]
+        self.punch_textures_r = [atlas.texture("Punch_1_R.png"), atlas.texture("Punch_2_R.png")]
         self.punch_textures_l = [tex.flip_horizontally() for tex in self.punch_textures_r]
 
-        self.kick_textures_r = [
-            arcade.load_texture(os.path.join(TEXTURES_PATH, "Kick_1_R.png")),
-            arcade.load_texture(os.path.join(TEXTURES_PATH, "Kick_2_R.png"))
-        ]
+        self.kick_textures_r = [atlas.texture("Kick_1_R.png"), atlas.texture("Kick_2_R.png")]
         self.kick_textures_l = [tex.flip_horizontally() for tex in self.kick_textures_r]
 
-        self.slay_r = arcade.load_texture(os.path.join(TEXTURES_PATH, "Slay_R.png"))
+        self.slay_r = atlas.texture("Slay_R.png")
         self.slay_l = self.slay_r.flip_horizontally()
 
-        self.block_r = arcade.load_texture(os.path.join(TEXTURES_PATH, "Block_R.png"))
+        self.block_r = atlas.texture("Block_R.png")
         self.block_l = self.block_r.flip_horizontally()
 
-        self.dash_r = arcade.load_texture(os.path.join(TEXTURES_PATH, "Dash_R.png"))
+        self.dash_r = atlas.texture("Dash_R.png")
         self.dash_l = self.dash_r.flip_horizontally()
 
-        self.hit_r = arcade.load_texture(os.path.join(TEXTURES_PATH, "Fatality_R_1.png"))
+        self.hit_r = atlas.texture("Fatality_R_1.png")
         self.hit_l = self.hit_r.flip_horizontally()
 
-        self.fatality_2_r = arcade.load_texture(os.path.join(TEXTURES_PATH, "Fatality_R_2.png"))
-        self.fatality_3_r = arcade.load_texture(os.path.join(TEXTURES_PATH, "Fatality_R_3.png"))
+        self.fatality_2_r = atlas.texture("Fatality_R_2.png")
+        self.fatality_3_r = atlas.texture("Fatality_R_3.png")
         self.fatality_2_l = self.fatality_2_r.flip_horizontally()
         self.fatality_3_l = self.fatality_3_r.flip_horizontally()
 
         self.fatality_1_r = self.hit_r
         self.fatality_1_l = self.hit_l
+        atlas.release_pages()
+
+    def texture_slots(self):
+        return (self.idle_textures_right + self.idle_textures_left + self.run_r + self.run_l +
+                self.punch_textures_r + self.punch_textures_l + self.kick_textures_r + self.kick_textures_l +
+                [self.jump_r, self.jump_l, self.fall_r, self.fall_l, self.slay_r, self.slay_l,
+                 self.block_r, self.block_l, self.dash_r, self.dash_l, self.hit_r, self.hit_l,
+                 self.fatality_2_r, self.fatality_2_l, self.fatality_3_r, self.fatality_3_l])
+
+    def reload_textures(self):
+        # Горячая перезагрузка: текущий кадр меняется на новую текстуру того
+        # же места анимации, состояние бойца не трогается
+        old = self.texture_slots()
+        self.load_textures()
+        new = self.texture_slots()
+        if len(old) == len(new):
+            swap = {id(a): b for a, b in zip(old, new)}
+            self.texture = swap.get(id(self.texture), self.texture)
+        self.idle_frame %= max(1, len(self.idle_textures_right))
+        self.walk_frame %= max(1, len(self.run_r))
 
     def reset_for_round(self, start_x):
         self.center_x = start_x
@@ -499,12 +725,81 @@ class Player(arcade.Sprite):
         self.show_combo = False
         self.hit_stun_timer = 0
         self.hit_flash_timer = 0
-        self.hit_flash_visible = True
         self.attack_index = 0
         self.just_landed = False
 
         self.stats_hits = 0
         self.stats_combos = 0
+        if self.fixed:
+            self.load_fixed()
+
+    # =================== FIXED-POINT ===================
+    # В режиме fixed положение и скорости хранятся в sub_* (доли пикселя);
+    # методы ниже меняют их в обоих режимах одинаково по смыслу
+    def load_fixed(self):
+        self.sub_x = to_fixed(self.center_x)
+        self.sub_y = to_fixed(self.center_y)
+        self.sub_vx = to_fixed(self.change_x)
+        self.sub_vy = to_fixed(self.change_y)
+        self.sub_fall_vy = to_fixed(self.fatality_velocity_y)
+        self.sync_fixed()
+
+    def sync_fixed(self):
+        self.center_x = self.sub_x / SUBPIXEL
+        self.center_y = self.sub_y / SUBPIXEL
+        self.change_x = self.sub_vx / SUBPIXEL
+        self.change_y = self.sub_vy / SUBPIXEL
+        self.fatality_velocity_y = self.sub_fall_vy / SUBPIXEL
+
+    def set_velocity(self, x=None, y=None, fall_y=None):
+        if self.fixed:
+            if x is not None:
+                self.sub_vx = to_fixed(x)
+            if y is not None:
+                self.sub_vy = to_fixed(y)
+            if fall_y is not None:
+                self.sub_fall_vy = to_fixed(fall_y)
+            self.sync_fixed()
+            return
+        if x is not None:
+            self.change_x = x
+        if y is not None:
+            self.change_y = y
+        if fall_y is not None:
+            self.fatality_velocity_y = fall_y
+
+    def scale_velocity_x(self, factor, absolute=False):
+        if self.fixed:
+            self.sub_vx = fixed_mul(abs(self.sub_vx) if absolute else self.sub_vx, factor)
+            self.sync_fixed()
+        else:
+            self.change_x = (abs(self.change_x) if absolute else self.change_x) * factor
+
+    def fall(self, gravity, drift):
+        # Кадр полёта при фаталити: скорость падения, снос по x с множителем
+        if self.fixed:
+            self.sub_fall_vy -= to_fixed(gravity)
+            self.sub_x += fixed_mul(self.sub_vx, drift)
+            self.sub_y += self.sub_fall_vy
+            self.sync_fixed()
+        else:
+            self.fatality_velocity_y -= gravity
+            self.center_x += self.change_x * drift
+            self.center_y += self.fatality_velocity_y
+
+    def below_ground(self):
+        if self.fixed:
+            return self.sub_y <= to_fixed(GROUND_Y + self.height / 2)
+        return self.center_y <= GROUND_Y + self.height / 2
+
+    def put_on_ground(self):
+        if self.fixed:
+            self.sub_y = to_fixed(GROUND_Y + self.height / 2)
+            self.sub_fall_vy = 0
+            self.sync_fixed()
+        else:
+            self.center_y = GROUND_Y + self.height / 2
+            self.fatality_velocity_y = 0
 
     def start_slide(self, direction):
         if self.state not in ["hit", "fatality", "dead", "dash"]:
@@ -512,16 +807,21 @@ class Player(arcade.Sprite):
             self.slide_timer = SLIDE_DURATION
             self.slide_direction = direction
             self.state = "slide"
-            self.change_x = direction * PLAYER_SPEED * 0.8
+            self.set_velocity(x=direction * PLAYER_SPEED * 0.8)
 
     def update_slide(self):
         if self.sliding:
             self.slide_timer -= 1
-            self.change_x = self.slide_direction * PLAYER_SPEED * (self.slide_timer / SLIDE_DURATION) * 0.8
+            if self.fixed:
+                speed = to_fixed(PLAYER_SPEED * 0.8) * self.slide_timer // SLIDE_DURATION
+                self.sub_vx = int(self.slide_direction) * speed
+                self.sync_fixed()
+            else:
+                self.change_x = self.slide_direction * PLAYER_SPEED * (self.slide_timer / SLIDE_DURATION) * 0.8
 
             if self.slide_timer <= 0:
                 self.sliding = False
-                self.change_x = 0
+                self.set_velocity(x=0)
                 if self.state == "slide":
                     self.state = "idle"
 
@@ -565,7 +865,7 @@ class Player(arcade.Sprite):
             self.dash_invulnerable = True
             self.dash_direction = 1 if self.facing_right else -1
             self.state = "dash"
-            self.change_x = self.dash_direction * DASH_SPEED
+            self.set_velocity(x=self.dash_direction * DASH_SPEED)
 
     def update_dash(self):
         if self.dashing:
@@ -574,7 +874,7 @@ class Player(arcade.Sprite):
             if self.dash_timer <= 0:
                 self.dashing = False
                 self.dash_invulnerable = False
-                self.change_x = 0
+                self.set_velocity(x=0)
                 if self.state == "dash":
                     self.state = "idle"
 
@@ -624,14 +924,11 @@ class Player(arcade.Sprite):
             direction = 1 if attacker_facing_right else -1
 
             if attack_type == "punch":
-                self.change_x = direction * PUNCH_KNOCKBACK_X
-                self.change_y = PUNCH_KNOCKBACK_Y
+                self.set_velocity(x=direction * PUNCH_KNOCKBACK_X, y=PUNCH_KNOCKBACK_Y)
             else:
-                self.change_x = direction * KICK_KNOCKBACK_X
-                self.change_y = KICK_KNOCKBACK_Y
+                self.set_velocity(x=direction * KICK_KNOCKBACK_X, y=KICK_KNOCKBACK_Y)
 
             self.hit_flash_timer = HIT_FLASH_DURATION * 3
-            self.hit_flash_visible = True
 
         if self.health <= 0:
             self.start_fatality(from_right=not attacker_facing_right)
@@ -675,8 +972,7 @@ class Player(arcade.Sprite):
         self.facing_right = from_right
         direction = 1 if from_right else -1
 
-        self.change_x = -direction * FATALITY_KNOCKBACK_X
-        self.fatality_velocity_y = FATALITY_KNOCKBACK_Y
+        self.set_velocity(x=-direction * FATALITY_KNOCKBACK_X, fall_y=FATALITY_KNOCKBACK_Y)
         self.bounce_count = 0
         self.fatality_ground_bounce_timer = 0
         self.on_ground = False
@@ -689,31 +985,26 @@ class Player(arcade.Sprite):
         if self.fatality_phase == 1:
             self.texture = self.fatality_1_r if self.facing_right else self.fatality_1_l
 
-            self.fatality_velocity_y -= GRAVITY * 0.7
-            self.center_x += self.change_x * 0.8
-            self.center_y += self.fatality_velocity_y
+            self.fall(GRAVITY * 0.7, 0.8)
 
             self.fatality_timer -= 1
             if self.fatality_timer <= 0:
                 self.fatality_phase = 2
                 self.fatality_timer = 25
-                self.change_x *= 0.4
-                self.fatality_velocity_y = 8
+                self.scale_velocity_x(0.4)
+                self.set_velocity(fall_y=8)
 
         elif self.fatality_phase == 2:
             self.texture = self.fatality_2_r if self.facing_right else self.fatality_2_l
 
-            self.fatality_velocity_y -= GRAVITY * 1.3
-            self.center_x += self.change_x * 0.6
-            self.center_y += self.fatality_velocity_y
+            self.fall(GRAVITY * 1.3, 0.6)
 
-            if self.center_y <= GROUND_Y + self.height / 2:
-                self.center_y = GROUND_Y + self.height / 2
+            if self.below_ground():
+                self.put_on_ground()
                 self.fatality_phase = 3
                 self.bounce_count = 0
                 self.fatality_ground_bounce_timer = 8
-                self.change_x = abs(self.change_x) * 0.4
-                self.fatality_velocity_y = 0
+                self.scale_velocity_x(0.4, absolute=True)
                 self.on_ground = True
                 self.just_landed = True
 
@@ -727,22 +1018,19 @@ class Player(arcade.Sprite):
 
                 if self.bounce_count < len(FATALITY_BOUNCE_HEIGHTS):
                     bounce_height = FATALITY_BOUNCE_HEIGHTS[self.bounce_count]
-                    self.fatality_velocity_y = bounce_height
+                    self.set_velocity(fall_y=bounce_height)
                     self.on_ground = False
                     self.bounce_count += 1
                 else:
-                    self.change_x = 0
+                    self.set_velocity(x=0)
                     self.state = "dead"
                     return
 
             if not self.on_ground:
-                self.fatality_velocity_y -= GRAVITY * 1.5
-                self.center_y += self.fatality_velocity_y
-                self.center_x += self.change_x * (1.0 - self.bounce_count * 0.4)
+                self.fall(GRAVITY * 1.5, 1.0 - self.bounce_count * 0.4)
 
-                if self.center_y <= GROUND_Y + self.height / 2:
-                    self.center_y = GROUND_Y + self.height / 2
-                    self.fatality_velocity_y = 0
+                if self.below_ground():
+                    self.put_on_ground()
                     self.on_ground = True
                     self.fatality_ground_bounce_timer = FATALITY_BOUNCE_DELAY
                     if self.bounce_count > 0:
@@ -762,8 +1050,6 @@ class Player(arcade.Sprite):
 
         if self.hit_flash_timer > 0:
             self.hit_flash_timer -= 1
-            if self.hit_flash_timer % HIT_FLASH_DURATION == 0:
-                self.hit_flash_visible = not self.hit_flash_visible
 
     def update_animation(self):
         if self.state == "fatality":
@@ -777,8 +1063,8 @@ class Player(arcade.Sprite):
             return
 
         if self.state == "hit":
-            if self.hit_flash_visible:
-                self.texture = self.hit_r if self.facing_right else self.hit_l
+            # Вспышку рисует шейдер бойцов (FighterShader) по hit_flash_timer
+            self.texture = self.hit_r if self.facing_right else self.hit_l
             return
 
         if self.state == "block":
@@ -823,250 +1109,1957 @@ class Player(arcade.Sprite):
                 self.idle_frame]
 
 
-# =================== GAME WINDOW ===================
-class GameWindow(arcade.Window):
-    def __init__(self):
-        super().__init__(SCREEN_WIDTH, SCREEN_HEIGHT, SCREEN_TITLE)
-        arcade.set_background_color(arcade.color.ARSENIC)
+# =================== INPUT ===================
+class InputEvent:
+    def __init__(self, kind, key, frame):
+        self.kind = kind
+        self.key = key
+        self.time = time.perf_counter()
+        self.frame = frame
 
-        try:
-            from pyglet.image import load as pyglet_load
-            icon_path = os.path.join(TEXTURES_PATH, "Stand_R_1.png")
-            if os.path.exists(icon_path):
-                # Этот метод наследуется от pyglet и устанавливает иконку[citation:2]
-                self.set_icon(pyglet_load(icon_path))
-                print(f"Иконка установлена: {icon_path}")
-            else:
-                print(f"Файл иконки не найден: {icon_path}")
-        except Exception as e:
-            print(f"Не удалось загрузить иконку: {e}")
-            # ====================================================
 
-        self.camera = arcade.Camera2D()
-        self.ui_camera = arcade.Camera2D()
+class BufferedPress:
+    def __init__(self, player, action, event, frames_left):
+        self.player = player
+        self.action = action
+        self.event = event
+        self.frames_left = frames_left
 
-        self.camera = arcade.Camera2D()
-        self.ui_camera = arcade.Camera2D()
 
-        self.state = "MENU"
+class InputLatency:
+    # Задержка от прихода нажатия до изменения состояния бойца: в кадрах
+    # (0 — сработало в первом же кадре после нажатия) и в миллисекундах
+    def __init__(self):
+        self.samples = deque(maxlen=INPUT_LATENCY_SAMPLES)
+        self.dropped = 0
+
+    def add(self, action, frames, event):
+        self.samples.append((action, frames, (time.perf_counter() - event.time) * 1000))
+
+    def summary(self):
+        # Копия одним вызовом: бой в потоке дописывает, пока оверлей читает
+        samples = list(self.samples)
+        if not samples:
+            return {"count": 0, "dropped": self.dropped}
+        frames = sorted(s[1] for s in samples)
+        ms = sorted(s[2] for s in samples)
+        p95 = int(len(frames) * 0.95)
+        return {
+            "count": len(frames),
+            "buffered": sum(1 for f in frames if f > 0),
+            "dropped": self.dropped,
+            "frames_mean": sum(frames) / len(frames),
+            "frames_p95": frames[p95],
+            "frames_max": frames[-1],
+            "ms_mean": sum(ms) / len(ms),
+            "ms_p95": ms[p95],
+            "ms_max": ms[-1],
+        }
 
-        # ===== UI Buttons с новой позицией кнопки Назад =====
-        self.btn_play = UIButton("Играть", SCREEN_WIDTH / 2, 420, 260, 60)
-        self.btn_stats = UIButton("Статистика", SCREEN_WIDTH / 2, 345, 260, 60)
-        self.btn_levels = UIButton("Выбор уровня", SCREEN_WIDTH / 2, 270, 260, 60)
-        self.btn_controls = UIButton("Управление", SCREEN_WIDTH / 2, 195, 260, 60)
-        self.btn_settings = UIButton("Настройки", SCREEN_WIDTH / 2, 120, 260, 60)
-        self.btn_exit = UIButton("Выход", SCREEN_WIDTH / 2, 45, 260, 60)
+    def format(self):
+        s = self.summary()
+        if not s["count"]:
+            return f"Задержка ввода: нет данных (пропущено {s['dropped']})"
+        return (f"Задержка ввода: {s['count']} нажатий, кадров {s['frames_mean']:.2f} "
+                f"(p95 {s['frames_p95']}, макс {s['frames_max']}), мс {s['ms_mean']:.1f} "
+                f"(p95 {s['ms_p95']:.1f}, макс {s['ms_max']:.1f}), "
+                f"из буфера {s['buffered']}, пропущено {s['dropped']}")
+
+
+# =================== COMBAT EVENTS ===================
+# Правила боя сами не играют звуки, не создают частицы и не трясут камеру:
+# что случилось за кадр, они пишут событием в кольцевой буфер боя (emit).
+# В конце тика весь кадр событий одним пакетом уходит подписчикам — звук,
+# частицы, камера окна и телеметрия. HeadlessFight и batch_sim подписчиков
+# не вешают: события пишутся и выбрасываются, на отрисовку ничего не
+# уходит. Всё, что входит в хэш состояния (hit_stop, slow_motion, комбо,
+# stats_hits), по-прежнему меняют сами правила: подписчики на бой не влияют.
+# Бойцы в событиях — номера 0 и 1. x, y — место события (у ударов центр
+# цели), direction — куда смотрит цель или боец, distance — расстояние
+# между бойцами в момент события, timing — сколько кадров держался блок.
+ATTACK_EVENT_FIELDS = "frame attacker target damage x y direction distance timing"
+Hit = namedtuple("Hit", ATTACK_EVENT_FIELDS)
+Blocked = namedtuple("Blocked", ATTACK_EVENT_FIELDS)
+Parried = namedtuple("Parried", ATTACK_EVENT_FIELDS)
+# Удар пришёлся на неуязвимость рывка
+Evaded = namedtuple("Evaded", ATTACK_EVENT_FIELDS)
+KO = namedtuple("KO", ATTACK_EVENT_FIELDS)
+Whiffed = namedtuple("Whiffed", "frame attacker x y direction")
+# Удар о землю в фаталити
+Landed = namedtuple("Landed", "frame player x y")
+DashStarted = namedtuple("DashStarted", "frame player x y direction distance")
+# Шаг бега: x, y — под ногами; loud — кадр звука шагов
+Footstep = namedtuple("Footstep", "frame player x y direction loud")
+
+# За кадр событий единицы: буфера хватает с запасом
+COMBAT_EVENT_BUFFER = 64
+
+
+class CombatEvents:
+    def __init__(self, size=COMBAT_EVENT_BUFFER):
+        self.slots = [None] * size
+        self.start = 0
+        self.count = 0
+        # Переполнение: старые события кадра затираются новыми
+        self.dropped = 0
+
+    def emit(self, event):
+        size = len(self.slots)
+        if self.count == size:
+            self.start = (self.start + 1) % size
+            self.count -= 1
+            self.dropped += 1
+        self.slots[(self.start + self.count) % size] = event
+        self.count += 1
+
+    def pending(self):
+        size = len(self.slots)
+        return [self.slots[(self.start + i) % size] for i in range(self.count)]
+
+    def drain(self):
+        batch = self.pending()
+        self.slots[:] = [None] * len(self.slots)
+        self.start = 0
+        self.count = 0
+        return batch
+
+
+# Вид события для телеметрии (telemetry.EVENT_KINDS)
+TELEMETRY_EVENT_KINDS = {Hit: "hit", Blocked: "block", Parried: "parry", Evaded: "evade", KO: "fatality",
+                         DashStarted: "dash"}
+
+
+def telemetry_events(telemetry, events):
+    for event in events:
+        kind = TELEMETRY_EVENT_KINDS.get(type(event))
+        if kind == "dash":
+            telemetry.event(event.frame, kind, event.player, distance=event.distance)
+        elif kind:
+            telemetry.event(event.frame, kind, event.attacker, event.damage,
+                            distance=event.distance, timing=event.timing)
+
+
+# =================== FIGHT SIMULATION ===================
+# Правила боя без отрисовки: используются и окном игры, и HeadlessFight
+# (бенчмарки, тесты без дисплея). Звук, частицы и камера — подписчики на
+# события боя (COMBAT EVENTS), которых задаёт наследник.
+class FightSimulation:
+    # Запись боя (ReplayRecorder), если идёт
+    recorder = None
+    # Кадров input buffer; 0 — нажатие пробуется один раз, как раньше
+    input_buffer_frames = 0
+    # Покадровая телеметрия (telemetry.TelemetryRecorder), если включена
+    telemetry = None
+    # Хэши состояния в начале каждого кадра (statehash.StateHasher)
+    state_hash = None
+    # Целочисленная физика: FixedGeometry боя, если включена
+    fixed_geometry = None
+    # Подписчики на события боя: f(fight, events) в конце тика
+    combat_subscribers = ()
+
+    def set_fixed_physics(self, enabled):
+        # После create_map и создания бойцов
+        self.fixed_geometry = FixedGeometry(self) if enabled else None
+        for p in self.players:
+            p.fixed = enabled
+            if enabled:
+                p.load_fixed()
 
-        self.btn_level_main = UIButton("Основной уровень", SCREEN_WIDTH / 2, 320, 320, 60)
-        self.btn_level_flat = UIButton("Плоский уровень", SCREEN_WIDTH / 2, 240, 320, 60)
-        self.btn_back = UIButton("Назад", SCREEN_WIDTH / 2, 100, 260, 60)  # Изменена позиция
+    # =================== MAP ===================
+    def create_map(self):
+        self.platforms = arcade.SpriteList(use_spatial_hash=True)
+        self.border_sprites = arcade.SpriteList(use_spatial_hash=True)
 
-        # ===== Settings =====
-        self.settings_shake = True
-        self.settings_slowmo = True
-        self.settings_music = True
-        self.settings_sound = True
+        wall_w = 60
+        wall_h = 700
 
-        # ===== Control Settings =====
-        self.control_settings_buttons = []
-        self.current_control_button = None
-        self.default_controls_p1 = {
-            "left": arcade.key.A,
-            "right": arcade.key.D,
-            "jump": arcade.key.W,
-            "punch": arcade.key.Q,
-            "kick": arcade.key.E,
-            "block": arcade.key.S,
-            "dash": arcade.key.LSHIFT
-        }
-        self.default_controls_p2 = {
-            "left": arcade.key.LEFT,
-            "right": arcade.key.RIGHT,
-            "jump": arcade.key.UP,
-            "punch": arcade.key.K,
-            "kick": arcade.key.L,
-            "block": arcade.key.DOWN,
-            "dash": arcade.key.RSHIFT
-        }
+        left_wall = arcade.Sprite(self.border_texture)
+        left_wall.width = wall_w
+        left_wall.height = wall_h
+        left_wall.center_x = LEVEL_LEFT + wall_w / 2
+        left_wall.center_y = GROUND_Y + wall_h / 2 - 40
 
-        self.controls_p1 = self.load_controls("p1", self.default_controls_p1)
-        self.controls_p2 = self.load_controls("p2", self.default_controls_p2)
+        right_wall = arcade.Sprite(self.border_texture)
+        right_wall.width = wall_w
+        right_wall.height = wall_h
+        right_wall.center_x = LEVEL_RIGHT - wall_w / 2
+        right_wall.center_y = GROUND_Y + wall_h / 2 - 40
 
-        # ===== Level choice =====
-        self.selected_level = "main"
+        self.border_sprites.append(left_wall)
+        self.border_sprites.append(right_wall)
 
-        # ===== Input names =====
-        self.input_stage = 1
-        self.p1_name = ""
-        self.p2_name = ""
+        if self.selected_level == "main":
+            for x, y, w, h in [
+                (200, 260, 280, 40),
+                (650, 300, 320, 40),
+                (1100, 260, 280, 40),
+                (720, 420, 260, 40),
+            ]:
+                s = arcade.Sprite(self.platform_texture)
+                s.width = w
+                s.height = h
+                s.center_x = x
+                s.center_y = y
+                self.platforms.append(s)
 
-        # ===== countdown =====
-        self.countdown_timer = 0
+        elif self.selected_level == "flat":
+            pass
 
-        # ===== fight timer =====
-        self.round_time_left = ROUND_TIME
-        self.round_frame_timer = 0
+    # =================== EVENTS ===================
+    def subscribe(self, subscriber):
+        self.combat_subscribers = [*self.combat_subscribers, subscriber]
 
-        # ===== records =====
-        self.records = self.load_records()
-        self.record_name = ""
-        self.record_wins = 0
-        self.update_record_display()
+    def emit(self, event):
+        self.combat_events.emit(event)
 
-        # ===== textures =====
-        self.bg_far = arcade.load_texture(os.path.join(TEXTURES_PATH, "bg_far.png"))
-        self.bg_mid = arcade.load_texture(os.path.join(TEXTURES_PATH, "bg_mid.png"))
-        self.bg_near = arcade.load_texture(os.path.join(TEXTURES_PATH, "bg_near.png"))
+    def player_index(self, p: Player):
+        return 0 if p is self.p1 else 1
 
-        self.bg_scale = 0.83
-        self.bg_far_factor = 0.10
-        self.bg_mid_factor = 0.20
-        self.bg_near_factor = 0.35
+    def player_distance(self):
+        return abs(self.p1.center_x - self.p2.center_x)
 
-        self.ground_tile = arcade.load_texture(os.path.join(TEXTURES_PATH, "ground_tile.png"))
-        self.platform_texture = arcade.load_texture(os.path.join(TEXTURES_PATH, "Wood.png"))
-        self.border_texture = self.platform_texture
+    def attack_event(self, kind, attacker: Player, target: Player, damage, timing):
+        self.emit(kind(self.frame, self.player_index(attacker), self.player_index(target), damage,
+                       target.center_x, target.center_y, 1 if target.facing_right else -1,
+                       self.player_distance(), timing))
 
-        # ===== sound system =====
-        self.sounds = {}
-        self.music_sound = None
-        self.music_player = None
-        self.load_sounds()
+    def dispatch_events(self):
+        if not self.combat_events.count:
+            return
+        events = self.combat_events.drain()
+        if self.telemetry:
+            telemetry_events(self.telemetry, events)
+        self.present_events(events)
 
-        self.verify_folder_structure()
+    def present_events(self, events):
+        for subscriber in self.combat_subscribers:
+            subscriber(self, events)
 
-        # ===== particle system =====
-        self.particle_system = ParticleSystem()
+    # Кадр боя прошёл (не hit_stop): у окна — частицы и камера
+    def advance_view(self):
+        pass
 
-        # ===== map =====
-        self.platforms = arcade.SpriteList(use_spatial_hash=True)
-        self.border_sprites = arcade.SpriteList(use_spatial_hash=True)
+    # =================== UPDATE ===================
+    def update_fight(self):
+        if self.slow_motion > 0:
+            self.slow_motion -= 1
+        if self.hit_stop > 0:
+            self.hit_stop -= 1
+            return
 
-        self.create_map()
+        self.round_frame_timer += 1
+        if self.round_frame_timer >= 60:
+            self.round_frame_timer = 0
+            self.round_time_left -= 1
+            if self.round_time_left <= 0:
+                if self.p1.health > self.p2.health:
+                    self.end_fight(self.p1)
+                elif self.p2.health > self.p1.health:
+                    self.end_fight(self.p2)
+                else:
+                    self.end_fight(None)
 
-        # ===== players =====
-        self.p1 = Player(200, "P1", arcade.color.BLUE, self.controls_p1)
-        self.p2 = Player(400, "P2", arcade.color.RED, self.controls_p2)
-        self.players = arcade.SpriteList()
-        self.players.extend([self.p1, self.p2])
+        slow_factor = 0.5 if (self.slow_motion > 0 and self.settings_slowmo) else 1.0
 
-        self.keys = set()
-        self.hit_stop = 0
-        self.screen_shake = 0
-        self.slow_motion = 0
-        self.fatality_effects = []
+        for p in self.players:
+            if p.state in ["fatality", "dead"]:
+                p.update_animation()
+                p.update_combo()
+                self.clamp_player_in_level(p)
+                if p.just_landed:
+                    self.emit(Landed(self.frame, self.player_index(p), p.center_x, p.center_y))
+                    p.just_landed = False
+                continue
 
-        self.winner = None
-        self.last_fight_duration = 0
+            p.update_block()
+            p.update_dash()
+            p.update_slide()
 
-        # ===== start background music =====
-        if self.settings_music:
-            self.play_background_music()
+            if p.state == "run" and p.on_ground:
+                p.last_move_time += 1
+                loud = p.last_move_time > 15
+                if loud:
+                    p.last_move_time = 0
 
-    # =================== SOUND SYSTEM ===================
-    def load_sounds(self):
-        sound_files = {
-            "die": "Die.wav",
-            "punch1": "Punch_1.wav",
-            "punch2": "Punch_2.wav",
-            "punch3": "Punch_3.wav",
-            "punch_block": "Punch_block.wav",
-            "punch_miss": "Punch_miss.wav",
-            "fall": "Fall.mp3",
-            "top": "Top.mp3",
-            "run": "Run.mp3",
-        }
+                if p.last_move_time % 5 == 0:
+                    self.emit(Footstep(self.frame, self.player_index(p), p.center_x, p.center_y - p.height / 2,
+                                       1 if p.facing_right else -1, loud))
 
-        for sound_name, filename in sound_files.items():
-            file_path = os.path.join(SOUNDS_PATH, filename)
-            if os.path.exists(file_path):
-                streaming = filename.endswith('.mp3') and sound_name != 'run'
-                self.sounds[sound_name] = arcade.load_sound(file_path, streaming=streaming)
-                print(f"Загружен звук: {sound_name} из {filename}")
+            if p.fixed:
+                self.move_player_fixed(p, slow_factor)
             else:
-                print(f"Предупреждение: файл {file_path} не найден")
-                self.sounds[sound_name] = None
-
-        print(f"Всего загружено {len([s for s in self.sounds.values() if s])} звуков")
-
-    def verify_folder_structure(self):
-        print("\n=== Проверка структуры папок ===")
+                self.move_player(p, slow_factor)
 
-        folders = [ASSET_PATH, SOUNDS_PATH, TEXTURES_PATH]
-        for folder in folders:
-            if os.path.exists(folder):
-                print(f"✓ Папка найдена: {folder}")
-                files = os.listdir(folder)
-                print(f"  Файлов: {len(files)}")
-            else:
-                print(f"✗ Папка отсутствует: {folder}")
+            p.update_attack()
+            p.update_animation()
+            p.update_combo()
 
-        print("\n=== Проверка звуковых файлов ===")
-        sound_files = ["Fall.mp3", "Top.mp3", "Run.mp3", "Die.wav", "Punch_1.wav"]
-        for sf in sound_files:
-            path = os.path.join(SOUNDS_PATH, sf)
-            print(f"{'✓' if os.path.exists(path) else '✗'} {sf}")
+        self.handle_attacks()
+        self.update_controls()
+        self.advance_view()
 
-        print("\n=== Проверка текстур ===")
-        texture_files = ["bg_far.png", "bg_mid.png", "bg_near.png", "Wood.png", "ground_tile.png"]
-        for tf in texture_files:
-            path = os.path.join(TEXTURES_PATH, tf)
-            print(f"{'✓' if os.path.exists(path) else '✗'} {tf}")
+    def move_player(self, p: Player, slow_factor):
+        old_y = p.center_y
 
-    def play_background_music(self):
-        if not self.settings_music:
-            return
+        p.change_y -= GRAVITY * slow_factor
+        p.center_x += p.change_x * slow_factor
+        p.center_y += p.change_y * slow_factor
 
-        # Останавливаем предыдущую музыку, если она играет
-        self.stop_background_music()
+        p.on_ground = False
 
-        music_path = os.path.join(SOUNDS_PATH, "Music.mp3")
+        self.resolve_platform_collisions(p, old_y)
 
-        if not os.path.exists(music_path):
-            alt_names = ["music.mp3", "background.mp3", "background_music.mp3"]
-            for alt_name in alt_names:
-                alt_path = os.path.join(SOUNDS_PATH, alt_name)
-                if os.path.exists(alt_path):
-                    music_path = alt_path
-                    print(f"Найден альтернативный файл: {alt_name}")
-                    break
-            else:
-                print("Музыкальный файл не найден")
-                return
+        if p.center_y <= GROUND_Y + p.height / 2:
+            p.center_y = GROUND_Y + p.height / 2
+            p.change_y = 0
+            p.on_ground = True
 
-        self.music_sound = arcade.Sound(music_path, streaming=True)
-        self.music_player = self.music_sound.play(volume=0.3, loop=True)
+        self.resolve_border_collisions(p)
 
-        if self.music_player:
-            print(f"Фоновая музыка запущена: {os.path.basename(music_path)}")
+        self.clamp_player_in_level(p)
 
+    def move_player_fixed(self, p: Player, slow_factor):
+        # Тот же кадр движения в долях пикселя
+        old_y = p.sub_y
 
-    def stop_background_music(self):
-        if self.music_player:
-            self.music_player.stop()
-            self.music_player = None
-        if hasattr(self, 'music_sound'):
-            self.music_sound = None
+        p.sub_vy -= to_fixed(GRAVITY * slow_factor)
+        p.sub_x += fixed_mul(p.sub_vx, slow_factor)
+        p.sub_y += fixed_mul(p.sub_vy, slow_factor)
 
-    def play_sound(self, sound_name, volume=1.0):
-        if not self.settings_sound:
-            return None
+        p.on_ground = False
 
-        if sound_name not in self.sounds or self.sounds[sound_name] is None:
-            return None
+        self.resolve_platform_collisions_fixed(p, old_y)
 
-        playback = self.sounds[sound_name].play(volume=volume)
-        return playback
+        ground = to_fixed(GROUND_Y + p.height / 2)
+        if p.sub_y <= ground:
+            p.sub_y = ground
+            p.sub_vy = 0
+            p.on_ground = True
 
-    def play_fall_sound(self):
-        self.play_sound("fall", volume=0.7)
+        self.resolve_border_collisions_fixed(p)
 
-    def play_top_sound(self):
-        self.play_sound("top", volume=0.5)
+        self.clamp_player_in_level(p)
 
-    def play_run_sound(self):
-        self.play_sound("run", volume=0.3)
+    # =================== COLLISIONS ===================
+    def clamp_player_in_level(self, p: Player):
+        if p.fixed:
+            self.clamp_player_fixed(p)
+            return
+        half = p.width / 2
+        if p.center_x < LEVEL_LEFT + half + 30:
+            p.center_x = LEVEL_LEFT + half + 30
+            p.change_x = 0
+        if p.center_x > LEVEL_RIGHT - half - 30:
+            p.center_x = LEVEL_RIGHT - half - 30
+            p.change_x = 0
+
+    def resolve_border_collisions(self, p: Player):
+        hits = arcade.check_for_collision_with_list(p, self.border_sprites)
+        if not hits:
+            return
+        for wall in hits:
+            if p.center_x < wall.center_x:
+                p.right = wall.left
+            else:
+                p.left = wall.right
+            p.change_x = 0
+
+    def resolve_platform_collisions(self, p: Player, old_y: float):
+        if p.change_y > 0:
+            return
+        hits = arcade.check_for_collision_with_list(p, self.platforms)
+        if not hits:
+            return
+
+        for plat in hits:
+            plat_top = plat.top
+            player_bottom = p.bottom
+            old_bottom = old_y - p.height / 2
+
+            if old_bottom >= plat_top - 5 and player_bottom <= plat_top + 5:
+                p.bottom = plat_top
+                p.change_y = 0
+                p.on_ground = True
+                return
+
+    def fixed_level_bounds(self, p: Player):
+        half = p.width / 2
+        return to_fixed(LEVEL_LEFT + half + 30), to_fixed(LEVEL_RIGHT - half - 30)
+
+    def clamp_player_fixed(self, p: Player):
+        left, right = self.fixed_level_bounds(p)
+        if p.sub_x < left:
+            p.sub_x = left
+            p.sub_vx = 0
+        if p.sub_x > right:
+            p.sub_x = right
+            p.sub_vx = 0
+        p.sync_fixed()
+
+    def resolve_border_collisions_fixed(self, p: Player):
+        g = self.fixed_geometry
+        for wall in [w for w in g.walls if g.touching(p, w)]:
+            if p.sub_x < wall["center_x"]:
+                p.sub_x = wall["left"] - g.body_right
+            else:
+                p.sub_x = wall["right"] - g.body_left
+            p.sub_vx = 0
+
+    def resolve_platform_collisions_fixed(self, p: Player, old_y):
+        if p.sub_vy > 0:
+            return
+        g = self.fixed_geometry
+        old_bottom = old_y - to_fixed(p.height / 2)
+        margin = to_fixed(5)
+        for plat in g.platforms:
+            if not g.touching(p, plat):
+                continue
+            plat_top = plat["top"]
+            if old_bottom >= plat_top - margin and p.sub_y + g.body_bottom <= plat_top + margin:
+                p.sub_y = plat_top - g.body_bottom
+                p.sub_vy = 0
+                p.on_ground = True
+                return
+
+    # =================== COMBAT ===================
+    def handle_attacks(self):
+        self.check_attack(self.p1, self.p2)
+        self.check_attack(self.p2, self.p1)
+
+    def check_attack(self, attacker: Player, target: Player):
+        if attacker.attacking:
+            if attacker.attack_timer == 8:
+                if not self.attack_connects(attacker, target):
+                    self.emit(Whiffed(self.frame, self.player_index(attacker), attacker.center_x,
+                                      attacker.center_y, 1 if attacker.facing_right else -1))
+
+                    move_direction = 1 if attacker.facing_right else -1
+                    if attacker.fixed:
+                        new_x = attacker.sub_x + move_direction * to_fixed(PUNCH_FORWARD_MOVE)
+                        left, right = self.fixed_level_bounds(attacker)
+                        if left <= new_x <= right:
+                            attacker.sub_x = new_x
+                            attacker.sync_fixed()
+                    else:
+                        new_x = attacker.center_x + move_direction * PUNCH_FORWARD_MOVE
+
+                        if LEVEL_LEFT + attacker.width / 2 + 30 <= new_x <= LEVEL_RIGHT - attacker.width / 2 - 30:
+                            attacker.center_x = new_x
+
+            if attacker.attack_timer == 5 and target.state not in ["fatality", "dead"]:
+                if self.attack_connects(attacker, target):
+                    base_damage = 7
+                    actual_damage = attacker.get_combo_damage(base_damage)
+                    health = target.health
+                    blocking = target.blocking
+                    block_age = BLOCK_DURATION - target.block_timer
+                    evaded = target.dash_invulnerable
+                    result = target.take_hit(actual_damage, attacker.facing_right, attacker.attack_type)
+                    kind = {"fall": KO, "parry": Parried}.get(result) or \
+                        (Evaded if evaded else Blocked if blocking else Hit)
+                    self.attack_event(kind, attacker, target, health - target.health,
+                                      block_age if blocking else -1)
+
+                    attacker.stats_hits += 1
+
+                    if result == "fall":
+                        self.hit_stop = 20
+                        if self.settings_slowmo:
+                            self.slow_motion = FATALITY_SLOW_MO_DURATION
+                    elif result == "parry":
+                        attacker.stunned = True
+                        attacker.stun_timer = STUN_DURATION
+                        attacker.state = "block"
+                        self.hit_stop = 15
+                    else:
+                        self.hit_stop = 6
+                        attacker.add_combo_hit()
+
+                    attacker.attacking = False
+                    attacker.attack_timer = 0
+
+        if target.state == "dead":
+            self.end_fight(attacker)
+
+    def attack_connects(self, attacker: Player, target: Player):
+        direction = 1 if attacker.facing_right else -1
+        if attacker.fixed:
+            g = self.fixed_geometry
+            hitbox = shift_polygon(g.attack_box, attacker.sub_x + direction * to_fixed(45), attacker.sub_y)
+            return fixed_polygons_intersect(hitbox, g.body_at(target))
+        hitbox = arcade.SpriteSolidColor(40, 30, arcade.color.RED)
+        hitbox.center_x = attacker.center_x + direction * 45
+        hitbox.center_y = attacker.center_y
+        return arcade.check_for_collision(hitbox, target)
+
+    # =================== INPUT ===================
+    # События клавиатуры не применяются посреди кадра: они получают метку
+    # времени, ждут в очереди и разбираются в начале следующего тика. Так
+    # и удары, и движение видят нажатие в одном и том же кадре.
+    def init_input(self):
+        self.input_queue = deque()
+        self.input_buffer = []
+        self.pending_moves = []
+        self.input_latency = InputLatency()
+        # События боя не переходят из одного боя в другой
+        self.combat_events = CombatEvents()
+
+    def queue_input(self, kind, key):
+        self.input_queue.append(InputEvent(kind, key, self.frame))
+
+    def tick(self):
+        if self.state_hash:
+            self.state_hash.record(self)
+        self.consume_inputs()
+        self.frame += 1
+        self.update_fight()
+        self.track_move_latency()
+        self.dispatch_events()
+        if self.telemetry:
+            self.telemetry.record(self)
+
+    def finish_telemetry(self, winner_player):
+        # Последний кадр записывается здесь: бой закончился внутри update_fight
+        # События кадра, в котором кончился бой, тоже идут в запись
+        telemetry_events(self.telemetry, self.combat_events.pending())
+        recorder, self.telemetry = self.telemetry, None
+        winner = None if winner_player is None else (0 if winner_player is self.p1 else 1)
+        recorder.finish(self, winner)
+        return recorder
+
+    def consume_inputs(self):
+        # Во время hit_stop бой стоит: нажатия ждут в буфере и срабатывают,
+        # когда он продолжится
+        frozen = self.hit_stop > 0 and self.input_buffer_frames > 0
+
+        while self.input_queue:
+            event = self.input_queue.popleft()
+            if self.recorder:
+                self.recorder.key(self.frame, event.kind, event.key)
+            if event.kind == "press":
+                self.keys.add(event.key)
+                self.handle_fight_key(event)
+            else:
+                self.keys.discard(event.key)
+                self.handle_fight_key_release(event.key)
+
+        if frozen:
+            return
+        waiting = []
+        for press in self.input_buffer:
+            if self.try_action(press.player, press.action):
+                self.input_latency.add(press.action, self.frame - press.event.frame, press.event)
+            elif press.frames_left > 0:
+                press.frames_left -= 1
+                waiting.append(press)
+            else:
+                self.input_latency.dropped += 1
+        self.input_buffer = waiting
+
+    def try_action(self, p: Player, action):
+        before = (p.state, p.attacking, p.attack_timer, p.attack_index, p.blocking, p.dashing, p.change_y)
+        self.player_action(p, action)
+        return before != (p.state, p.attacking, p.attack_timer, p.attack_index, p.blocking, p.dashing,
+                          p.change_y)
+
+    def track_move_latency(self):
+        # Движение опрашивается в update_controls: нажатие сработало, когда
+        # боец пошёл в эту сторону
+        waiting = []
+        for p, action, event in self.pending_moves:
+            if (p.walking_left if action == "left" else p.walking_right):
+                self.input_latency.add(action, self.frame - 1 - event.frame, event)
+            elif event.key in self.keys and self.frame - event.frame < MOVE_LATENCY_TIMEOUT:
+                waiting.append((p, action, event))
+        self.pending_moves = waiting
+
+    # =================== CONTROLS ===================
+    def fighting(self):
+        return self.state == "FIGHT"
+
+    def update_controls(self):
+        if not self.fighting():
+            return
+
+        for i, p in enumerate((self.p1, self.p2)):
+            if p.cpu:
+                p.cpu.update(self)
+                if self.recorder:
+                    self.recorder.cpu(self.frame, i, "held", p.cpu.held)
+
+        self.update_player_controls(self.p1)
+        self.update_player_controls(self.p2)
+
+    def attach_cpu(self, slot, level):
+        self.p1.cpu = None
+        self.p2.cpu = None
+        if slot == "p1":
+            self.p1.cpu = CpuOpponent(self.p1, self.p2, level)
+        elif slot == "p2":
+            self.p2.cpu = CpuOpponent(self.p2, self.p1, level)
+
+    def is_action_held(self, p: Player, action):
+        if p.cpu:
+            return action in p.cpu.held
+        return p.controls[action] in self.keys
+
+    def update_player_controls(self, p: Player):
+        if p.state not in ["hit", "fatality", "dead", "dash", "slide", "stunned"]:
+            p.walking_left = False
+            p.walking_right = False
+
+            left_pressed = self.is_action_held(p, "left")
+            right_pressed = self.is_action_held(p, "right")
+
+            if left_pressed and not right_pressed:
+                p.set_velocity(x=-PLAYER_SPEED)
+                p.facing_right = False
+                p.walking_left = True
+                if p.state != "run":
+                    p.state = "run"
+            elif right_pressed and not left_pressed:
+                p.set_velocity(x=PLAYER_SPEED)
+                p.facing_right = True
+                p.walking_right = True
+                if p.state != "run":
+                    p.state = "run"
+            else:
+                if p.change_x != 0 and p.on_ground and not p.sliding:
+                    p.start_slide(p.change_x / abs(p.change_x) if p.change_x != 0 else 0)
+                elif not p.sliding:
+                    p.set_velocity(x=0)
+                    if p.state == "run":
+                        p.state = "idle"
+
+    def handle_fight_key(self, event):
+        for p in (self.p1, self.p2):
+            if p.cpu:
+                continue
+            for action in ["jump", "punch", "kick", "block", "dash"]:
+                if event.key == p.controls[action]:
+                    self.input_buffer.append(BufferedPress(p, action, event, self.input_buffer_frames))
+            for action in ["left", "right"]:
+                if event.key == p.controls[action]:
+                    self.pending_moves.append((p, action, event))
+
+    def handle_fight_key_release(self, key):
+        for p in (self.p1, self.p2):
+            if not p.cpu and key == p.controls["block"]:
+                # Блок держится, пока зажата клавиша: отпущенный не ждёт в буфере
+                self.input_buffer = [b for b in self.input_buffer if not (b.player is p and b.action == "block")]
+                self.player_release(p, "block")
+
+    def player_action(self, p: Player, action):
+        if self.recorder and p.cpu:
+            self.recorder.cpu(self.frame, 0 if p is self.p1 else 1, "action", action)
+
+        if action == "jump" and p.on_ground and p.state not in ["fatality", "dead", "slide"]:
+            p.set_velocity(y=JUMP_SPEED)
+            p.state = "jump"
+
+        if action == "punch" and p.state not in ["fatality", "dead", "dash", "slide", "stunned"]:
+            p.attack("punch")
+
+        if action == "kick" and p.state not in ["fatality", "dead", "dash", "slide", "stunned"]:
+            p.attack("kick")
+
+        if action == "block" and p.state not in ["fatality", "dead", "dash", "slide", "attack"]:
+            p.start_block()
+
+        if action == "dash" and p.state not in ["fatality", "dead", "slide"]:
+            p.start_dash()
+        # Только начавшийся рывок: нажатие из буфера повторяется, пока рывок
+        # на перезарядке. След рывка рисует шейдер бойцов
+        if action == "dash" and p.dashing and p.dash_timer == DASH_DURATION:
+            self.emit(DashStarted(self.frame, self.player_index(p), p.center_x, p.center_y,
+                                  p.dash_direction, self.player_distance()))
+
+    def player_release(self, p: Player, action):
+        if self.recorder and p.cpu:
+            self.recorder.cpu(self.frame, 0 if p is self.p1 else 1, "release", action)
+
+        if action == "block" and p.blocking:
+            p.block_timer = 0
+
+
+# =================== RENDER SCALE ===================
+RENDER_SCALE_VERTEX = """
+#version 330
+in vec2 in_vert;
+in vec2 in_uv;
+out vec2 uv;
+uniform vec2 scale;
+void main() {
+    gl_Position = vec4(in_vert, 0.0, 1.0);
+    uv = in_uv * scale;
+}
+"""
+
+RENDER_SCALE_FRAGMENT = """
+#version 330
+uniform sampler2D world;
+uniform vec2 scale;
+uniform vec2 texel;
+// Пост-эффекты мира: сдвиг тряски (в UV), сила виньетки, обесцвечивание
+uniform vec2 shake;
+uniform float vignette;
+uniform float desaturate;
+in vec2 uv;
+out vec4 color;
+void main() {
+    // Сдвинутая картинка не должна захватить край буфера вне мира
+    vec2 p = clamp(uv + shake, texel * 0.5, scale - texel * 0.5);
+    vec3 c = texture(world, p).rgb;
+    c = mix(c, vec3(dot(c, vec3(0.299, 0.587, 0.114))), desaturate);
+    float edge = length(uv / scale - 0.5);
+    c *= 1.0 - vignette * smoothstep(0.3, 0.75, edge);
+    color = vec4(c, 1.0);
+}
+"""
+
+
+class RenderScaler:
+    # Мир (всё под self.camera) рисуется в левый нижний угол своего буфера
+    # размером scale от окна и растягивается на окно. Буфер выделяется один
+    # раз под полный размер, меняется только viewport камеры. Тем же
+    # проходом накладываются тряска, виньетка и обесцвечивание (effects).
+    # Время мира: GPU timer query, результаты читаются кадра через три,
+    # чтобы не ждать видеокарту. У программного рендера (llvmpipe) query
+    # меряет только отправку команд — там время мира меряется по часам
+    # между ctx.finish(), рисует всё равно процессор.
+    def __init__(self, window, fixed=None, budget_ms=WORLD_GPU_BUDGET_MS):
+        self.window = window
+        self.ctx = window.ctx
+        self.fixed = fixed
+        self.budget_ms = budget_ms
+        self.scale = fixed or RENDER_SCALE_MAX
+        self.samples = deque(maxlen=RENDER_SCALE_SAMPLES)
+        self.world_ms = 0.0
+        self.fbo = None
+        self.viewport = None
+
+        renderer = self.ctx.info.RENDERER.lower()
+        self.software = any(name in renderer for name in ("llvmpipe", "softpipe", "swrast", "software"))
+        self.queries = None
+        if self.ctx.gl_api == "opengl" and not self.software:
+            self.queries = (gl.GLuint * RENDER_SCALE_QUERIES)()
+            gl.glGenQueries(RENDER_SCALE_QUERIES, self.queries)
+        self.pending = deque()
+        self.next_query = 0
+        self.started = 0.0
+
+        self.program = self.ctx.program(vertex_shader=RENDER_SCALE_VERTEX, fragment_shader=RENDER_SCALE_FRAGMENT)
+        self.quad = geometry.quad_2d_fs()
+
+    def begin(self, camera):
+        width, height = self.window.get_framebuffer_size()
+        if self.fbo is None or self.fbo.size != (width, height):
+            texture = self.ctx.texture((width, height), filter=(self.ctx.LINEAR, self.ctx.LINEAR))
+            self.fbo = self.ctx.framebuffer(color_attachments=[texture])
+        self.viewport = (max(1, round(width * self.scale)), max(1, round(height * self.scale)))
+
+        camera.render_target = self.fbo
+        camera.viewport = arcade.LBWH(0, 0, *self.viewport)
+        self.fbo.use()
+        self.fbo.clear(color=self.window.background_color)
+
+        if self.queries:
+            gl.glBeginQuery(gl.GL_TIME_ELAPSED, self.queries[self.next_query])
+        else:
+            self.ctx.finish()
+            self.started = time.perf_counter()
+
+    def end(self, effects=None):
+        if self.queries:
+            gl.glEndQuery(gl.GL_TIME_ELAPSED)
+            self.pending.append(self.queries[self.next_query])
+            self.next_query = (self.next_query + 1) % RENDER_SCALE_QUERIES
+            self.read_queries()
+        else:
+            self.ctx.finish()
+            self.add_sample((time.perf_counter() - self.started) * 1000)
+
+        screen = self.ctx.screen
+        screen.use()
+        self.ctx.viewport = (0, 0, *screen.size)
+        self.fbo.color_attachments[0].use(0)
+        scale = (self.viewport[0] / self.fbo.width, self.viewport[1] / self.fbo.height)
+        self.program["scale"] = scale
+        self.program["texel"] = (1 / self.fbo.width, 1 / self.fbo.height)
+        shake, vignette, desaturate = effects or ((0, 0), 0.0, 0.0)
+        # Тряска задана в пикселях окна, буфер мира — его уменьшенная копия
+        self.program["shake"] = (shake[0] / self.window.width * scale[0], shake[1] / self.window.height * scale[1])
+        self.program["vignette"] = vignette
+        self.program["desaturate"] = desaturate
+        self.quad.render(self.program)
+
+        if not self.fixed:
+            self.adjust()
+
+    def read_queries(self):
+        # Забираем только готовые результаты; самый старый ждём, лишь когда
+        # все query заняты
+        available = gl.GLint()
+        while self.pending:
+            query = self.pending[0]
+            if len(self.pending) < RENDER_SCALE_QUERIES:
+                gl.glGetQueryObjectiv(query, gl.GL_QUERY_RESULT_AVAILABLE, available)
+                if not available.value:
+                    break
+            elapsed = gl.GLuint64()
+            gl.glGetQueryObjectui64v(query, gl.GL_QUERY_RESULT, elapsed)
+            self.pending.popleft()
+            self.add_sample(elapsed.value / 1e6)
+
+    def add_sample(self, ms):
+        self.world_ms = ms
+        self.samples.append(ms)
+
+    def adjust(self):
+        if len(self.samples) < RENDER_SCALE_SAMPLES:
+            return
+        mean = sum(self.samples) / len(self.samples)
+        if mean > self.budget_ms:
+            # Время мира примерно пропорционально числу пикселей
+            scale = min(self.scale - RENDER_SCALE_STEP, self.scale * math.sqrt(self.budget_ms / mean))
+        elif mean < self.budget_ms * RENDER_SCALE_RAISE:
+            scale = self.scale + RENDER_SCALE_STEP
+        else:
+            return
+        scale = round(round(scale / RENDER_SCALE_STEP) * RENDER_SCALE_STEP, 2)
+        scale = max(RENDER_SCALE_MIN, min(RENDER_SCALE_MAX, scale))
+        if scale != self.scale:
+            self.scale = scale
+            # Новые замеры — уже при новом масштабе
+            self.samples.clear()
+
+
+# =================== FIGHTER SHADER ===================
+# Шейдер списка спрайтов бойцов: тот же вывод, что у arcade, плюс на
+# каждого бойца (номер примитива = номер спрайта в players) вспышка к
+# белому, оттенок и след рывка. След — размытие самого спрайта: квад
+# удлиняется назад на smear ширин, фрагмент собирает несколько выборок
+# в сторону движения. Всё это — в том же вызове отрисовки, без частиц.
+FIGHTER_VERTEX = """
+#version 330
+in vec4 in_pos;
+in vec2 in_size;
+in float in_texture;
+in vec4 in_color;
+out float v_angle;
+out vec4 v_color;
+out vec2 v_size;
+out float v_texture;
+void main() {
+    gl_Position = vec4(in_pos.xyz, 1.0);
+    v_angle = in_pos.w;
+    v_color = in_color;
+    v_size = in_size;
+    v_texture = in_texture;
+}
+"""
+
+FIGHTER_GEOMETRY = """
+#version 330
+#include :system:shaders/lib/sprite.glsl
+layout (points) in;
+layout (triangle_strip, max_vertices = 4) out;
+uniform WindowBlock {
+    mat4 projection;
+    mat4 view;
+} window;
+uniform sampler2D sprite_texture;
+uniform sampler2D uv_texture;
+uniform float uv_offset_bias;
+uniform float smear[2];
+in float v_angle[];
+in vec4 v_color[];
+in vec2 v_size[];
+in float v_texture[];
+out vec2 gs_local;
+out vec4 gs_color;
+flat out int gs_sprite;
+flat out vec2 gs_uv0, gs_uv1, gs_uv2, gs_uv3;
+
+void corner(vec3 center, mat2 rot, mat4 mvp, vec2 local, vec2 hsize) {
+    gl_Position = mvp * vec4(rot * ((local - 0.5) * hsize * 2.0) + center.xy, center.z, 1.0);
+    gs_local = local;
+    EmitVertex();
+}
+
+void main() {
+    int sprite = min(gl_PrimitiveIDIn, 1);
+    vec3 center = gl_in[0].gl_Position.xyz;
+    vec2 hsize = v_size[0] / 2.0;
+    float angle = radians(v_angle[0]);
+    mat2 rot = mat2(cos(angle), -sin(angle), sin(angle), cos(angle));
+    mat4 mvp = window.projection * window.view;
+    getSpriteUVs(uv_texture, int(v_texture[0]), gs_uv0, gs_uv1, gs_uv2, gs_uv3);
+    // Полпикселя внутрь, как у arcade
+    vec2 hp = 0.5 / vec2(textureSize(sprite_texture, 0)) * uv_offset_bias;
+    gs_uv0 += hp;
+    gs_uv1 += vec2(-hp.x, hp.y);
+    gs_uv2 += vec2(hp.x, -hp.y);
+    gs_uv3 -= hp;
+    gs_color = v_color[0];
+    gs_sprite = sprite;
+
+    // Локальные координаты спрайта 0..1; след выходит за них назад
+    float left = -max(smear[sprite], 0.0);
+    float right = 1.0 + max(-smear[sprite], 0.0);
+    corner(center, rot, mvp, vec2(left, 1.0), hsize);
+    corner(center, rot, mvp, vec2(left, 0.0), hsize);
+    corner(center, rot, mvp, vec2(right, 1.0), hsize);
+    corner(center, rot, mvp, vec2(right, 0.0), hsize);
+    EndPrimitive();
+}
+"""
+
+FIGHTER_FRAGMENT = """
+#version 330
+uniform sampler2D sprite_texture;
+uniform vec4 spritelist_color;
+uniform float flash[2];
+uniform vec4 tint[2];
+uniform float smear[2];
+in vec2 gs_local;
+in vec4 gs_color;
+flat in int gs_sprite;
+flat in vec2 gs_uv0, gs_uv1, gs_uv2, gs_uv3;
+out vec4 f_color;
+
+vec4 sample_sprite(vec2 p) {
+    if (p.x < 0.0 || p.x > 1.0) {
+        return vec4(0.0);
+    }
+    // Углы из атласа: у отражённой текстуры u идёт в обратную сторону
+    return texture(sprite_texture, mix(mix(gs_uv2, gs_uv3, p.x), mix(gs_uv0, gs_uv1, p.x), p.y));
+}
+
+vec4 under(vec4 top, vec4 bottom) {
+    float a = top.a + bottom.a * (1.0 - top.a);
+    if (a == 0.0) {
+        return vec4(0.0);
+    }
+    return vec4((top.rgb * top.a + bottom.rgb * bottom.a * (1.0 - top.a)) / a, a);
+}
+
+void main() {
+    vec4 base = sample_sprite(gs_local);
+    float trail = smear[gs_sprite];
+    if (trail != 0.0) {
+        for (int i = 1; i <= SAMPLES; i++) {
+            float t = float(i) / float(SAMPLES);
+            vec4 ghost = sample_sprite(gs_local + vec2(trail * t, 0.0));
+            ghost.rgb = mix(ghost.rgb, vec3(0.0, 1.0, 1.0), 0.6);
+            ghost.a *= (1.0 - t) * 0.5;
+            base = under(base, ghost);
+        }
+    }
+    base *= gs_color * spritelist_color;
+    vec4 shade = tint[gs_sprite];
+    base.rgb = mix(base.rgb, base.rgb * shade.rgb, shade.a);
+    base.rgb = mix(base.rgb, vec3(1.0), flash[gs_sprite]);
+    if (base.a == 0.0) {
+        discard;
+    }
+    f_color = base;
+}
+"""
+
+
+class FighterShader:
+    def __init__(self, ctx):
+        self.ctx = ctx
+        self.program = ctx.program(
+            vertex_shader=FIGHTER_VERTEX,
+            geometry_shader=ctx.shader_inc(FIGHTER_GEOMETRY),
+            fragment_shader=FIGHTER_FRAGMENT.replace("SAMPLES", str(DASH_SMEAR_SAMPLES)),
+        )
+        self.program["sprite_texture"] = 0
+        self.program["uv_texture"] = 1
+
+    @staticmethod
+    def fighter_effects(p):
+        # Вспышка гаснет за время hit_flash_timer, оглушённый — жёлтый,
+        # неуязвимый в рывке — голубой
+        flash = 0.8 * p.hit_flash_timer / (HIT_FLASH_DURATION * 3) if p.state == "hit" else 0.0
+        if p.stunned:
+            tint = (1.0, 0.9, 0.3, 0.6)
+        elif p.dash_invulnerable:
+            tint = (0.6, 1.0, 1.0, 0.5)
+        else:
+            tint = (1.0, 1.0, 1.0, 0.0)
+        smear = 0.0
+        if p.dashing:
+            smear = DASH_SMEAR_LENGTH * p.dash_timer / DASH_DURATION * (1 if p.dash_direction > 0 else -1)
+        return flash, tint, smear
+
+    def draw(self, players, views=None):
+        # Номер спрайта в шейдере — его место в списке, поэтому бойцов двое.
+        # views — бойцы из снимка потока боя, если рисуются их копии
+        effects = [self.fighter_effects(p) for p in (views or players)[:2]]
+        effects += [(0.0, (1.0, 1.0, 1.0, 0.0), 0.0)] * (2 - len(effects))
+        players.initialize()
+        players.data.program = self.program
+        self.program["flash"] = tuple(e[0] for e in effects)
+        self.program["tint"] = tuple(c for e in effects for c in e[1])
+        self.program["smear"] = tuple(e[2] for e in effects)
+        players.draw()
+
+
+# =================== QUALITY ===================
+class QualityGovernor:
+    # Смотрит на время работы кадра и переключает уровни QUALITY_TIERS.
+    # Вниз — сразу, как только средний кадр за QUALITY_DOWN_FRAMES вышел за
+    # бюджет; вверх — только если за QUALITY_UP_FRAMES кадр был заметно
+    # дешевле бюджета, чтобы качество не прыгало туда-обратно. После любой
+    # смены замеры начинаются заново.
+    def __init__(self, pinned=None, budget_ms=QUALITY_BUDGET_MS):
+        self.pinned = pinned is not None
+        self.budget_ms = budget_ms
+        self.tier = pinned or 0
+        self.samples = deque(maxlen=QUALITY_UP_FRAMES)
+        self.cooldown = 0
+
+    @property
+    def quality(self):
+        return QUALITY_TIERS[self.tier]
+
+    def add(self, frame_ms):
+        if self.pinned:
+            return False
+        if self.cooldown > 0:
+            self.cooldown -= 1
+            return False
+        self.samples.append(frame_ms)
+
+        recent = list(self.samples)[-QUALITY_DOWN_FRAMES:]
+        recent_ms = sum(recent) / len(recent)
+        if len(recent) == QUALITY_DOWN_FRAMES and recent_ms > self.budget_ms and \
+                self.tier < len(QUALITY_TIERS) - 1:
+            return self.change(self.tier + 1, recent_ms)
+
+        long_ms = sum(self.samples) / len(self.samples)
+        if len(self.samples) == QUALITY_UP_FRAMES and long_ms < self.budget_ms * QUALITY_UP_RATIO and \
+                self.tier > 0:
+            return self.change(self.tier - 1, long_ms)
+        return False
+
+    def change(self, tier, frame_ms):
+        print(f"Качество: {QUALITY_NAMES[self.tier]} -> {QUALITY_NAMES[tier]} "
+              f"(кадр {frame_ms:.1f} мс, бюджет {self.budget_ms:.1f} мс)")
+        self.tier = tier
+        self.samples.clear()
+        self.cooldown = QUALITY_COOLDOWN_FRAMES
+        return True
+
+
+# =================== SETTINGS FILE ===================
+# Все настройки game_settings.txt: тип и значение по умолчанию. Тип —
+# bool / int / float или список допустимых строк. Файл читает и пишет
+# GameConfig (config.py), дальше настройки — обычные её атрибуты.
+SETTINGS_FIELDS = {
+    "shake": (bool, True),
+    "slowmo": (bool, True),
+    "music": (bool, True),
+    "sound": (bool, True),
+    "cpu": (CPU_SLOTS, "off"),
+    "cpu_level": (list(DIFFICULTY_LEVELS), "normal"),
+    "spectator_port": (int, 0),
+    # "auto" — по времени GPU, число — постоянный процент
+    "render_scale": (["auto"] + [str(p) for p in range(50, 101)], "auto"),
+    # "auto" — QualityGovernor, имя уровня — закреплённое качество
+    "quality": (["auto"] + QUALITY_NAMES, "auto"),
+    "telemetry": (bool, False),
+    # "fixed" — целочисленная физика (FIXED-POINT PHYSICS), со следующего боя
+    "physics": (["float", "fixed"], "float"),
+    "dev_reload": (bool, False),
+    # Счётчики вызовов GL по участкам кадра (gl_stats.py), F4 — снимок кадра
+    "gl_stats": (bool, False),
+    # Бой в своём потоке (SIM THREAD), со следующего боя
+    "sim_thread": (bool, False),
+    # Подстройка без правки кода
+    "round_time": (int, ROUND_TIME),
+    "input_buffer_frames": (int, INPUT_BUFFER_FRAMES),
+    "quality_budget_ms": (float, QUALITY_BUDGET_MS),
+    "world_budget_ms": (float, WORLD_GPU_BUDGET_MS),
+}
+
+
+# =================== HOT RELOAD ===================
+class FileWatcher:
+    # Опрос os.scandir раз в DEV_RELOAD_INTERVAL: сравниваются mtime и
+    # размер. Изменённый (или удалённый) файл отдаётся, только когда его stat
+    # не менялся DEV_RELOAD_SETTLE секунд — редактор успевает дописать файл
+    def __init__(self, paths):
+        self.paths = paths
+        self.known = self.scan()
+        self.pending = {}
+        self.next_scan = 0.0
+
+    def scan(self):
+        stats = {}
+        for path in self.paths:
+            try:
+                if os.path.isdir(path):
+                    with os.scandir(path) as entries:
+                        for entry in entries:
+                            if entry.is_file():
+                                st = entry.stat()
+                                stats[entry.path] = (st.st_mtime_ns, st.st_size)
+                else:
+                    st = os.stat(path)
+                    stats[path] = (st.st_mtime_ns, st.st_size)
+            except OSError:
+                pass
+        return stats
+
+    def poll(self):
+        now = time.monotonic()
+        if now < self.next_scan:
+            return []
+        self.next_scan = now + DEV_RELOAD_INTERVAL
+
+        current = self.scan()
+        for path in current.keys() | self.known.keys():
+            stat = current.get(path)
+            if stat == self.known.get(path):
+                self.pending.pop(path, None)
+            elif path not in self.pending or self.pending[path][0] != stat:
+                self.pending[path] = (stat, now)
+
+        ready = sorted(path for path, (stat, since) in self.pending.items() if now - since >= DEV_RELOAD_SETTLE)
+        for path in ready:
+            stat, _ = self.pending.pop(path)
+            if stat is None:
+                self.known.pop(path, None)
+            else:
+                self.known[path] = stat
+        return ready
+
+
+def parse_tuning(path=TUNING_FILE):
+    # Строки вида GRAVITY = 0.5; значения — литералы Python того же вида,
+    # что и в коде (число или список чисел)
+    values = {}
+    if not os.path.exists(path):
+        return values
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.split('#', 1)[0].strip()
+            if not line:
+                continue
+            name, sep, text = line.partition('=')
+            name = name.strip()
+            if not sep or name not in TUNABLE:
+                print(f"Константы: {name!r} нельзя менять на ходу")
+                continue
+            try:
+                value = ast.literal_eval(text.strip())
+            except (ValueError, SyntaxError):
+                print(f"Константы: не понял значение {name} = {text.strip()!r}")
+                continue
+            default = globals()[name]
+            if isinstance(default, list):
+                ok = isinstance(value, list) and all(isinstance(v, (int, float)) for v in value)
+            else:
+                ok = isinstance(value, (int, float)) and not isinstance(value, bool)
+            if not ok:
+                print(f"Константы: у {name} должно быть {type(default).__name__}, а не {value!r}")
+                continue
+            values[name] = value
+    return values
+
+
+class HotReloader:
+    # Режим разработки: окно опрашивает его в начале on_update, так что
+    # новые константы действуют с ближайшего тика, а бой продолжается
+    def __init__(self, window):
+        self.window = window
+        self.defaults = {name: globals()[name] for name in TUNABLE}
+        self.watcher = FileWatcher([TEXTURES_PATH, SOUNDS_PATH, TUNING_FILE])
+        self.apply_tuning(parse_tuning())
+        print(f"Горячая перезагрузка: {TEXTURES_PATH}, {SOUNDS_PATH}, {TUNING_FILE}")
+
+    def poll(self):
+        changed = self.watcher.poll()
+        if not changed:
+            return
+        textures = [path for path in changed if os.path.dirname(path) == TEXTURES_PATH]
+        sounds = [path for path in changed if os.path.dirname(path) == SOUNDS_PATH]
+        if textures:
+            self.window.reload_textures(textures)
+        if sounds:
+            self.window.reload_sounds(sounds)
+        if TUNING_FILE in changed:
+            self.apply_tuning(parse_tuning())
+        print(f"Перезагружено: {', '.join(os.path.basename(path) for path in changed)}")
+
+    def apply_tuning(self, values):
+        # Строка убрана из файла — константа возвращается к значению из кода
+        for name in TUNABLE:
+            value = values.get(name, self.defaults[name])
+            if globals()[name] != value:
+                print(f"Константы: {name} {globals()[name]} -> {value}")
+                globals()[name] = value
+        if values:
+            print("Константы отличаются от кода: записи этих боёв воспроизводятся только с тем же tuning.txt")
+
+    def restore(self):
+        self.apply_tuning({})
+
+
+# =================== SOUND ASSETS ===================
+# Короткие звуки играются из памяти (StaticSource). WAV с 8/16-битным PCM
+# грузится как есть. Остальное декодируется один раз: MP3 — декодером
+# pyglet, 24-битный WAV и WAVE_FORMAT_EXTENSIBLE (их не читает декодер WAV
+# pyglet) — в audio.py. 16-битный PCM кладётся WAV-файлом в
+# SOUND_CACHE_PATH под crc исходника, и следующие запуски читают готовый
+# PCM без декодера. build_sounds.py делает то же заранее и сверяет
+# SOUND_FILES и MUSIC_FILES с папкой. Музыка читается декодером по ходу
+# игры (MusicLoop в audio.py), начало трека лежит в памяти — стык петли
+# без паузы.
+
+
+def check_sound_manifest():
+    # (ошибки, лишние файлы в папке звуков, файл музыки или None). Без
+    # музыки игра работает, это не ошибка
+    on_disk = set(os.listdir(SOUNDS_PATH)) if os.path.isdir(SOUNDS_PATH) else set()
+    by_stem = {os.path.splitext(name)[0].lower(): name for name in on_disk}
+    problems = []
+    for sound_name, filename in SOUND_FILES.items():
+        if filename not in on_disk:
+            other = by_stem.get(os.path.splitext(filename)[0].lower())
+            hint = f" (в папке есть {other})" if other else ""
+            problems.append(f"{sound_name}: нет файла {filename}{hint}")
+    music = next((name for name in MUSIC_FILES if name in on_disk), None)
+    unused = sorted(on_disk - set(SOUND_FILES.values()) - set(MUSIC_FILES))
+    return problems, unused, music
+
+
+def sound_cache_file(path, crc):
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return os.path.join(SOUND_CACHE_PATH, f"{stem}-{crc:08x}.wav")
+
+
+def decode_to_cache(path, cache_file):
+    # Весь файл -> 16-битный WAV рядом и переименованием на место:
+    # недописанный файл в кэш не попадает
+    if path.lower().endswith(".wav"):
+        (tag, channels, rate, bits), pcm = read_wav(path)
+        data, sample_size = pcm16(tag, bits, pcm), 16
+    else:
+        source = media.load(path, streaming=True)
+        fmt = source.audio_format
+        chunks = []
+        while (audio := source.get_audio_data(fmt.bytes_per_second)) is not None:
+            chunks.append(audio_bytes(audio))
+        source.delete()
+        data, channels, rate, sample_size = b"".join(chunks), fmt.channels, fmt.sample_rate, fmt.sample_size
+
+    os.makedirs(SOUND_CACHE_PATH, exist_ok=True)
+    stem = os.path.basename(cache_file).rsplit("-", 1)[0]
+    for old in os.listdir(SOUND_CACHE_PATH):
+        if old.rsplit("-", 1)[0] == stem and old != os.path.basename(cache_file):
+            os.remove(os.path.join(SOUND_CACHE_PATH, old))
+    temp = cache_file + ".tmp"
+    with wave.open(temp, "wb") as f:
+        f.setnchannels(channels)
+        f.setsampwidth(sample_size // 8)
+        f.setframerate(rate)
+        f.writeframes(data)
+    os.replace(temp, cache_file)
+
+
+def load_effect(path):
+    if path.lower().endswith(".wav") and plain_wav(path):
+        return arcade.load_sound(path)
+    cache_file = sound_cache_file(path, file_crc(path))
+    if not os.path.exists(cache_file):
+        try:
+            decode_to_cache(path, cache_file)
+        except OSError as e:
+            # Кэш не записался (папка только для чтения) — звук всё равно нужен
+            print(f"Кэш звуков недоступен: {e}")
+            return arcade.load_sound(path)
+    return arcade.load_sound(cache_file)
+
+
+# =================== LEVEL ASSETS ===================
+# Что нужно каждому уровню: текстуры (атрибут окна -> файл) и музыка.
+# Текстуры грузятся при выборе уровня в LEVELS и в start_game; общие для
+# уровней (земля, доски) переиспользуются, а те, на которые выбранный
+# уровень не ссылается, отпускаются: атлас arcade освобождает место, когда
+# на текстуру не остаётся ссылок. Слои фона необязательны: если уровень
+# не помещается в TEXTURE_BUDGET_MB, они отбрасываются с конца списка,
+# как при низком качестве.
+TEXTURE_BUDGET_MB = 96
+LEVEL_ASSETS = {
+    "main": {
+        "textures": {"ground_tile": "ground_tile.png", "platform_texture": "Wood.png",
+                     "border_texture": "Wood.png"},
+        "optional": {"bg_near": "bg_near.png", "bg_mid": "bg_mid.png", "bg_far": "bg_far.png"},
+        "music": MUSIC_FILES,
+    },
+    # Вместо фона — заливка DARK_SLATE_BLUE
+    "flat": {
+        "textures": {"ground_tile": "ground_tile.png", "platform_texture": "Wood.png",
+                     "border_texture": "Wood.png"},
+        "optional": {},
+        "music": MUSIC_FILES,
+    },
+}
+LEVEL_TEXTURE_ATTRS = sorted({attr for level in LEVEL_ASSETS.values()
+                             for attr in itertools.chain(level["textures"], level["optional"])})
+LEVEL_TEXTURE_FILES = sorted({name for level in LEVEL_ASSETS.values()
+                             for name in itertools.chain(level["textures"].values(), level["optional"].values())})
+
+
+def image_bytes(path):
+    # RGBA в памяти и в атласе; PIL читает только заголовок
+    with Image.open(path) as image:
+        return image.width * image.height * 4
+
+
+class LevelAssets:
+    def __init__(self, budget_mb=TEXTURE_BUDGET_MB):
+        self.budget = budget_mb * 1024 * 1024
+        # Файл -> (текстура, байт)
+        self.loaded = {}
+
+    def texture(self, name):
+        if name not in self.loaded:
+            path = os.path.join(TEXTURES_PATH, name)
+            self.loaded[name] = (arcade.load_texture(path), image_bytes(path))
+        return self.loaded[name][0]
+
+    def reload(self, name):
+        self.loaded.pop(name, None)
+        return self.texture(name)
+
+    def resident_bytes(self):
+        return sum(size for _, size in self.loaded.values())
+
+    def load(self, level):
+        # Атрибут -> текстура для уровня; None — слой не поместился
+        manifest = LEVEL_ASSETS[level]
+        textures = {attr: self.texture(name) for attr, name in manifest["textures"].items()}
+        used = {name: self.loaded[name][1] for name in manifest["textures"].values()}
+        if sum(used.values()) > self.budget:
+            print(f"Уровень {level}: обязательные текстуры ({sum(used.values()) / 2 ** 20:.1f} МБ) "
+                  f"больше бюджета {self.budget / 2 ** 20:.0f} МБ")
+
+        for attr, name in manifest["optional"].items():
+            size = used.get(name)
+            if size is None:
+                size = self.loaded[name][1] if name in self.loaded else image_bytes(
+                    os.path.join(TEXTURES_PATH, name))
+                if sum(used.values()) + size > self.budget:
+                    print(f"Уровень {level}: {name} не помещается в бюджет текстур, слой пропущен")
+                    textures[attr] = None
+                    continue
+                used[name] = size
+            textures[attr] = self.texture(name)
+
+        # Всё, на что уровень не ссылается, отпускается
+        for name in list(self.loaded):
+            if name not in used:
+                del self.loaded[name]
+        return textures
+
+
+# =================== TEXT ===================
+# pyglet растеризует глиф, когда тот впервые нужен в своём шрифте, размере
+# и начертании, — посреди кадра, ~0.3 мс на глиф: первый счётчик комбо
+# или обратный отсчёт заметно дёргались. GlyphPrewarm заранее кладёт в
+# атласы шрифтов символы TEXT_STYLES: в меню понемногу каждый кадр
+# (TEXT_PREWARM_BUDGET_MS), а то, что нужно бою, — до конца в start_game,
+# пока идёт загрузка. Шрифты держит сам прогрев: кэш шрифтов pyglet
+# слабый, без ссылки прогретый шрифт выбросится. Растущий текст (счётчик
+# комбо) рисуется одним размером шрифта с масштабом, а не новым размером.
+# GlyphStats считает глифы, созданные посреди кадра: видно в оверлее F3.
+TEXT_FONT = ("calibri", "arial")   # шрифт arcade.draw_text по умолчанию
+TEXT_PREWARM_BUDGET_MS = 2.0
+COMBO_FONT_SIZE = 34
+
+TEXT_DIGITS = "0123456789"
+# Имена вводятся только латиницей (NAME_INPUT)
+TEXT_ASCII = "".join(chr(c) for c in range(32, 127))
+TEXT_CYRILLIC = "".join(chr(c) for c in range(ord("А"), ord("я") + 1)) + "Ёё"
+TEXT_ALL = TEXT_ASCII + TEXT_CYRILLIC
+
+# (размер, жирный, символы): сначала то, что впервые появляется в бою
+# (первые TEXT_FIGHT_STYLES), потом экраны меню и результатов
+TEXT_STYLES = [
+    (80, True, "321FIGHT!"),                          # обратный отсчёт
+    (COMBO_FONT_SIZE, True, "COMBO x" + TEXT_DIGITS),
+    (28, True, TEXT_DIGITS),                          # таймер раунда
+    (20, True, ">"),                                  # рывок
+    (13, True, TEXT_DIGITS),
+    (14, True, TEXT_ASCII),                           # имена над бойцами
+    (16, True, TEXT_ASCII + "РЕКОДпобед"),            # полоски здоровья, рекорд
+    (24, True, TEXT_ALL),
+    (20, True, TEXT_ALL),
+    (16, True, TEXT_ALL),
+    (22, True, TEXT_ALL),
+    (26, True, TEXT_ALL),
+    (28, True, TEXT_ALL),
+    (36, True, TEXT_ALL),
+    (44, True, TEXT_ALL),
+    (20, False, TEXT_ALL),
+    (18, False, TEXT_ALL),
+    (16, False, TEXT_ALL),
+    (14, False, TEXT_ALL),
+    (12, False, TEXT_ALL),
+    (11, False, TEXT_ALL),                            # оверлей F3
+]
+TEXT_FIGHT_STYLES = 7
+
+
+class GlyphStats:
+    # Счётчик новых глифов: все шрифты pyglet создают их через
+    # Font.create_glyph
+    def __init__(self):
+        self.created = 0
+        self.installed = False
+        self.stall_frames = 0
+        self.stall_glyphs = 0
+        self.stall_ms = 0.0
+
+    def install(self):
+        if self.installed:
+            return
+        self.installed = True
+        create_glyph = pyglet.font.base.Font.create_glyph
+
+        def counted(font, *args, **kwargs):
+            self.created += 1
+            return create_glyph(font, *args, **kwargs)
+
+        pyglet.font.base.Font.create_glyph = counted
+
+    def frame(self, glyphs, frame_ms):
+        self.stall_frames += 1
+        self.stall_glyphs += glyphs
+        self.stall_ms += frame_ms
+
+
+GLYPH_STATS = GlyphStats()
+
+
+class GlyphPrewarm:
+    def __init__(self, styles=TEXT_STYLES, font_name=TEXT_FONT):
+        GLYPH_STATS.install()
+        # Имя шрифта — так же, как его выбирает arcade.draw_text
+        self.font_name = pyglet.font.load(font_name).name
+        self.pending = deque([i, size, bold, chars] for i, (size, bold, chars) in enumerate(styles))
+        self.fonts = {}
+        self.glyphs = 0
+        self.seconds = 0.0
+
+    @property
+    def done(self):
+        return not self.pending
+
+    def font(self, size, bold):
+        key = (size, bold)
+        if key not in self.fonts:
+            self.fonts[key] = pyglet.font.load(self.font_name, size, weight="bold" if bold else "normal")
+        return self.fonts[key]
+
+    def step(self, budget_ms=TEXT_PREWARM_BUDGET_MS, styles=None):
+        # Прогрев, пока не кончится бюджет; styles — прогреть первые
+        # styles стилей целиком, без бюджета
+        started = time.perf_counter()
+        deadline = started + budget_ms / 1000
+        before = GLYPH_STATS.created
+        while self.pending:
+            entry = self.pending[0]
+            if styles is not None and entry[0] >= styles:
+                break
+            font = self.font(entry[1], entry[2])
+            while entry[3]:
+                font.get_glyphs(entry[3][0])
+                entry[3] = entry[3][1:]
+                if styles is None and time.perf_counter() > deadline:
+                    break
+            if not entry[3]:
+                self.pending.popleft()
+            if styles is None and time.perf_counter() > deadline:
+                break
+        self.glyphs += GLYPH_STATS.created - before
+        self.seconds += time.perf_counter() - started
+
+
+def draw_scaled_text(text, x, y, color, font_size, scale, **kwargs):
+    # Текст одного размера шрифта, увеличенный вокруг (x, y): новый
+    # размер шрифта — новые глифы, а масштаб ничего не растеризует
+    ctx = arcade.get_window().ctx
+    view = ctx.view_matrix
+    ctx.view_matrix = (view @ Mat4.from_translation(Vec3(x, y, 0)) @ Mat4.from_scale(Vec3(scale, scale, 1))
+                       @ Mat4.from_translation(Vec3(-x, -y, 0)))
+    arcade.draw_text(text, x, y, color, font_size, **kwargs)
+    ctx.view_matrix = view
+
+
+# =================== STARTUP PROFILE ===================
+# python main.py --profile-startup: сколько занял каждый этап от запуска
+# до первого нарисованного кадра меню. Импорты в самой игре — одним
+# этапом; по пакетам их раскладывает python -X importtime в отдельном
+# процессе (import_breakdown), когда замер уже закончен. Всё, что нужно
+# только в бою (бойцы, текстуры уровня, звуки, частицы, шейдер бойцов),
+# создаётся в start_game, музыка включается после первого кадра.
+class StartupProfile:
+    def __init__(self):
+        self.stages = [("импорт модулей", STARTUP_IMPORTED - STARTUP_STARTED)]
+        self.last = STARTUP_IMPORTED
+
+    def mark(self, name):
+        now = time.perf_counter()
+        self.stages.append((name, now - self.last))
+        self.last = now
+
+    def format(self):
+        lines = [f"=== Запуск до меню: {(self.last - STARTUP_STARTED) * 1000:.0f} мс ==="]
+        elapsed = 0.0
+        for name, seconds in self.stages:
+            elapsed += seconds
+            lines.append(f"{elapsed * 1000:8.1f} мс  +{seconds * 1000:6.1f}  {name}")
+        return "\n".join(lines)
+
+
+def import_breakdown(module="main", min_ms=5.0):
+    # [(глубина, пакет, мс)] в порядке импорта: что импортирует сам module
+    # (глубина 1) и что внутри них (2), дороже min_ms
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+    entries = []
+    inner = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or line.count("|") != 2:
+            continue
+        _, cumulative, name = line.split("|")
+        if not cumulative.strip().isdigit():
+            continue
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if depth == 0:
+            if name.strip() == module:
+                break
+            entries = []
+            inner = []
+        elif depth <= 2:
+            entry = (depth, name.strip(), int(cumulative) / 1000)
+            # importtime пишет модуль после всего, что он импортировал
+            if depth == 2:
+                inner.append(entry)
+                continue
+            if entry[2] >= min_ms:
+                entries += [entry] + [e for e in inner if e[2] >= min_ms]
+            inner = []
+    return entries
+
+
+# =================== SIM THREAD ===================
+# По желанию (sim_thread=True в game_settings.txt, со следующего боя) бой
+# идёт в своём потоке ровно SIM_STEP на кадр: долгий on_draw (взрыв
+# частиц, новые глифы) не задерживает ни нажатия, ни физику. Отрисовка не
+# читает бойцов напрямую: после каждого кадра поток собирает неизменяемый
+# RenderSnapshot и кладёт его во второй из двух буферов, затем меняет
+# номер переднего — окно всегда видит целый кадр, замков нет. События боя
+# (COMBAT EVENTS) и отметки кадров без hit_stop уходят в окно через deque:
+# звук, частицы и камера остаются в основном потоке, как и весь GL.
+# Нажатия идут в бой через input_queue — тоже deque: append и popleft
+# атомарны, так что очередь без блокировок.
+# Сам поток — SimThread (sim_thread.py), здесь — что он публикует.
+PlayerView = namedtuple("PlayerView", [
+    "name", "name_color", "center_x", "center_y", "height", "texture", "scale",
+    "health", "max_health", "show_combo", "combo_counter", "combo_timer", "dash_cooldown",
+    "state", "hit_flash_timer", "stunned", "dash_invulnerable", "dashing", "dash_timer", "dash_direction",
+])
+player_view_values = operator.attrgetter(*PlayerView._fields)
+RenderSnapshot = namedtuple("RenderSnapshot", "frame players round_time_left slow_motion")
+
+
+def render_snapshot(fight):
+    return RenderSnapshot(fight.frame, (PlayerView(*player_view_values(fight.p1)),
+                                        PlayerView(*player_view_values(fight.p2))),
+                          fight.round_time_left, fight.slow_motion)
+
+
+# =================== GAME WINDOW ===================
+class GameWindow(FightSimulation, arcade.Window):
+    settings_shake = config_setting("shake")
+    settings_slowmo = config_setting("slowmo")
+    settings_music = config_setting("music")
+    settings_sound = config_setting("sound")
+    settings_cpu = config_setting("cpu")
+    settings_cpu_level = config_setting("cpu_level")
+    settings_spectator_port = config_setting("spectator_port")
+    settings_render_scale = config_setting("render_scale")
+    settings_quality = config_setting("quality")
+    settings_telemetry = config_setting("telemetry")
+    input_buffer_frames = config_setting("input_buffer_frames")
+
+    def __init__(self, startup=None):
+        super().__init__(SCREEN_WIDTH, SCREEN_HEIGHT, SCREEN_TITLE)
+        arcade.set_background_color(arcade.color.ARSENIC)
+        # Замеры запуска (STARTUP PROFILE) или None
+        self.startup = startup
+        self.startup_mark("окно и контекст GL")
+
+        try:
+            from pyglet.image import ImageData
+            icon_path = os.path.join(TEXTURES_PATH, "Stand_R_1.png")
+            if os.path.exists(icon_path):
+                # Кадр из атласа бойцов: сам PNG 1000x1000 декодируется дольше
+                # всего остального запуска
+                icon = CHARACTER_ATLAS.texture("Stand_R_1.png").image
+                # Этот метод наследуется от pyglet и устанавливает иконку[citation:2]
+                self.set_icon(ImageData(icon.width, icon.height, "RGBA", icon.tobytes(), -icon.width * 4))
+                print(f"Иконка установлена: {icon_path}")
+            else:
+                print(f"Файл иконки не найден: {icon_path}")
+        except Exception as e:
+            print(f"Не удалось загрузить иконку: {e}")
+            # ====================================================
+        self.startup_mark("иконка")
+
+        self.camera = arcade.Camera2D()
+        self.ui_camera = arcade.Camera2D()
+
+        self.state = "MENU"
+
+        # ===== UI Buttons с новой позицией кнопки Назад =====
+        self.btn_play = UIButton("Играть", SCREEN_WIDTH / 2, 420, 260, 60)
+        self.btn_stats = UIButton("Статистика", SCREEN_WIDTH / 2, 345, 260, 60)
+        self.btn_levels = UIButton("Выбор уровня", SCREEN_WIDTH / 2, 270, 260, 60)
+        self.btn_controls = UIButton("Управление", SCREEN_WIDTH / 2, 195, 260, 60)
+        self.btn_settings = UIButton("Настройки", SCREEN_WIDTH / 2, 120, 260, 60)
+        self.btn_exit = UIButton("Выход", SCREEN_WIDTH / 2, 45, 260, 60)
+
+        self.btn_level_main = UIButton("Основной уровень", SCREEN_WIDTH / 2, 320, 320, 60)
+        self.btn_level_flat = UIButton("Плоский уровень", SCREEN_WIDTH / 2, 240, 320, 60)
+        self.btn_back = UIButton("Назад", SCREEN_WIDTH / 2, 100, 260, 60)  # Изменена позиция
+
+        # ===== Settings =====
+        self.settings = GameConfig(SETTINGS_FILE, SETTINGS_FIELDS,
+                                   {"p1": DEFAULT_CONTROLS_P1, "p2": DEFAULT_CONTROLS_P2})
+
+        # ===== Control Settings =====
+        self.control_settings_buttons = []
+        self.current_control_button = None
+        self.controls_p1 = self.settings.controls_p1
+        self.controls_p2 = self.settings.controls_p2
+        self.startup_mark("кнопки и настройки")
+
+        # ===== Render scale =====
+        self.create_render_scaler()
+        self.show_overlay = False
+        self.frame_times = deque(maxlen=120)
+        self.last_draw_time = None
+
+        # ===== Quality =====
+        self.create_quality_governor()
+        self.work_time = 0.0
+
+        # ===== GPU effects =====
+        # Шейдер бойцов собирается в start_game
+        self.fighter_shader = None
+        self.shake_offset = (0, 0)
+        self.startup_mark("масштаб рендера и качество")
+
+        # ===== Sim thread =====
+        # Поток боя (SIM THREAD) и то, что из него видит окно: снимок кадра,
+        # который сейчас обрабатывается, и спрайты бойцов для отрисовки
+        self.sim_thread = None
+        self.fight_threaded = False
+        self.sim_view = None
+        self.render_players = None
+
+        # ===== Spectators =====
+        self.spectator_server = None
+        if self.settings_spectator_port:
+            self.start_spectator_server(self.settings_spectator_port)
+
+        # ===== Dev hot reload =====
+        self.hot_reloader = HotReloader(self) if self.settings.dev_reload else None
+
+        # ===== GL instrumentation =====
+        self.gl_stats = None
+        self.set_gl_stats(self.settings.gl_stats)
+        self.startup_mark("трансляция, разработка, GL-замеры")
+
+        # ===== Text =====
+        # Глифы шрифтов прогреваются в кадрах меню и в start_game (TEXT)
+        self.glyph_prewarm = GlyphPrewarm()
+        self.startup_mark("шрифты")
+
+        # ===== Level choice =====
+        self.selected_level = "main"
+
+        # ===== Input names =====
+        self.input_stage = 1
+        self.p1_name = ""
+        self.p2_name = ""
+
+        # ===== countdown =====
+        self.countdown_timer = 0
+
+        # ===== fight timer =====
+        self.round_time_left = self.settings.round_time
+        self.round_frame_timer = 0
+
+        # ===== records =====
+        self.records = self.load_records()
+        self.record_name = ""
+        self.record_wins = 0
+        self.update_record_display()
+        self.startup_mark("рекорды")
+
+        # ===== sound system =====
+        # Звуки боя грузятся в start_game, музыка — после первого кадра
+        self.sounds = None
+        self.music_sound = None
+        self.music_player = None
+        self.music_files = None
+        self.music_pending = True
+
+        # ===== textures =====
+        self.bg_scale = 0.83
+        self.bg_far_factor = 0.10
+        self.bg_mid_factor = 0.20
+        self.bg_near_factor = 0.35
+
+        # Текстуры уровня — при выборе уровня и в start_game
+        self.assets = LevelAssets()
+        for attr in LEVEL_TEXTURE_ATTRS:
+            setattr(self, attr, None)
+
+        # ===== particle system =====
+        self.particle_system = None
+
+        # ===== map =====
+        self.platforms = arcade.SpriteList(use_spatial_hash=True)
+        self.border_sprites = arcade.SpriteList(use_spatial_hash=True)
+
+        # ===== players =====
+        # Бойцы появляются в start_game: меню их не показывает
+        self.p1 = None
+        self.p2 = None
+        self.players = arcade.SpriteList()
+
+        self.keys = set()
+        self.hit_stop = 0
+        self.screen_shake = 0
+        self.slow_motion = 0
+        self.fatality_effects = []
+
+        self.winner = None
+        self.last_fight_duration = 0
+        self.frame = 0
+        self.init_input()
+        self.subscribe(GameWindow.combat_audio)
+        self.subscribe(GameWindow.combat_vfx)
+        self.subscribe(GameWindow.combat_camera)
+        self.startup_mark("остальное состояние")
+
+    def startup_mark(self, name):
+        if self.startup:
+            self.startup.mark(name)
+
+    def first_frame_drawn(self):
+        # Окно уже отвечает — теперь можно проверку папок и музыку
+        self.music_pending = False
+        if self.startup:
+            self.startup.mark("первый кадр меню")
+            print(self.startup.format())
+            print("Импорты по пакетам (python -X importtime, отдельный процесс):")
+            for depth, name, ms in import_breakdown():
+                print(f"  {ms:8.1f} мс  {'  ' * (depth - 1)}{name}")
+            self.startup = None
+        self.verify_folder_structure()
+        if self.settings_music:
+            self.play_background_music()
+
+    def prepare_fight(self):
+        # То, что нужно только в бою, создаётся перед первым боем
+        if self.sounds is None:
+            self.sounds = {}
+            self.load_sounds()
+        if self.fighter_shader is None:
+            self.fighter_shader = FighterShader(self.ctx)
+        if self.particle_system is None:
+            self.particle_system = ParticleSystem()
+        # Что меню не успело прогреть из текста боя — сейчас, до отсчёта
+        self.glyph_prewarm.step(styles=TEXT_FIGHT_STYLES)
+
+    # =================== SOUND SYSTEM ===================
+    def load_sounds(self):
+        for sound_name, filename in SOUND_FILES.items():
+            self.load_sound(sound_name, filename)
+
+        print(f"Всего загружено {len([s for s in self.sounds.values() if s])} звуков")
+
+    def load_sound(self, sound_name, filename):
+        file_path = os.path.join(SOUNDS_PATH, filename)
+        if os.path.exists(file_path):
+            try:
+                self.sounds[sound_name] = load_effect(file_path)
+                print(f"Загружен звук: {sound_name} из {filename}")
+            except Exception as e:
+                # Нет подходящего декодера (например, Linux без FFmpeg)
+                print(f"Не удалось загрузить звук {filename}: {e}")
+                self.sounds[sound_name] = None
+        else:
+            print(f"Предупреждение: файл {file_path} не найден")
+            self.sounds[sound_name] = None
+
+    def reload_sounds(self, paths):
+        names = {os.path.basename(path) for path in paths}
+        for sound_name, filename in SOUND_FILES.items():
+            if filename in names and self.sounds is not None:
+                self.load_sound(sound_name, filename)
+        if names & set(MUSIC_FILES) and self.music_player:
+            self.play_background_music()
+
+    def verify_folder_structure(self):
+        print("\n=== Проверка структуры папок ===")
+
+        folders = [ASSET_PATH, SOUNDS_PATH, TEXTURES_PATH]
+        for folder in folders:
+            if os.path.exists(folder):
+                print(f"✓ Папка найдена: {folder}")
+                files = os.listdir(folder)
+                print(f"  Файлов: {len(files)}")
+            else:
+                print(f"✗ Папка отсутствует: {folder}")
+
+        print("\n=== Проверка звуковых файлов ===")
+        problems, unused, music = check_sound_manifest()
+        for problem in problems:
+            print(f"✗ {problem}")
+        if not problems:
+            print(f"✓ Все {len(SOUND_FILES)} звуков на месте")
+        print(f"✓ Музыка: {music}" if music else f"✗ Музыка: нет ни одного из {', '.join(MUSIC_FILES)}")
+        if unused:
+            print(f"  Не используются: {', '.join(unused)}")
+
+        print("\n=== Проверка текстур ===")
+        for tf in LEVEL_TEXTURE_FILES:
+            path = os.path.join(TEXTURES_PATH, tf)
+            print(f"{'✓' if os.path.exists(path) else '✗'} {tf}")
+
+    def play_background_music(self):
+        if not self.settings_music:
+            return
+
+        # Останавливаем предыдущую музыку, если она играет
+        self.stop_background_music()
+
+        music_files = LEVEL_ASSETS[self.selected_level]["music"]
+        self.music_files = music_files
+        music_path = os.path.join(SOUNDS_PATH, music_files[0])
+
+        if not os.path.exists(music_path):
+            for alt_name in music_files[1:]:
+                alt_path = os.path.join(SOUNDS_PATH, alt_name)
+                if os.path.exists(alt_path):
+                    music_path = alt_path
+                    print(f"Найден альтернативный файл: {alt_name}")
+                    break
+            else:
+                print("Музыкальный файл не найден")
+                return
+
+        try:
+            self.music_sound = MusicLoop(music_path)
+        except Exception as e:
+            print(f"Не удалось открыть музыку {os.path.basename(music_path)}: {e}")
+            return
+        self.music_player = media.Player()
+        self.music_player.volume = 0.3
+        self.music_player.queue(self.music_sound)
+        self.music_player.play()
+        print(f"Фоновая музыка запущена: {os.path.basename(music_path)}")
+
+
+    def load_level_assets(self):
+        # Перед create_map: платформы и стены берут текстуры отсюда
+        textures = self.assets.load(self.selected_level)
+        for attr in LEVEL_TEXTURE_ATTRS:
+            setattr(self, attr, textures.get(attr))
+        # Музыка меняется, только если у уровня она другая
+        if self.music_player and self.music_files != LEVEL_ASSETS[self.selected_level]["music"]:
+            self.play_background_music()
+
+    def stop_background_music(self):
+        if self.music_player:
+            # У pyglet.media.Player нет stop(): пауза и освобождение, как в arcade.stop_sound
+            self.music_player.pause()
+            self.music_player.delete()
+            self.music_player = None
+        if self.music_sound:
+            self.music_sound.delete()
+            self.music_sound = None
+
+    def play_sound(self, sound_name, volume=1.0):
+        if not self.settings_sound or not self.sounds:
+            return None
+
+        if sound_name not in self.sounds or self.sounds[sound_name] is None:
+            return None
+
+        playback = self.sounds[sound_name].play(volume=volume)
+        return playback
+
+    # =================== COMBAT EVENT SUBSCRIBERS ===================
+    def combat_audio(self, events):
+        for event in events:
+            kind = type(event)
+            if kind is Hit or kind is Blocked or kind is Evaded:
+                self.play_sound(random.choice(["punch1", "punch2", "punch3"]), 0.6)
+            elif kind is Whiffed:
+                self.play_sound("punch_miss", 0.3)
+            elif kind is Parried:
+                self.play_sound("punch_block", 0.7)
+            elif kind is KO:
+                self.play_sound("die", 0.8)
+                self.play_sound("fall", 0.7)
+            elif kind is Landed:
+                self.play_sound("top", 0.5)
+            elif kind is Footstep and event.loud:
+                self.play_sound("run", 0.3)
+
+    def combat_vfx(self, events):
+        for event in events:
+            kind = type(event)
+            if kind is Hit or kind is Evaded:
+                self.particle_system.create_blood_splash(event.x, event.y, 10)
+            elif kind is Blocked or kind is Parried:
+                self.particle_system.create_block_spark(event.x + 20 * event.direction, event.y, event.direction)
+            elif kind is KO:
+                self.particle_system.create_blood_splash(event.x, event.y, 25)
+            elif kind is Footstep:
+                self.particle_system.create_dust_cloud(event.x - 10 * event.direction, event.y,
+                                                       event.direction, 3)
+
+    def combat_camera(self, events):
+        if not self.settings_shake:
+            return
+        shake = 0
+        for event in events:
+            kind = type(event)
+            if kind is KO:
+                shake = 25
+            elif kind is Parried:
+                shake = 15
+            elif kind is Hit or kind is Blocked or kind is Evaded:
+                shake = 10
+        if shake:
+            # Камера кадра уже посчитана без тряски: первый сдвиг — сразу
+            self.screen_shake = shake
+            self.update_camera()
 
     # =================== RECORDS SYSTEM ===================
     def load_records(self):
@@ -1091,10 +3084,11 @@ class GameWindow(arcade.Window):
         return records
 
     def save_records(self):
-        with open(RECORDS_FILE, 'w', encoding='utf-8') as f:
-            for player_name, stats in self.records.items():
-                line = f"{player_name}:{stats.get('wins', 0)},{stats.get('total_hits', 0)},{stats.get('total_combos', 0)},{stats.get('total_fights', 0)},{stats.get('last_fight', '')}\n"
-                f.write(line)
+        lines = []
+        for player_name, stats in self.records.items():
+            line = f"{player_name}:{stats.get('wins', 0)},{stats.get('total_hits', 0)},{stats.get('total_combos', 0)},{stats.get('total_fights', 0)},{stats.get('last_fight', '')}\n"
+            lines.append(line)
+        DISK_WRITER.replace(RECORDS_FILE, "".join(lines))
 
     def update_record_display(self):
         if self.records:
@@ -1133,41 +3127,85 @@ class GameWindow(arcade.Window):
         self.update_record_display()
 
     # =================== CONTROLS MANAGEMENT ===================
-    def load_controls(self, player, default_controls):
-        controls = default_controls.copy()
-        if os.path.exists(SETTINGS_FILE):
-            with open(SETTINGS_FILE, 'r', encoding='utf-8') as f:
-                for line in f:
-                    line = line.strip()
-                    if line.startswith(f"{player}_"):
-                        parts = line.split('=')
-                        if len(parts) == 2:
-                            key_name = parts[0].replace(f"{player}_", "")
-                            key_value = int(parts[1])
-                            if key_name in controls:
-                                controls[key_name] = key_value
-                    elif line.startswith("shake="):
-                        self.settings_shake = line.split('=')[1].strip() == "True"
-                    elif line.startswith("slowmo="):
-                        self.settings_slowmo = line.split('=')[1].strip() == "True"
-                    elif line.startswith("music="):
-                        self.settings_music = line.split('=')[1].strip() == "True"
-                    elif line.startswith("sound="):
-                        self.settings_sound = line.split('=')[1].strip() == "True"
-        return controls
-
     def save_controls(self):
-        with open(SETTINGS_FILE, 'w', encoding='utf-8') as f:
-            for key_name, key_value in self.controls_p1.items():
-                f.write(f"p1_{key_name}={key_value}\n")
-
-            for key_name, key_value in self.controls_p2.items():
-                f.write(f"p2_{key_name}={key_value}\n")
+        self.settings.save()
 
-            f.write(f"shake={self.settings_shake}\n")
-            f.write(f"slowmo={self.settings_slowmo}\n")
-            f.write(f"music={self.settings_music}\n")
-            f.write(f"sound={self.settings_sound}\n")
+    def create_render_scaler(self):
+        self.render_scaler = None
+        if self.settings_render_scale == "auto":
+            self.render_scaler = RenderScaler(self, budget_ms=self.settings.world_budget_ms)
+        else:
+            # И при 100% мир идёт через буфер: в этом проходе пост-эффекты
+            self.render_scaler = RenderScaler(self, int(self.settings_render_scale) / 100)
+
+    def create_quality_governor(self):
+        pinned = None if self.settings_quality == "auto" else QUALITY_NAMES.index(self.settings_quality)
+        self.quality_governor = QualityGovernor(pinned, self.settings.quality_budget_ms)
+        self.quality = self.quality_governor.quality
+
+    def apply_config(self, changed):
+        # Правка game_settings.txt снаружи, пока игра запущена
+        if "music" in changed:
+            if self.settings_music:
+                self.play_background_music()
+            else:
+                self.stop_background_music()
+        if changed & {"render_scale", "world_budget_ms"}:
+            self.create_render_scaler()
+        if changed & {"quality", "quality_budget_ms"}:
+            self.create_quality_governor()
+        if "spectator_port" in changed and self.settings_spectator_port and not self.spectator_server:
+            self.start_spectator_server(self.settings_spectator_port)
+        if "controls" in changed and self.state == "CONTROL_SETTINGS":
+            self.update_control_display_names()
+        if "gl_stats" in changed:
+            self.set_gl_stats(self.settings.gl_stats)
+        if "dev_reload" in changed:
+            if self.hot_reloader:
+                self.hot_reloader.restore()
+            self.hot_reloader = HotReloader(self) if self.settings.dev_reload else None
+
+    def set_gl_stats(self, enabled):
+        # Обёртки стоят на каждом вызове GL, поэтому только по запросу
+        if enabled and not self.gl_stats:
+            from gl_stats import GLStats
+            sections = [(GameWindow, name) for name in (
+                "draw_fight_screen", "draw_world", "draw_parallax_layer", "draw_ground", "draw_hud",
+                "draw_health_bar", "draw_combo_counter", "draw_dash_cooldown", "draw_overlay", "draw_menu_screens")]
+            sections += [(ParticleSystem, "draw"), (FighterShader, "draw"), (RenderScaler, "begin"),
+                         (RenderScaler, "end"), (arcade.SpriteList, "draw")]
+            self.gl_stats = GLStats(sections, frame_method=(GameWindow, "on_draw")).install()
+        elif not enabled and self.gl_stats:
+            self.gl_stats.uninstall()
+            self.gl_stats = None
+
+    def reload_textures(self, paths):
+        # Фон, земля и платформы меняются по имени файла; спрайты стен и
+        # платформ получают новую текстуру с прежним размером
+        level = LEVEL_ASSETS[self.selected_level]
+        scenery = {}
+        for attr, name in itertools.chain(level["textures"].items(), level["optional"].items()):
+            if getattr(self, attr) is not None:
+                scenery.setdefault(name, []).append(attr)
+        names = {os.path.basename(path) for path in paths}
+        try:
+            for name in names & scenery.keys():
+                texture = self.assets.reload(name)
+                for attr in scenery[name]:
+                    old = getattr(self, attr)
+                    setattr(self, attr, texture)
+                    for sprite in itertools.chain(self.platforms, self.border_sprites):
+                        if sprite.texture is old:
+                            width, height = sprite.width, sprite.height
+                            sprite.texture = texture
+                            sprite.width, sprite.height = width, height
+            if names - set(LEVEL_TEXTURE_FILES):
+                CHARACTER_ATLAS.forget(names)
+                for p in self.players:
+                    p.reload_textures()
+        except OSError as e:
+            # Файл удалён или ещё не дописан — остаются прежние текстуры
+            print(f"Не удалось перезагрузить текстуры: {e}")
 
     def create_control_settings_ui(self):
         self.control_settings_buttons = []
@@ -1252,69 +3290,29 @@ class GameWindow(arcade.Window):
             arcade.key.M: "M", arcade.key.N: "N", arcade.key.O: "O", arcade.key.P: "P",
             arcade.key.Q: "Q", arcade.key.R: "R", arcade.key.S: "S", arcade.key.T: "T",
             arcade.key.U: "U", arcade.key.V: "V", arcade.key.W: "W", arcade.key.X: "X",
-            arcade.key.Y: "Y", arcade.key.Z: "Z",
-            arcade.key.LEFT: "←", arcade.key.RIGHT: "→", arcade.key.UP: "↑", arcade.key.DOWN: "↓",
-            arcade.key.SPACE: "Space", arcade.key.ENTER: "Enter", arcade.key.ESCAPE: "Esc",
-            arcade.key.LSHIFT: "LShift", arcade.key.RSHIFT: "RShift",
-            arcade.key.LCTRL: "LCtrl", arcade.key.RCTRL: "RCtrl",
-            arcade.key.LALT: "LAlt", arcade.key.RALT: "RAlt",
-            arcade.key.TAB: "Tab", arcade.key.BACKSPACE: "Backspace",
-            arcade.key.INSERT: "Ins", arcade.key.DELETE: "Del",
-            arcade.key.HOME: "Home", arcade.key.END: "End",
-            arcade.key.PAGEUP: "PgUp", arcade.key.PAGEDOWN: "PgDown",
-            arcade.key.NUM_0: "Num0", arcade.key.NUM_1: "Num1", arcade.key.NUM_2: "Num2",
-            arcade.key.NUM_3: "Num3", arcade.key.NUM_4: "Num4", arcade.key.NUM_5: "Num5",
-            arcade.key.NUM_6: "Num6", arcade.key.NUM_7: "Num7", arcade.key.NUM_8: "Num8",
-            arcade.key.NUM_9: "Num9"
-        }
-
-        for btn in self.control_settings_buttons:
-            if btn.player == "p1":
-                key_value = self.controls_p1[btn.action_key]
-            else:
-                key_value = self.controls_p2[btn.action_key]
-
-            btn.key_name = key_names.get(key_value, f"Key{key_value}")
-
-    # =================== MAP ===================
-    def create_map(self):
-        self.platforms = arcade.SpriteList(use_spatial_hash=True)
-        self.border_sprites = arcade.SpriteList(use_spatial_hash=True)
-
-        wall_w = 60
-        wall_h = 700
-
-        left_wall = arcade.Sprite(self.border_texture)
-        left_wall.width = wall_w
-        left_wall.height = wall_h
-        left_wall.center_x = LEVEL_LEFT + wall_w / 2
-        left_wall.center_y = GROUND_Y + wall_h / 2 - 40
-
-        right_wall = arcade.Sprite(self.border_texture)
-        right_wall.width = wall_w
-        right_wall.height = wall_h
-        right_wall.center_x = LEVEL_RIGHT - wall_w / 2
-        right_wall.center_y = GROUND_Y + wall_h / 2 - 40
-
-        self.border_sprites.append(left_wall)
-        self.border_sprites.append(right_wall)
+            arcade.key.Y: "Y", arcade.key.Z: "Z",
+            arcade.key.LEFT: "←", arcade.key.RIGHT: "→", arcade.key.UP: "↑", arcade.key.DOWN: "↓",
+            arcade.key.SPACE: "Space", arcade.key.ENTER: "Enter", arcade.key.ESCAPE: "Esc",
+            arcade.key.LSHIFT: "LShift", arcade.key.RSHIFT: "RShift",
+            arcade.key.LCTRL: "LCtrl", arcade.key.RCTRL: "RCtrl",
+            arcade.key.LALT: "LAlt", arcade.key.RALT: "RAlt",
+            arcade.key.TAB: "Tab", arcade.key.BACKSPACE: "Backspace",
+            arcade.key.INSERT: "Ins", arcade.key.DELETE: "Del",
+            arcade.key.HOME: "Home", arcade.key.END: "End",
+            arcade.key.PAGEUP: "PgUp", arcade.key.PAGEDOWN: "PgDown",
+            arcade.key.NUM_0: "Num0", arcade.key.NUM_1: "Num1", arcade.key.NUM_2: "Num2",
+            arcade.key.NUM_3: "Num3", arcade.key.NUM_4: "Num4", arcade.key.NUM_5: "Num5",
+            arcade.key.NUM_6: "Num6", arcade.key.NUM_7: "Num7", arcade.key.NUM_8: "Num8",
+            arcade.key.NUM_9: "Num9"
+        }
 
-        if self.selected_level == "main":
-            for x, y, w, h in [
-                (200, 260, 280, 40),
-                (650, 300, 320, 40),
-                (1100, 260, 280, 40),
-                (720, 420, 260, 40),
-            ]:
-                s = arcade.Sprite(self.platform_texture)
-                s.width = w
-                s.height = h
-                s.center_x = x
-                s.center_y = y
-                self.platforms.append(s)
+        for btn in self.control_settings_buttons:
+            if btn.player == "p1":
+                key_value = self.controls_p1[btn.action_key]
+            else:
+                key_value = self.controls_p2[btn.action_key]
 
-        elif self.selected_level == "flat":
-            pass
+            btn.key_name = key_names.get(key_value, f"Key{key_value}")
 
     # =================== DRAW HELPERS ===================
     def draw_parallax_layer(self, texture, cam_x, cam_y, factor):
@@ -1338,7 +3336,7 @@ class GameWindow(arcade.Window):
         tile_w = self.ground_tile.width
         tile_h = self.ground_tile.height
         ground_scale = 0.15
-        draw_w = tile_w * ground_scale
+        draw_w = tile_w * ground_scale * self.quality["ground_stretch"]
         draw_h = tile_h * ground_scale
 
         start_x = LEVEL_LEFT - 600
@@ -1389,13 +3387,19 @@ class GameWindow(arcade.Window):
             alpha = min(255, player.combo_timer * 4)
 
             size = 24 + min(10, (COMBO_TIMER_MAX - player.combo_timer) // 5)
+            if not self.quality["hud_effects"]:
+                # Без роста и затухания
+                alpha = 255
+                size = 24
 
-            arcade.draw_text(
+            # Рост — масштабом одного шрифта (TEXT)
+            draw_scaled_text(
                 combo_text,
                 x,
                 y,
                 (255, 215, 0, alpha),
-                size,
+                COMBO_FONT_SIZE,
+                size / COMBO_FONT_SIZE,
                 anchor_x="center",
                 bold=True
             )
@@ -1498,22 +3502,82 @@ class GameWindow(arcade.Window):
 
     # =================== GAME LOOP ===================
     def on_draw(self):
+        now = time.perf_counter()
+        if self.last_draw_time:
+            self.frame_times.append(now - self.last_draw_time)
+        self.last_draw_time = now
+        glyphs = GLYPH_STATS.created
+
         self.clear()
 
-        if self.state in ["MENU", "SETTINGS", "LEVELS", "NAME_INPUT", "RESULTS", "CONTROL_SETTINGS", "STATS"]:
+        if self.state in MENU_STATES:
             self.ui_camera.use()
             self.draw_menu_screens()
+            self.draw_overlay()
+            self.work_time = 0.0
+            self.count_new_glyphs(glyphs, now)
+            if self.music_pending:
+                self.first_frame_drawn()
+            return
+
+        self.draw_fight_screen()
+        self.count_new_glyphs(glyphs, now)
+        if self.music_pending:
+            self.first_frame_drawn()
+
+        # Качество подстраивается только по кадрам боя: меню дешёвое
+        self.work_time += time.perf_counter() - now
+        if self.quality_governor.add(self.work_time * 1000):
+            self.quality = self.quality_governor.quality
+        self.work_time = 0.0
+
+    def count_new_glyphs(self, before, started):
+        # Глифы, растеризованные посреди кадра: прогрев их не покрыл
+        glyphs = GLYPH_STATS.created - before
+        if not glyphs:
             return
+        frame_ms = (time.perf_counter() - started) * 1000
+        GLYPH_STATS.frame(glyphs, frame_ms)
+
+    def draw_fight_screen(self):
+        view = self.fight_view()
+        # Мир — в буфер пониженного разрешения, HUD ниже — в полном
+        if self.render_scaler:
+            self.render_scaler.begin(self.camera)
+        self.draw_world(view)
+        if self.render_scaler:
+            self.render_scaler.end(self.post_effects(view))
 
+        self.ui_camera.use()
+        self.draw_hud(view)
+        self.draw_overlay()
+
+    def fight_view(self):
+        if self.sim_thread:
+            return self.sim_thread.snapshot
+        return render_snapshot(self)
+
+    def mirror_players(self, views):
+        # Бойцы потока боя не рисуются: их SpriteList не трогает GL
+        for sprite, view in zip(self.render_players, views):
+            sprite.texture = view.texture
+            sprite.scale = view.scale
+            sprite.position = (view.center_x, view.center_y)
+
+    def draw_world(self, view):
         self.camera.use()
         cam_x, cam_y = self.camera.position
 
         if self.selected_level == "flat":
             arcade.draw_lrbt_rectangle_filled(0, LEVEL_RIGHT, 0, SCREEN_HEIGHT * 2, arcade.color.DARK_SLATE_BLUE)
         else:
-            self.draw_parallax_layer(self.bg_far, cam_x + 5650, cam_y + 4700, self.bg_far_factor)
-            self.draw_parallax_layer(self.bg_mid, cam_x + 2000, cam_y + 1500, self.bg_mid_factor)
-            self.draw_parallax_layer(self.bg_near, cam_x + 1200, cam_y + 600, self.bg_near_factor)
+            layers = self.quality["parallax"]
+            if "far" in layers and self.bg_far:
+                self.draw_parallax_layer(self.bg_far, cam_x + 5650, cam_y + 4700, self.bg_far_factor)
+            if "mid" in layers and self.bg_mid:
+                self.draw_parallax_layer(self.bg_mid, cam_x + 2000, cam_y + 1500, self.bg_mid_factor)
+            if "near" in layers and self.bg_near:
+                self.draw_parallax_layer(self.bg_near, cam_x + 1200, cam_y + 600, self.bg_near_factor)
 
         self.draw_ground()
 
@@ -1522,9 +3586,13 @@ class GameWindow(arcade.Window):
 
         self.particle_system.draw()
 
-        self.players.draw()
+        if self.render_players is not None:
+            self.mirror_players(view.players)
+            self.fighter_shader.draw(self.render_players, view.players)
+        else:
+            self.fighter_shader.draw(self.players)
 
-        for p in self.players:
+        for p in view.players:
             arcade.draw_text(
                 p.name,
                 p.center_x - 20,
@@ -1534,12 +3602,18 @@ class GameWindow(arcade.Window):
                 bold=True
             )
 
-        self.ui_camera.use()
-        self.draw_health_bar(self.p1, 30, SCREEN_HEIGHT - 50)
-        self.draw_health_bar(self.p2, SCREEN_WIDTH - 330, SCREEN_HEIGHT - 50)
+    def post_effects(self, view):
+        slow = min(1.0, view.slow_motion / 20) if self.settings_slowmo else 0.0
+        vignette = min(VIGNETTE_MAX, VIGNETTE_BASE + 0.3 * slow + 0.01 * self.screen_shake)
+        return self.shake_offset, vignette, SLOWMO_DESATURATE * slow
+
+    def draw_hud(self, view):
+        p1, p2 = view.players
+        self.draw_health_bar(p1, 30, SCREEN_HEIGHT - 50)
+        self.draw_health_bar(p2, SCREEN_WIDTH - 330, SCREEN_HEIGHT - 50)
 
         arcade.draw_text(
-            f"{self.round_time_left:02d}",
+            f"{view.round_time_left:02d}",
             SCREEN_WIDTH / 2,
             SCREEN_HEIGHT - 55,
             arcade.color.WHITE,
@@ -1548,11 +3622,11 @@ class GameWindow(arcade.Window):
             bold=True
         )
 
-        self.draw_combo_counter(self.p1, SCREEN_WIDTH / 4, SCREEN_HEIGHT - 110)
-        self.draw_combo_counter(self.p2, SCREEN_WIDTH * 3 / 4, SCREEN_HEIGHT - 110)
+        self.draw_combo_counter(p1, SCREEN_WIDTH / 4, SCREEN_HEIGHT - 110)
+        self.draw_combo_counter(p2, SCREEN_WIDTH * 3 / 4, SCREEN_HEIGHT - 110)
 
-        self.draw_dash_cooldown(self.p1, 60, SCREEN_HEIGHT - 130)
-        self.draw_dash_cooldown(self.p2, SCREEN_WIDTH - 60, SCREEN_HEIGHT - 130)
+        self.draw_dash_cooldown(p1, 60, SCREEN_HEIGHT - 130)
+        self.draw_dash_cooldown(p2, SCREEN_WIDTH - 60, SCREEN_HEIGHT - 130)
 
         if self.record_name:
             arcade.draw_text(
@@ -1585,6 +3659,35 @@ class GameWindow(arcade.Window):
                 bold=True
             )
 
+    def draw_overlay(self):
+        if not self.show_overlay:
+            return
+        lines = []
+        if self.frame_times:
+            frame_ms = sum(self.frame_times) / len(self.frame_times) * 1000
+            lines.append(f"FPS {1000 / frame_ms:.0f}  кадр {frame_ms:.1f} мс  (макс {max(self.frame_times) * 1000:.1f})")
+        if self.render_scaler:
+            source = "часы" if self.render_scaler.software else "GPU"
+            mode = "фикс." if self.render_scaler.fixed else "авто"
+            lines.append(f"Мир {self.render_scaler.world_ms:.1f} мс ({source})  "
+                         f"масштаб {self.render_scaler.scale:.0%} ({mode})")
+        else:
+            lines.append("Мир: полное разрешение")
+        mode = "закреплено" if self.quality_governor.pinned else "авто"
+        lines.append(f"Качество: {self.quality['name']} ({mode})  частиц {len(self.particle_system.particles) if self.particle_system else 0}")
+        # Последнего боя, пока не начался следующий
+        lines.append(self.input_latency.format())
+        if self.sim_thread:
+            lines.append(f"Бой в потоке: кадр {self.sim_thread.ticks}, без догоняния {self.sim_thread.late}")
+        prewarm = self.glyph_prewarm
+        lines.append(f"Глифы: прогрето {prewarm.glyphs} за {prewarm.seconds * 1000:.0f} мс"
+                     f"{'' if prewarm.done else ' (идёт)'}, посреди кадров {GLYPH_STATS.stall_glyphs} "
+                     f"в {GLYPH_STATS.stall_frames} ({GLYPH_STATS.stall_ms:.0f} мс)")
+        if self.gl_stats:
+            lines += self.gl_stats.overlay_lines()
+        for i, line in enumerate(lines):
+            arcade.draw_text(line, 10, 10 + 18 * (len(lines) - 1 - i), arcade.color.YELLOW, 11)
+
     def draw_menu_screens(self):
         arcade.draw_text("Stickman Fighter", SCREEN_WIDTH / 2, 560, arcade.color.WHITE, 44,
                          anchor_x="center", bold=True)
@@ -1638,6 +3741,10 @@ class GameWindow(arcade.Window):
                              arcade.color.LIGHT_GRAY, 18, anchor_x="center")
             arcade.draw_text(f"Звуки: {'ВКЛ' if self.settings_sound else 'ВЫКЛ'} (V)", SCREEN_WIDTH / 2, 220,
                              arcade.color.LIGHT_GRAY, 18, anchor_x="center")
+            arcade.draw_text(f"Компьютер: {CPU_SLOT_NAMES[self.settings_cpu]} (C)", SCREEN_WIDTH / 2, 180,
+                             arcade.color.LIGHT_GRAY, 18, anchor_x="center")
+            arcade.draw_text(f"Сложность: {self.settings_cpu_level} (D)", SCREEN_WIDTH / 2, 140,
+                             arcade.color.LIGHT_GRAY, 18, anchor_x="center")
 
             self.btn_back.draw()
 
@@ -1685,319 +3792,188 @@ class GameWindow(arcade.Window):
             arcade.draw_text("R - Рестарт | ESC - меню", SCREEN_WIDTH / 2, 200,
                              arcade.color.LIGHT_GRAY, 16, anchor_x="center")
 
+    # =================== SPECTATORS ===================
+    def start_spectator_server(self, port):
+        from spectator import SpectatorServer
+        try:
+            self.spectator_server = SpectatorServer(port=port).start()
+            print(f"Трансляция для зрителей: TCP {self.spectator_server.port}, "
+                  f"WebSocket {self.spectator_server.ws_port}")
+        except OSError as e:
+            print(f"Не удалось запустить трансляцию на порту {port}: {e}")
+
     # =================== UPDATE ===================
     def on_update(self, delta_time):
-        if self.state in ["MENU", "SETTINGS", "LEVELS", "NAME_INPUT", "RESULTS", "CONTROL_SETTINGS", "STATS"]:
+        started = time.perf_counter()
+        changed = self.settings.poll()
+        if changed:
+            self.apply_config(changed)
+        if self.hot_reloader:
+            self.hot_reloader.poll()
+        if self.particle_system:
+            self.particle_system.density = self.quality["particles"]
+        if self.sim_thread:
+            self.present_sim_frames()
+        if not self.glyph_prewarm.done and self.state in MENU_STATES:
+            self.glyph_prewarm.step()
+        self.update_game_state()
+        # Кадры боя в потоке зрителям отдаёт сам поток
+        if self.spectator_server and self.state in ["COUNTDOWN", "FIGHT", "RESULTS"] and not self.sim_thread:
+            self.spectator_server.publish(self)
+        self.work_time += time.perf_counter() - started
+
+    def update_game_state(self):
+        if self.state in MENU_STATES:
             return
 
         if self.state == "COUNTDOWN":
             self.countdown_timer -= 1
             if self.countdown_timer <= 0:
                 self.state = "FIGHT"
+                self.frame = 0
+                self.recorder = ReplayRecorder(self)
+                self.state_hash = StateHasher()
+                if self.settings_telemetry:
+                    # numpy нужен только с телеметрией
+                    from telemetry import TelemetryRecorder
+                    self.telemetry = TelemetryRecorder(self, (self.settings.round_time + 10) * 60)
             self.update_camera()
             return
 
-        if self.slow_motion > 0:
-            self.slow_motion -= 1
-        if self.hit_stop > 0:
-            self.hit_stop -= 1
+        if self.fight_threaded:
+            if not self.sim_thread:
+                self.sim_thread = SimThread(self, render_snapshot, GameWindow.publish_spectators)
             return
+        self.tick()
+
+    # =================== SIM THREAD ===================
+    def publish_spectators(self):
+        # Кадры боя в потоке зрителям отдаёт сам поток
+        if self.spectator_server:
+            self.spectator_server.publish(self)
+
+    def present_sim_frames(self):
+        # Кадры, которые бой прошёл с прошлого on_update, — по порядку, как
+        # без потока: шаг частиц и камеры, затем подписчики на события
+        thread = self.sim_thread
+        done = thread.done
+        while thread.output:
+            self.sim_view, stepped, events, result = thread.output.popleft()
+            if stepped:
+                self.particle_system.update()
+                self.update_camera()
+            if events:
+                FightSimulation.present_events(self, events)
+            if result:
+                # Последний кадр боя: поток уже остановился после него
+                thread.stop()
+                done = True
+                self.show_results(*result)
+        self.sim_view = None
+        if done:
+            self.sim_thread = None
+            if thread.error:
+                raise thread.error
+
+    def fighting(self):
+        # Бой в потоке кончился, а итоги основной поток ещё не подвёл
+        return super().fighting() and not (self.sim_thread and self.sim_thread.result)
+
+    def present_events(self, events):
+        if self.sim_thread:
+            self.sim_thread.events = events
+        else:
+            super().present_events(events)
 
-        self.round_frame_timer += 1
-        if self.round_frame_timer >= 60:
-            self.round_frame_timer = 0
-            self.round_time_left -= 1
-            if self.round_time_left <= 0:
-                if self.p1.health > self.p2.health:
-                    self.end_fight(self.p1)
-                elif self.p2.health > self.p1.health:
-                    self.end_fight(self.p2)
-                else:
-                    self.end_fight(None)
-
-        slow_factor = 0.5 if (self.slow_motion > 0 and self.settings_slowmo) else 1.0
-
+    def advance_view(self):
+        if self.sim_thread:
+            self.sim_thread.stepped = True
+            return
         self.particle_system.update()
-
-        for p in self.players:
-            if p.state in ["fatality", "dead"]:
-                p.update_animation()
-                p.update_combo()
-                self.clamp_player_in_level(p)
-                if p.just_landed:
-                    self.play_top_sound()
-                    p.just_landed = False
-                continue
-
-            p.update_block()
-            p.update_dash()
-            p.update_slide()
-
-            if p.state == "run" and p.on_ground:
-                p.last_move_time += 1
-                if p.last_move_time > 15:
-                    self.play_run_sound()
-                    p.last_move_time = 0
-
-                if p.last_move_time % 5 == 0:
-                    self.particle_system.create_dust_cloud(
-                        p.center_x - (10 if p.facing_right else -10),
-                        p.center_y - p.height / 2,
-                        1 if p.facing_right else -1,
-                        3
-                    )
-
-            old_y = p.center_y
-
-            p.change_y -= GRAVITY * slow_factor
-            p.center_x += p.change_x * slow_factor
-            p.center_y += p.change_y * slow_factor
-
-            p.on_ground = False
-
-            self.resolve_platform_collisions(p, old_y)
-
-            if p.center_y <= GROUND_Y + p.height / 2:
-                p.center_y = GROUND_Y + p.height / 2
-                p.change_y = 0
-                p.on_ground = True
-
-            self.resolve_border_collisions(p)
-
-            self.clamp_player_in_level(p)
-
-            p.update_attack()
-            p.update_animation()
-            p.update_combo()
-
-        self.handle_attacks()
-        self.update_controls()
         self.update_camera()
 
-    # =================== COLLISIONS ===================
-    def clamp_player_in_level(self, p: Player):
-        half = p.width / 2
-        if p.center_x < LEVEL_LEFT + half + 30:
-            p.center_x = LEVEL_LEFT + half + 30
-            p.change_x = 0
-        if p.center_x > LEVEL_RIGHT - half - 30:
-            p.center_x = LEVEL_RIGHT - half - 30
-            p.change_x = 0
-
-    def resolve_border_collisions(self, p: Player):
-        hits = arcade.check_for_collision_with_list(p, self.border_sprites)
-        if not hits:
-            return
-        for wall in hits:
-            if p.center_x < wall.center_x:
-                p.right = wall.left
-            else:
-                p.left = wall.right
-            p.change_x = 0
-
-    def resolve_platform_collisions(self, p: Player, old_y: float):
-        if p.change_y > 0:
-            return
-        hits = arcade.check_for_collision_with_list(p, self.platforms)
-        if not hits:
-            return
-
-        for plat in hits:
-            plat_top = plat.top
-            player_bottom = p.bottom
-            old_bottom = old_y - p.height / 2
-
-            if old_bottom >= plat_top - 5 and player_bottom <= plat_top + 5:
-                p.bottom = plat_top
-                p.change_y = 0
-                p.on_ground = True
-                return
-
-    # =================== COMBAT ===================
-    def handle_attacks(self):
-        self.check_attack(self.p1, self.p2)
-        self.check_attack(self.p2, self.p1)
-
-    def check_attack(self, attacker: Player, target: Player):
-        if attacker.attacking:
-            if attacker.attack_timer == 8:
-                direction = 1 if attacker.facing_right else -1
-                hitbox = arcade.SpriteSolidColor(40, 30, arcade.color.RED)
-                hitbox.center_x = attacker.center_x + direction * 45
-                hitbox.center_y = attacker.center_y
-
-                if not arcade.check_for_collision(hitbox, target):
-                    self.play_sound("punch_miss", 0.3)
-
-                    move_direction = 1 if attacker.facing_right else -1
-                    new_x = attacker.center_x + move_direction * PUNCH_FORWARD_MOVE
-
-                    if LEVEL_LEFT + attacker.width / 2 + 30 <= new_x <= LEVEL_RIGHT - attacker.width / 2 - 30:
-                        attacker.center_x = new_x
-
-            if attacker.attack_timer == 5 and target.state not in ["fatality", "dead"]:
-                direction = 1 if attacker.facing_right else -1
-                hitbox = arcade.SpriteSolidColor(40, 30, arcade.color.RED)
-                hitbox.center_x = attacker.center_x + direction * 45
-                hitbox.center_y = attacker.center_y
-
-                if arcade.check_for_collision(hitbox, target):
-                    base_damage = 7
-                    actual_damage = attacker.get_combo_damage(base_damage)
-                    result = target.take_hit(actual_damage, attacker.facing_right, attacker.attack_type)
-
-                    attacker.stats_hits += 1
-
-                    if result == "fall":
-                        self.play_sound("die", 0.8)
-                        self.play_fall_sound()
-                        self.hit_stop = 20
-                        if self.settings_shake:
-                            self.screen_shake = 25
-                        if self.settings_slowmo:
-                            self.slow_motion = FATALITY_SLOW_MO_DURATION
-
-                        self.particle_system.create_blood_splash(
-                            target.center_x, target.center_y, 25
-                        )
-                    elif result == "parry":
-                        attacker.stunned = True
-                        attacker.stun_timer = STUN_DURATION
-                        attacker.state = "block"
-                        self.hit_stop = 15
-                        if self.settings_shake:
-                            self.screen_shake = 15
-
-                        self.play_sound("punch_block", 0.7)
-
-                        self.particle_system.create_block_spark(
-                            target.center_x + (20 if target.facing_right else -20),
-                            target.center_y,
-                            1 if target.facing_right else -1
-                        )
-                    else:
-                        punch_sounds = ["punch1", "punch2", "punch3"]
-                        self.play_sound(random.choice(punch_sounds), 0.6)
-
-                        self.hit_stop = 6
-                        if self.settings_shake:
-                            self.screen_shake = 10
-                        attacker.add_combo_hit()
-
-                        if actual_damage > 0 and not target.blocking:
-                            self.particle_system.create_blood_splash(
-                                target.center_x, target.center_y, 10
-                            )
-                        elif target.blocking:
-                            self.particle_system.create_block_spark(
-                                target.center_x + (20 if target.facing_right else -20),
-                                target.center_y,
-                                1 if target.facing_right else -1
-                            )
-
-                    attacker.attacking = False
-                    attacker.attack_timer = 0
-
-        if target.state == "dead":
-            self.end_fight(attacker)
-
     # =================== CAMERA ===================
     def update_camera(self):
-        mid_x = (self.p1.center_x + self.p2.center_x) / 2
-        mid_y = (self.p1.center_y + self.p2.center_y) / 2
+        # Бойцы — из снимка потока боя, если он обрабатывается
+        p1, p2 = self.sim_view.players if self.sim_view else (self.p1, self.p2)
+        mid_x = (p1.center_x + p2.center_x) / 2
+        mid_y = (p1.center_y + p2.center_y) / 2
 
-        dist = abs(self.p1.center_x - self.p2.center_x)
-        zoom = max(0.65, min(1.2, 850 / (dist + 1)))
+        dist = abs(p1.center_x - p2.center_x)
+        zoom = max(0.65, min(CAMERA_MAX_ZOOM, 850 / (dist + 1)))
 
         shake_x = shake_y = 0
         if self.screen_shake > 0:
             self.screen_shake -= 1
-            intensity = 6
-            shake_x = random.randint(-intensity, intensity)
-            shake_y = random.randint(-intensity, intensity)
-
-        self.camera.position = (mid_x + shake_x, mid_y + shake_y + 130)
+            shake_x = random.randint(-SHAKE_INTENSITY, SHAKE_INTENSITY)
+            shake_y = random.randint(-SHAKE_INTENSITY, SHAKE_INTENSITY)
+
+        # Есть проход пост-эффектов — трясётся готовая картинка, камера стоит
+        self.shake_offset = (shake_x, shake_y) if self.render_scaler else (0, 0)
+        if not self.render_scaler:
+            mid_x += shake_x
+            mid_y += shake_y
+        self.camera.position = (mid_x, mid_y + 130)
         self.camera.zoom = zoom
 
-    # =================== CONTROLS ===================
-    def update_controls(self):
-        if self.state != "FIGHT":
-            return
-
-        if self.p1.state not in ["hit", "fatality", "dead", "dash", "slide", "stunned"]:
-            self.p1.walking_left = False
-            self.p1.walking_right = False
-
-            left_pressed = any(key in self.keys for key in [self.p1.controls["left"]])
-            right_pressed = any(key in self.keys for key in [self.p1.controls["right"]])
-
-            if left_pressed and not right_pressed:
-                self.p1.change_x = -PLAYER_SPEED
-                self.p1.facing_right = False
-                self.p1.walking_left = True
-                if self.p1.state != "run":
-                    self.p1.state = "run"
-            elif right_pressed and not left_pressed:
-                self.p1.change_x = PLAYER_SPEED
-                self.p1.facing_right = True
-                self.p1.walking_right = True
-                if self.p1.state != "run":
-                    self.p1.state = "run"
-            else:
-                if self.p1.change_x != 0 and self.p1.on_ground and not self.p1.sliding:
-                    self.p1.start_slide(self.p1.change_x / abs(self.p1.change_x) if self.p1.change_x != 0 else 0)
-                elif not self.p1.sliding:
-                    self.p1.change_x = 0
-                    if self.p1.state == "run":
-                        self.p1.state = "idle"
-
-        if self.p2.state not in ["hit", "fatality", "dead", "dash", "slide", "stunned"]:
-            self.p2.walking_left = False
-            self.p2.walking_right = False
-
-            left_pressed = any(key in self.keys for key in [self.p2.controls["left"]])
-            right_pressed = any(key in self.keys for key in [self.p2.controls["right"]])
-
-            if left_pressed and not right_pressed:
-                self.p2.change_x = -PLAYER_SPEED
-                self.p2.facing_right = False
-                self.p2.walking_left = True
-                if self.p2.state != "run":
-                    self.p2.state = "run"
-            elif right_pressed and not left_pressed:
-                self.p2.change_x = PLAYER_SPEED
-                self.p2.facing_right = True
-                self.p2.walking_right = True
-                if self.p2.state != "run":
-                    self.p2.state = "run"
-            else:
-                if self.p2.change_x != 0 and self.p2.on_ground and not self.p2.sliding:
-                    self.p2.start_slide(self.p2.change_x / abs(self.p2.change_x) if self.p2.change_x != 0 else 0)
-                elif not self.p2.sliding:
-                    self.p2.change_x = 0
-                    if self.p2.state == "run":
-                        self.p2.state = "idle"
+    def character_pixels(self):
+        # Во сколько раз боец на экране крупнее, чем в мире, когда камера
+        # подъехала ближе всего
+        return self.get_framebuffer_size()[0] / SCREEN_WIDTH * CAMERA_MAX_ZOOM
 
     # =================== GAME FLOW ===================
     def start_game(self):
         # Убрали вызов play_background_music, чтобы музыка не накладывалась
-        self.p1 = Player(200, self.p1_name or "P1", arcade.color.BLUE, self.controls_p1)
-        self.p2 = Player(400, self.p2_name or "P2", arcade.color.RED, self.controls_p2)
-        self.players = arcade.SpriteList()
+        p1_default = "CPU" if self.settings_cpu == "p1" else "P1"
+        p2_default = "CPU" if self.settings_cpu == "p2" else "P2"
+        self.prepare_fight()
+        CHARACTER_ATLAS.select(self.character_pixels())
+        self.p1 = Player(200, self.p1_name or p1_default, arcade.color.BLUE, self.controls_p1)
+        self.p2 = Player(400, self.p2_name or p2_default, arcade.color.RED, self.controls_p2)
+        # Бой в потоке меняет кадры бойцов из своего потока: список ленивый и
+        # не рисуется, иначе каждая новая текстура грузилась бы в атлас (GL)
+        # не из основного потока. Рисуются копии — render_players (SIM THREAD)
+        self.fight_threaded = self.settings.sim_thread
+        self.players = arcade.SpriteList(lazy=self.fight_threaded)
         self.players.extend([self.p1, self.p2])
+        self.attach_cpu(self.settings_cpu, self.settings_cpu_level)
 
-        self.round_time_left = ROUND_TIME
+        self.round_time_left = self.settings.round_time
         self.round_frame_timer = 0
 
+        self.load_level_assets()
         self.create_map()
+        self.set_fixed_physics(self.settings.physics == "fixed")
+
+        self.render_players = None
+        if self.fight_threaded:
+            self.render_players = arcade.SpriteList()
+            self.render_players.extend([arcade.Sprite(p.texture, p.scale) for p in self.players])
 
         self.countdown_timer = 180
+        self.init_input()
         self.state = "COUNTDOWN"
 
     def end_fight(self, winner_player):
+        # Запись и телеметрия закрываются в кадре, где бой кончился, — и в
+        # потоке боя тоже: это его данные, а пишет их DISK_WRITER
+        self.save_replay(winner_player)
+        if self.telemetry:
+            from telemetry import TELEMETRY_DIR
+            recorder = self.finish_telemetry(winner_player)
+            directory = os.path.abspath(TELEMETRY_DIR)
+            DISK_WRITER.call(lambda: recorder.save(directory), "телеметрию боя")
+        if self.sim_thread and self.sim_thread.on_thread():
+            # Итоги (состояние окна, рекорды, статистика) — в основном потоке,
+            # когда он дойдёт до этого кадра (present_sim_frames)
+            self.sim_thread.finish(winner_player)
+            return
+        self.show_results(winner_player)
+
+    def show_results(self, winner_player):
         self.state = "RESULTS"
 
-        duration = ROUND_TIME - self.round_time_left
+        duration = self.settings.round_time - self.round_time_left
         self.last_fight_duration = duration
 
         if winner_player is None:
@@ -2013,11 +3989,21 @@ class GameWindow(arcade.Window):
 
         self.save_stats_file(winner_player)
 
+    def save_replay(self, winner_player):
+        if not self.recorder:
+            return
+        self.recorder.finish(self.frame, None if winner_player is None else winner_player.name, self.state_hash)
+        recorder = self.recorder
+        directory = os.path.abspath(REPLAY_DIR)
+        DISK_WRITER.call(lambda: print(f"Запись боя сохранена в {recorder.save(directory)}"), "запись боя")
+        self.recorder = None
+        self.state_hash = None
+
     def save_stats_file(self, winner_player):
         dt = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
         winner_name = "Ничья" if winner_player is None else winner_player.name
-        duration = ROUND_TIME - self.round_time_left
+        duration = self.settings.round_time - self.round_time_left
 
         battle_record = [
             f"=== Бой {dt} ===",
@@ -2029,10 +4015,8 @@ class GameWindow(arcade.Window):
             ""
         ]
 
-        with open(BATTLE_HISTORY_FILE, "a", encoding="utf-8") as f:
-            f.write("\n".join(battle_record))
-            f.write("\n\n")
-        print(f"Статистика боя сохранена в {BATTLE_HISTORY_FILE}")
+        DISK_WRITER.append(BATTLE_HISTORY_FILE, "\n".join(battle_record) + "\n\n",
+                           done=lambda: print(f"Статистика боя сохранена в {BATTLE_HISTORY_FILE}"))
 
         if winner_player is not None:
             stats = {
@@ -2086,9 +4070,11 @@ class GameWindow(arcade.Window):
         elif self.state == "LEVELS":
             if self.btn_level_main.hit_test(x, y):
                 self.selected_level = "main"
+                self.load_level_assets()
                 self.create_map()
             elif self.btn_level_flat.hit_test(x, y):
                 self.selected_level = "flat"
+                self.load_level_assets()
                 self.create_map()
             elif self.btn_back.hit_test(x, y):
                 self.state = "MENU"
@@ -2115,6 +4101,20 @@ class GameWindow(arcade.Window):
                         break
 
     def on_key_press(self, key, modifiers):
+        if key == arcade.key.F3:
+            self.show_overlay = not self.show_overlay
+            return
+        if key == arcade.key.F4:
+            if self.gl_stats:
+                self.gl_stats.capture_next()
+            else:
+                print("Снимок кадра GL: включите gl_stats=True в game_settings.txt")
+            return
+
+        if self.state == "FIGHT":
+            # Бой читает клавиши в начале своего кадра
+            self.queue_input("press", key)
+            return
         self.keys.add(key)
 
         if self.state == "CONTROL_SETTINGS" and self.current_control_button:
@@ -2163,6 +4163,13 @@ class GameWindow(arcade.Window):
             if key == arcade.key.V:
                 self.settings_sound = not self.settings_sound
                 self.save_controls()
+            if key == arcade.key.C:
+                self.settings_cpu = CPU_SLOTS[(CPU_SLOTS.index(self.settings_cpu) + 1) % len(CPU_SLOTS)]
+                self.save_controls()
+            if key == arcade.key.D:
+                levels = list(DIFFICULTY_LEVELS)
+                self.settings_cpu_level = levels[(levels.index(self.settings_cpu_level) + 1) % len(levels)]
+                self.save_controls()
 
         if self.state == "NAME_INPUT":
             if key == arcade.key.ENTER:
@@ -2192,65 +4199,91 @@ class GameWindow(arcade.Window):
                 self.p1_name = ""
                 self.p2_name = ""
 
-        if self.state != "FIGHT":
-            return
-
-        if key == self.p1.controls["jump"] and self.p1.on_ground and self.p1.state not in ["fatality", "dead", "slide"]:
-            self.p1.change_y = JUMP_SPEED
-            self.p1.state = "jump"
 
-        if key == self.p1.controls["punch"] and self.p1.state not in ["fatality", "dead", "dash", "slide", "stunned"]:
-            self.p1.attack("punch")
-
-        if key == self.p1.controls["kick"] and self.p1.state not in ["fatality", "dead", "dash", "slide", "stunned"]:
-            self.p1.attack("kick")
+    def on_key_release(self, key, modifiers):
+        if self.state == "FIGHT":
+            self.queue_input("release", key)
+            return
+        self.keys.discard(key)
 
-        if key == self.p1.controls["block"] and self.p1.state not in ["fatality", "dead", "dash", "slide", "attack"]:
-            self.p1.start_block()
+    def on_close(self):
+        if self.sim_thread:
+            self.sim_thread.stop()
+        # Отложенная запись настроек и очередь записи не должны потеряться
+        # при выходе
+        self.settings.flush()
+        DISK_WRITER.flush()
+        super().on_close()
+
+
+# =================== HEADLESS ===================
+# Бой без окна, звука и камеры: бенчмарки, прогоны AI и сверка правил.
+# Подписчиков на события боя нет.
+class HeadlessFight(FightSimulation):
+    def __init__(self, level="main", controls_p1=None, controls_p2=None, input_buffer_frames=0, fixed=False):
+        self.selected_level = level
+        self.input_buffer_frames = input_buffer_frames
+        self.settings_shake = True
+        self.settings_slowmo = True
+        self.settings_sound = False
 
-        if key == self.p1.controls["dash"] and self.p1.state not in ["fatality", "dead", "slide"]:
-            self.p1.start_dash()
-            self.particle_system.create_dash_trail(
-                self.p1.center_x,
-                self.p1.center_y,
-                1 if self.p1.facing_right else -1,
-                8
-            )
+        self.platform_texture = arcade.load_texture(os.path.join(TEXTURES_PATH, "Wood.png"))
+        self.border_texture = self.platform_texture
+        self.create_map()
 
-        if key == self.p2.controls["jump"] and self.p2.on_ground and self.p2.state not in ["fatality", "dead", "slide"]:
-            self.p2.change_y = JUMP_SPEED
-            self.p2.state = "jump"
+        self.p1 = Player(200, "P1", arcade.color.BLUE, controls_p1 or DEFAULT_CONTROLS_P1.copy())
+        self.p2 = Player(400, "P2", arcade.color.RED, controls_p2 or DEFAULT_CONTROLS_P2.copy())
+        self.players = arcade.SpriteList()
+        self.players.extend([self.p1, self.p2])
 
-        if key == self.p2.controls["punch"] and self.p2.state not in ["fatality", "dead", "dash", "slide", "stunned"]:
-            self.p2.attack("punch")
+        self.keys = set()
+        self.set_fixed_physics(fixed)
+        self.reset()
 
-        if key == self.p2.controls["kick"] and self.p2.state not in ["fatality", "dead", "dash", "slide", "stunned"]:
-            self.p2.attack("kick")
+    def reset(self):
+        self.p1.reset_for_round(200)
+        self.p2.reset_for_round(400)
+        self.p1.facing_right = True
+        self.p2.facing_right = True
+        self.keys.clear()
+        self.init_input()
 
-        if key == self.p2.controls["block"] and self.p2.state not in ["fatality", "dead", "dash", "slide", "attack"]:
-            self.p2.start_block()
+        self.hit_stop = 0
+        self.slow_motion = 0
+        self.round_time_left = ROUND_TIME
+        self.round_frame_timer = 0
+        self.frame = 0
+        self.winner = None
+        self.state = "FIGHT"
 
-        if key == self.p2.controls["dash"] and self.p2.state not in ["fatality", "dead", "slide"]:
-            self.p2.start_dash()
-            self.particle_system.create_dash_trail(
-                self.p2.center_x,
-                self.p2.center_y,
-                1 if self.p2.facing_right else -1,
-                8
-            )
+    def step(self):
+        if self.state != "FIGHT":
+            return False
+        self.tick()
+        return self.state == "FIGHT"
 
-    def on_key_release(self, key, modifiers):
-        self.keys.discard(key)
+    # Как события окна: ждут в очереди до следующего step()
+    def press(self, key):
+        if self.state == "FIGHT":
+            self.queue_input("press", key)
+        else:
+            self.keys.add(key)
 
+    def release(self, key):
         if self.state == "FIGHT":
-            if key == self.p1.controls["block"] and self.p1.blocking:
-                self.p1.block_timer = 0
-            if key == self.p2.controls["block"] and self.p2.blocking:
-                self.p2.block_timer = 0
+            self.queue_input("release", key)
+        else:
+            self.keys.discard(key)
+
+    def end_fight(self, winner_player):
+        self.state = "RESULTS"
+        self.winner = winner_player
+        if self.telemetry:
+            self.finished_telemetry = self.finish_telemetry(winner_player)
 
 
 def main():
-    GameWindow()
+    GameWindow(startup=StartupProfile() if "--profile-startup" in sys.argv[1:] else None)
     arcade.run()
 
 
@@ -0,0 +1,128 @@
+import atexit
+import os
+import threading
+
+# =================== PERSIST ===================
+# Всё, что игра пишет на диск, идёт через один фоновый поток DISK_WRITER:
+# кадр никогда не ждёт диска. Файл целиком (настройки, рекорды) пишется
+# во временный рядом, сбрасывается на диск (fsync) и заменяет старый одним
+# os.replace: после отключения питания остаётся старый файл или новый, но
+# не обрезанный. История боёв дописывается с fsync — оборваться может
+# только последняя запись. Записи одного файла, до которых поток ещё не
+# дошёл, склеиваются: замена — последней версией, дописывание — одним
+# куском, так что в очереди не больше записи на файл плюс записи боёв и
+# телеметрия. DISK_QUEUE_LIMIT — предел на случай, если диск встал совсем.
+# При выходе очередь дописывается. Модуль не импортирует main.
+
+DISK_QUEUE_LIMIT = 64
+
+
+def sync_directory(directory):
+    # Новое имя файла переживёт отключение питания, когда записана и папка.
+    # В Windows папку так не открыть
+    if os.name != "posix":
+        return
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def write_atomic(path, data):
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    sync_directory(directory)
+
+
+def append_durable(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "ab") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+class DiskWriter:
+    def __init__(self, limit=DISK_QUEUE_LIMIT):
+        self.limit = limit
+        # Ключ -> [действие, путь или что пишется, данные, колбэки после записи]
+        self.jobs = {}
+        self.condition = threading.Condition()
+        self.busy = False
+        self.thread = None
+        self.calls = 0
+        self.written = 0
+        self.coalesced = 0
+
+    # Пути — абсолютные сразу: инструменты меняют папку, пока поток пишет
+    def replace(self, path, data, done=None):
+        # data — текст, байты или функция, которая их вернёт (в потоке записи)
+        path = os.path.abspath(path)
+        self.submit(("replace", path), ["replace", path, data, [done] if done else []])
+
+    def append(self, path, data, done=None):
+        path = os.path.abspath(path)
+        self.submit(("append", path), ["append", path, data, [done] if done else []])
+
+    def call(self, func, what):
+        # Запись, которую делает сам func (запись боя, телеметрия)
+        self.calls += 1
+        self.submit(("call", self.calls), ["call", what, func, []])
+
+    def submit(self, key, job):
+        with self.condition:
+            while len(self.jobs) >= self.limit and key not in self.jobs:
+                self.condition.wait()
+            old = self.jobs.get(key)
+            if old:
+                self.coalesced += 1
+                if job[0] == "append":
+                    job[2] = old[2] + job[2]
+                job[3] = old[3] + job[3]
+            self.jobs[key] = job
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, name="disk-writer", daemon=True)
+                self.thread.start()
+                atexit.register(self.flush)
+            self.condition.notify_all()
+
+    def run(self):
+        while True:
+            with self.condition:
+                while not self.jobs:
+                    self.busy = False
+                    self.condition.notify_all()
+                    self.condition.wait()
+                kind, what, data, callbacks = self.jobs.pop(next(iter(self.jobs)))
+                self.busy = True
+                self.condition.notify_all()
+            try:
+                if kind == "call":
+                    data()
+                else:
+                    if callable(data):
+                        data = data()
+                    if isinstance(data, str):
+                        data = data.encode("utf-8")
+                    (write_atomic if kind == "replace" else append_durable)(what, data)
+                self.written += 1
+                for callback in callbacks:
+                    callback()
+            except Exception as e:
+                # Поток записи не должен умирать: следующие записи важнее
+                print(f"Не удалось сохранить {what}: {e}")
+
+    def flush(self):
+        with self.condition:
+            while self.jobs or self.busy:
+                self.condition.wait()
+
+
+DISK_WRITER = DiskWriter()
@@ -0,0 +1,158 @@
+import datetime
+import json
+import os
+
+# =================== REPLAYS ===================
+# Запись боя: начальные условия и события по кадрам. Правила боя
+# детерминированы, поэтому по записи бой воспроизводится кадр в кадр.
+#   events     — [кадр, "press"/"release", клавиша] — клавиатура игроков,
+#                разбираются в начале кадра кадр+1, как очередь ввода окна
+#   cpu_events — [кадр, игрок, вид, значение] — решения CpuOpponent внутри
+#                update_controls кадра: "held" (зажатые действия),
+#                "action" (player_action), "release" (player_release).
+#                Сам AI ограничен по времени и не повторяется, поэтому
+#                записываются его решения, а не он сам
+#   hashes     — crc32 состояния в начале каждого кадра (statehash.py),
+#                fingerprint — по всему бою; для поиска рассинхрона
+# Модуль не импортирует main: в нём работают с любым FightSimulation.
+
+REPLAY_DIR = "replays"
+REPLAY_KEEP = 50
+REPLAY_VERSION = 1
+
+
+class ReplayRecorder:
+    def __init__(self, fight):
+        players = (fight.p1, fight.p2)
+        fight_keys = {key for p in players for key in p.controls.values()}
+        self.data = {
+            "version": REPLAY_VERSION,
+            "date": datetime.datetime.now().isoformat(timespec="seconds"),
+            "level": fight.selected_level,
+            "slowmo": fight.settings_slowmo,
+            "shake": fight.settings_shake,
+            "names": [p.name for p in players],
+            "controls": [dict(p.controls) for p in players],
+            "cpu": [getattr(p.cpu, "level", None) for p in players],
+            # Клавиши, зажатые ещё во время отсчёта, и то, что осталось от
+            # прошлого боя
+            "held": sorted(fight.keys & fight_keys),
+            # Кадров input buffer: от него зависит, в каком кадре сработает нажатие
+            "input_buffer": fight.input_buffer_frames,
+            # Целочисленная физика считается по своим правилам округления
+            "physics": "fixed" if fight.fixed_geometry else "float",
+            "start": {name: getattr(fight, name) for name in
+                      ("hit_stop", "slow_motion", "round_time_left", "round_frame_timer")},
+            "events": [],
+            "cpu_events": [],
+            "frames": 0,
+            "winner": None,
+        }
+        self.fight_keys = fight_keys
+        self.cpu_held = [None, None]
+
+    def key(self, frame, kind, key):
+        if key in self.fight_keys:
+            self.data["events"].append([frame, kind, key])
+
+    def cpu(self, frame, index, kind, value):
+        if kind == "held":
+            value = sorted(value)
+            if value == self.cpu_held[index]:
+                return
+            self.cpu_held[index] = value
+        self.data["cpu_events"].append([frame, index, kind, value])
+
+    def finish(self, frame, winner, state_hash=None):
+        self.data["frames"] = frame
+        self.data["winner"] = winner
+        if state_hash:
+            # Хэши состояния по кадрам (statehash.py) для desync.py
+            self.data.update(state_hash.to_json())
+        return self.data
+
+    def save(self, directory=REPLAY_DIR):
+        os.makedirs(directory, exist_ok=True)
+        stamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+        path = os.path.join(directory, f"fight_{stamp}.json")
+        save_replay(self.data, path)
+
+        # Хранятся только последние REPLAY_KEEP записей
+        replays = sorted(f for f in os.listdir(directory) if f.startswith("fight_") and f.endswith(".json"))
+        for old in replays[:-REPLAY_KEEP]:
+            os.remove(os.path.join(directory, old))
+        return path
+
+
+def save_replay(data, path):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+
+
+def load_replay(path):
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    if data.get("version") != REPLAY_VERSION:
+        raise ValueError(f"Неподдерживаемая версия записи: {data.get('version')}")
+    return data
+
+
+class ScriptedCpu:
+    # Подменяет CpuOpponent при воспроизведении: повторяет записанные решения
+    def __init__(self, player, index, cpu_events, level=None):
+        self.player = player
+        self.level = level
+        self.held = set()
+        self.by_frame = {}
+        for frame, who, kind, value in cpu_events:
+            if who == index:
+                self.by_frame.setdefault(frame, []).append((kind, value))
+
+    def update(self, fight):
+        for kind, value in self.by_frame.get(fight.frame, ()):
+            if kind == "held":
+                self.held = set(value)
+            elif kind == "action":
+                fight.player_action(self.player, value)
+            elif kind == "release":
+                fight.player_release(self.player, value)
+
+
+def prepare(replay, fight):
+    # fight — бой с картой нужного уровня и свежими бойцами (HeadlessFight
+    # или окно после start_game); дальше кадры идут через play()
+    players = (fight.p1, fight.p2)
+    fight.settings_slowmo = replay["slowmo"]
+    fight.settings_shake = replay["shake"]
+    for i, p in enumerate(players):
+        p.name = replay["names"][i]
+        p.controls = dict(replay["controls"][i])
+        p.cpu = None
+        if replay["cpu"][i]:
+            p.cpu = ScriptedCpu(p, i, replay["cpu_events"], replay["cpu"][i])
+    for name, value in replay["start"].items():
+        setattr(fight, name, value)
+    fight.keys = set(replay["held"])
+    fight.input_buffer_frames = replay.get("input_buffer", 0)
+    fight.set_fixed_physics(replay.get("physics") == "fixed")
+    fight.init_input()
+    fight.frame = 0
+    fight.winner = None
+    fight.state = "FIGHT"
+
+
+def play(replay, fight, until=None):
+    # Генератор: применяет события и делает кадр, отдаёт номер кадра
+    events = {}
+    for frame, kind, key in replay["events"]:
+        events.setdefault(frame, []).append((kind, key))
+    last = replay["frames"] if until is None else min(until, replay["frames"])
+
+    while fight.state == "FIGHT" and fight.frame < last:
+        for kind, key in events.get(fight.frame, ()):
+            if kind == "press":
+                fight.press(key)
+            else:
+                fight.release(key)
+        fight.step()
+        yield fight.frame
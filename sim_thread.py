@@ -0,0 +1,91 @@
+import threading
+import time
+from collections import deque
+
+# =================== SIM THREAD ===================
+# Бой (FightSimulation) в своём потоке ровно SIM_STEP на кадр. После
+# каждого кадра поток собирает снимок для отрисовки и кладёт его во второй
+# из двух буферов, затем меняет номер переднего — читатель всегда видит
+# целый кадр, замков нет. Отметки кадров без hit_stop (stepped) и события
+# боя (events) выставляет сам бой во время кадра; вместе со снимком они
+# уходят в output — deque, из которого их забирает основной поток. Конец
+# боя тоже: бой зовёт finish(), поток останавливается после этого кадра, а
+# итог уходит в output последним — подводить итоги основному потоку.
+# Модуль не импортирует main.
+SIM_STEP = 1 / 60
+# Поток не получал управления дольше стольких кадров — без догоняния
+SIM_MAX_CATCHUP = 5
+
+
+class SimThread:
+    def __init__(self, fight, snapshot, after_tick=None):
+        # snapshot(fight) — неизменяемый снимок кадра для отрисовки,
+        # after_tick(fight) — после каждого кадра в потоке (трансляция)
+        self.fight = fight
+        self.make_snapshot = snapshot
+        self.after_tick = after_tick
+        self.buffers = [snapshot(fight), None]
+        self.front = 0
+        # Для основного потока: (снимок, кадр без hit_stop, события кадра,
+        # (итог,) в последнем кадре боя или None)
+        self.output = deque()
+        self.stepped = False
+        self.events = None
+        self.ticks = 0
+        self.late = 0
+        self.error = None
+        self.result = None
+        self.running = True
+        self.done = False
+        self.thread = threading.Thread(target=self.run, name="fight", daemon=True)
+        self.thread.start()
+
+    @property
+    def snapshot(self):
+        return self.buffers[self.front]
+
+    def run(self):
+        fight = self.fight
+        next_tick = time.perf_counter()
+        try:
+            while self.running and self.result is None and fight.state == "FIGHT":
+                now = time.perf_counter()
+                if now < next_tick:
+                    time.sleep(next_tick - now)
+                    continue
+                if now - next_tick > SIM_MAX_CATCHUP * SIM_STEP:
+                    self.late += 1
+                    next_tick = now
+                fight.tick()
+                self.publish()
+                next_tick += SIM_STEP
+        except Exception as e:
+            # Падение боя поднимается в основном потоке, как без потока
+            self.error = e
+        finally:
+            self.done = True
+
+    def publish(self):
+        fight = self.fight
+        snapshot = self.make_snapshot(fight)
+        back = 1 - self.front
+        self.buffers[back] = snapshot
+        self.front = back
+        if self.stepped or self.events or self.result:
+            self.output.append((snapshot, self.stepped, self.events, self.result))
+        self.stepped = False
+        self.events = None
+        self.ticks += 1
+        if self.after_tick:
+            self.after_tick(fight)
+
+    def on_thread(self):
+        return threading.current_thread() is self.thread
+
+    def finish(self, result):
+        self.result = (result,)
+
+    def stop(self):
+        self.running = False
+        if self.thread is not threading.current_thread():
+            self.thread.join()
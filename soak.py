@@ -0,0 +1,356 @@
+import os
+
+# Окно без дисплея: pyglet + EGL
+os.environ.setdefault("ARCADE_HEADLESS", "1")
+
+import argparse
+import collections
+import contextlib
+import gc
+import json
+import random
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import arcade
+import pyglet
+
+import main
+from bench import drive_scripted_input
+
+# =================== SOAK TEST ===================
+# Тысячи боёв подряд в одном окне игры, как у киоска, который работает
+# весь день: имена -> отсчёт -> бой со случайными нажатиями -> RESULTS ->
+# R -> снова имена. После каждого боя снимаются RSS, память tracemalloc,
+# кэш текстур arcade, живые GL-объекты, проигрыватели звука и число
+# объектов по типам. Рост за бой считается наклоном прямой по замерам
+# после разогрева; если он выше порога, тест падает и показывает типы
+# объектов и места выделения памяти, которые росли. Тип считается утечкой,
+# только если выше порога растёт и общее число объектов: иначе это
+# перетасовка между типами (кортежи вместо списков), а не рост.
+# Файлы статистики и записи боёв пишутся во временную папку.
+
+SOAK_NAMES = ("SOAK1", "SOAK2")
+WARMUP_ROUNDS = 20
+LOG_EVERY = 25
+TOP_GROWTH = 10
+
+# Допустимый рост за бой
+THRESHOLDS = {
+    "rss_kb": 64.0,
+    "traced_kb": 16.0,
+    "gc_objects": 50.0,
+    "texture_cache": 0.05,
+    "atlas_images": 0.05,
+    "gl_textures": 0.05,
+    "gl_buffers": 0.05,
+    "gl_framebuffers": 0.05,
+    "gl_vertex_arrays": 0.05,
+    "sound_players": 0.05,
+}
+TYPE_THRESHOLD = 5.0
+
+
+def rss_kb():
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss / 1024
+    except ImportError:
+        pass
+    try:
+        with open("/proc/self/statm", "r", encoding="ascii") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024
+    except (OSError, ValueError, AttributeError):
+        return 0.0
+
+
+def gl_alive(stats, name):
+    created, freed = getattr(stats, name)
+    return created - freed
+
+
+def type_counts():
+    return collections.Counter(type(o).__qualname__ for o in gc.get_objects())
+
+
+def sample(window):
+    gc.collect()
+    stats = window.ctx.stats
+    players = sum(1 for o in gc.get_objects() if type(o).__module__.startswith("pyglet.media")
+                  and type(o).__name__ == "Player")
+    return {
+        "rss_kb": rss_kb(),
+        "traced_kb": tracemalloc.get_traced_memory()[0] / 1024 if tracemalloc.is_tracing() else 0.0,
+        "gc_objects": len(gc.get_objects()),
+        "texture_cache": len(arcade.texture.default_texture_cache.texture_cache.get_all_textures()),
+        # Картинки в атласе, а не текстуры: зеркальные кадры — свои Texture
+        # у каждого бойца с общей картинкой, атлас держит их слабо, и их
+        # число скачет с тем, какие кадры нарисовали последние бойцы
+        "atlas_images": len(window.ctx.default_atlas.images),
+        "gl_textures": gl_alive(stats, "texture"),
+        "gl_buffers": gl_alive(stats, "buffer"),
+        "gl_framebuffers": gl_alive(stats, "framebuffer"),
+        "gl_vertex_arrays": gl_alive(stats, "vertex_array"),
+        "sound_players": players,
+    }
+
+
+class TypeGrowth:
+    # Наклон числа объектов каждого типа по боям без хранения самих
+    # подсчётов (иначе рос бы сам замер): суммы y и x*y по типам
+    def __init__(self):
+        self.n = 0
+        self.sum_y = collections.Counter()
+        self.sum_xy = collections.Counter()
+
+    def add(self, counts):
+        for name, count in counts.items():
+            self.sum_y[name] += count
+            self.sum_xy[name] += self.n * count
+        self.n += 1
+
+    def slopes(self):
+        # Тот же наклон наименьших квадратов, что и slope()
+        n = self.n
+        if n < 2:
+            return {}
+        mean_x = (n - 1) / 2
+        den = sum((i - mean_x) ** 2 for i in range(n))
+        return {name: (self.sum_xy[name] - mean_x * self.sum_y[name]) / den for name in self.sum_y}
+
+
+def slope(values):
+    # Наклон прямой наименьших квадратов: рост за бой
+    n = len(values)
+    if n < 2:
+        return 0.0
+    mean_x = (n - 1) / 2
+    mean_y = sum(values) / n
+    num = sum((i - mean_x) * (v - mean_y) for i, v in enumerate(values))
+    den = sum((i - mean_x) ** 2 for i in range(n))
+    return num / den
+
+
+class SoakRunner:
+    def __init__(self, window, rng, draw_every, max_frames):
+        self.window = window
+        self.rng = rng
+        self.draw_every = draw_every
+        self.max_frames = max_frames
+        self.keys = list(window.controls_p1.values()) + list(window.controls_p2.values())
+        self.held = set()
+        self.frames = 0
+
+    def frame(self):
+        # То, что в игре делает цикл pyglet: часы и события из потока
+        # звука. Без них отыгравшие плееры не получают on_eos и копятся
+        # в media.Source._players как ложная утечка
+        pyglet.clock.tick()
+        pyglet.app.platform_event_loop.dispatch_posted_events()
+        self.window.on_update(1 / 60)
+        self.frames += 1
+        if self.draw_every and self.frames % self.draw_every == 0:
+            self.window.on_draw()
+            self.window.flip()
+
+    def type_name(self, name):
+        for ch in name:
+            self.window.on_key_press(ord(ch), 0)
+            self.window.on_key_release(ord(ch), 0)
+        self.window.on_key_press(arcade.key.ENTER, 0)
+        self.window.on_key_release(arcade.key.ENTER, 0)
+
+    def press(self, key):
+        self.window.on_key_press(key, 0)
+
+    def release(self, key):
+        self.window.on_key_release(key, 0)
+
+    def play_round(self):
+        window = self.window
+        if window.state == "MENU":
+            button = window.btn_play
+            window.on_mouse_press((button.left + button.right) / 2, (button.bottom + button.top) / 2,
+                                  arcade.MOUSE_BUTTON_LEFT, 0)
+        elif window.state == "RESULTS":
+            # Реванш тем же путём, что и у игрока
+            self.press(arcade.key.R)
+            self.release(arcade.key.R)
+        if window.state != "NAME_INPUT":
+            raise RuntimeError(f"Не удалось начать бой из состояния {window.state}")
+        for name in SOAK_NAMES:
+            self.type_name(name)
+
+        frame = 0
+        while window.state in ("COUNTDOWN", "FIGHT"):
+            if window.state == "FIGHT":
+                drive_scripted_input(self.press, self.release, self.held, self.keys, self.rng, frame)
+            self.frame()
+            frame += 1
+            if frame > self.max_frames:
+                raise RuntimeError(f"Бой не закончился за {self.max_frames} кадров")
+        for key in list(self.held):
+            self.release(key)
+        self.held.clear()
+        return frame
+
+
+def growth_report(samples, warmup):
+    report = {}
+    for name, limit in THRESHOLDS.items():
+        values = [s[name] for s in samples[warmup:]]
+        if not values:
+            continue
+        rate = slope(values)
+        report[name] = {
+            "start": values[0],
+            "end": values[-1],
+            "per_round": round(rate, 4),
+            "limit": limit,
+            "ok": rate <= limit,
+        }
+    return report
+
+
+def soak(rounds=1000, round_time=10, draw_every=10, warmup=WARMUP_ROUNDS, seed=1, trace=True, cpu="off",
+         log=print):
+    random.seed(seed)
+    rng = random.Random(seed)
+    if trace:
+        tracemalloc.start()
+
+    with tempfile.TemporaryDirectory(prefix="stickman_soak_") as workdir:
+        assets = os.path.abspath(main.ASSET_PATH)
+        cwd = os.getcwd()
+        os.chdir(workdir)
+        try:
+            try:
+                os.symlink(assets, main.ASSET_PATH, target_is_directory=True)
+            except OSError:
+                # Windows без прав на символические ссылки
+                shutil.copytree(assets, main.ASSET_PATH)
+            with contextlib.redirect_stdout(sys.stderr):
+                window = main.GameWindow()
+            # Кадры ведёт SoakRunner, а не часы: кадр arcade по часам без
+            # цикла pyglet только копил бы on_update и on_draw в очереди
+            # событий окна
+            pyglet.clock.unschedule(window._dispatch_frame)
+            window.settings_music = False
+            window.stop_background_music()
+            window.settings_cpu = cpu
+            # Бой короче обычного, чтобы боёв было много, а не долгих
+            window.settings.round_time = round_time
+            # Прогрев глифов в игре идёт понемногу в кадрах меню; в soak
+            # меню почти нет, и глифы росли бы весь прогон
+            while not window.glyph_prewarm.done:
+                window.glyph_prewarm.step()
+            # Так же с кадрами бойца: в атлас arcade кадр попадает, когда
+            # его впервые нарисуют, и редкие (добивание) добавлялись бы
+            # ступеньками через десятки боёв
+            main.CHARACTER_ATLAS.select(window.character_pixels())
+            for name in main.CHARACTER_TEXTURES:
+                window.ctx.default_atlas.add(main.CHARACTER_ATLAS.texture(name))
+            runner = SoakRunner(window, rng, draw_every, max_frames=(round_time + 10) * 60)
+
+            samples = []
+            types = TypeGrowth()
+            snapshot_before = snapshot_after = None
+            started = time.perf_counter()
+            for i in range(1, rounds + 1):
+                with contextlib.redirect_stdout(sys.stderr):
+                    runner.play_round()
+                samples.append(sample(window))
+                # Те же бои, что и в growth_report: после разогрева
+                if i > warmup:
+                    types.add(type_counts())
+
+                if i == warmup:
+                    snapshot_before = tracemalloc.take_snapshot() if trace else None
+                if i % LOG_EVERY == 0 or i == rounds:
+                    log(f"бой {i}/{rounds}: RSS {samples[-1]['rss_kb'] / 1024:.1f} МБ, "
+                        f"объектов {samples[-1]['gc_objects']}, GL-текстур {samples[-1]['gl_textures']}, "
+                        f"{runner.frames / (time.perf_counter() - started):.0f} кадров/с")
+            if rounds > warmup:
+                snapshot_after = tracemalloc.take_snapshot() if trace else None
+            window.close()
+            # Записи боёв — во временную папку, пока она есть
+            main.DISK_WRITER.flush()
+        finally:
+            os.chdir(cwd)
+            if trace:
+                tracemalloc.stop()
+
+    measured = max(1, rounds - warmup)
+    result = {
+        "rounds": rounds,
+        "warmup": warmup,
+        "frames": runner.frames,
+        "seconds": round(time.perf_counter() - started, 1),
+        "growth": growth_report(samples, warmup),
+        "types": [],
+        "sites": [],
+    }
+    objects = result["growth"].get("gc_objects")
+    # Общий рост — тот же, что в таблице: наклон gc_objects выше порога
+    objects_growing = objects is not None and not objects["ok"]
+    grown = sorted(((name, rate) for name, rate in types.slopes().items() if rate > 0), key=lambda g: -g[1])
+    result["types"] = [{"type": name, "per_round": round(rate, 3), "ok": rate <= TYPE_THRESHOLD or not objects_growing}
+                       for name, rate in grown[:TOP_GROWTH]]
+    if snapshot_before and snapshot_after:
+        ignore = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__)]
+        diff = snapshot_after.filter_traces(ignore).compare_to(snapshot_before.filter_traces(ignore), "lineno")
+        result["sites"] = [{"site": f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+                            "kb_per_round": round(stat.size_diff / 1024 / measured, 3),
+                            "count_per_round": round(stat.count_diff / measured, 3)}
+                           for stat in diff[:TOP_GROWTH] if stat.size_diff > 0]
+    result["ok"] = all(g["ok"] for g in result["growth"].values()) and all(t["ok"] for t in result["types"])
+    return result
+
+
+def print_report(result):
+    print(f"\n=== Soak: {result['rounds']} боёв, {result['frames']} кадров за {result['seconds']} с "
+          f"(разогрев {result['warmup']}) ===")
+    print(f"{'метрика':<18}{'после разогрева':>16}{'в конце':>12}{'рост/бой':>12}{'порог':>10}")
+    for name, g in result["growth"].items():
+        mark = "" if g["ok"] else "  <-- УТЕЧКА"
+        print(f"{name:<18}{g['start']:>16.1f}{g['end']:>12.1f}{g['per_round']:>12.3f}{g['limit']:>10.2f}{mark}")
+    if result["types"]:
+        objects = result["growth"].get("gc_objects")
+        note = "" if objects and not objects["ok"] else ", всего объектов в пределах порога"
+        print(f"\nРастущие типы объектов (штук за бой{note}):")
+        for t in result["types"]:
+            mark = "" if t["ok"] else "  <-- УТЕЧКА"
+            print(f"  {t['type']:<40}{t['per_round']:>10.2f}{mark}")
+    if result["sites"]:
+        print("\nМеста выделения памяти, которые росли (tracemalloc):")
+        for s in result["sites"]:
+            print(f"  {s['site']:<60}{s['kb_per_round']:>10.2f} КБ/бой{s['count_per_round']:>10.2f} блоков/бой")
+    print("\nOK" if result["ok"] else "\nПРОВАЛ: рост за бой выше порога")
+
+
+def main_cli(argv=None):
+    parser = argparse.ArgumentParser(description="Soak test: тысячи боёв подряд, поиск утечек")
+    parser.add_argument("--rounds", type=int, default=1000)
+    parser.add_argument("--round-time", type=int, default=10, help="секунд на бой (в игре 99)")
+    parser.add_argument("--draw-every", type=int, default=10, help="рисовать каждый N-й кадр, 0 — не рисовать")
+    parser.add_argument("--warmup", type=int, default=WARMUP_ROUNDS)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--cpu", choices=main.CPU_SLOTS, default="off", help="слот компьютерного противника")
+    parser.add_argument("--no-tracemalloc", action="store_true", help="быстрее, но без мест выделения")
+    parser.add_argument("--json", help="сохранить отчёт в файл")
+    args = parser.parse_args(argv)
+
+    result = soak(args.rounds, args.round_time, args.draw_every, args.warmup, args.seed,
+                  not args.no_tracemalloc, args.cpu)
+    print_report(result)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+    return 0 if result["ok"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
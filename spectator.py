@@ -0,0 +1,477 @@
+import argparse
+import asyncio
+import base64
+import hashlib
+import json
+import random
+import socket
+import statistics
+import struct
+import sys
+import threading
+import time
+
+# =================== SPECTATOR SERVER ===================
+# Трансляция боя зрителям по локальной сети. Сервер живёт в своём потоке со
+# своим циклом asyncio; игра каждый кадр только отдаёт ему снимок состояния
+# (publish), всё остальное — кодирование и рассылка — идёт в потоке сервера.
+#
+# Поток — JSON по строке на сообщение: по TCP строки через "\n", по
+# WebSocket — текстовые кадры.
+#   {"type": "key", "frame": N, "state": {...}}    — всё состояние
+#   {"type": "delta", "frame": N, "state": {...}}  — только изменившиеся поля
+# Ключевой кадр получает каждый новый зритель, все зрители раз в
+# KEYFRAME_INTERVAL кадров и зритель, который не успевал читать.
+#
+# Медленный зритель не тормозит игру: когда буфер отправки переполняется,
+# asyncio вызывает pause_writing, и зритель пропускает кадры, пока буфер не
+# освободится; после этого он получает ключевой кадр.
+
+DEFAULT_PORT = 8765
+KEYFRAME_INTERVAL = 60
+WRITE_BUFFER_LIMIT = 64 * 1024
+LOAD_TEST_BUFFER_LIMIT = 4 * 1024
+WS_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+
+def fight_state(fight):
+    # Снимок того, что видит зритель. Координаты округлены, чтобы дельты не
+    # разрастались из-за дробной части
+    winner = getattr(fight, "winner", None)
+    state = {
+        "state": fight.state,
+        "round_time_left": fight.round_time_left,
+        "winner": getattr(winner, "name", winner),
+    }
+    for prefix, p in (("p1", fight.p1), ("p2", fight.p2)):
+        state[prefix + ".name"] = p.name
+        state[prefix + ".x"] = round(p.center_x, 1)
+        state[prefix + ".y"] = round(p.center_y, 1)
+        state[prefix + ".state"] = p.state
+        state[prefix + ".facing_right"] = p.facing_right
+        state[prefix + ".health"] = p.health
+        state[prefix + ".max_health"] = p.max_health
+        state[prefix + ".combo"] = p.combo_counter
+    return state
+
+
+def encode(kind, frame, state):
+    return json.dumps({"type": kind, "frame": frame, "state": state},
+                      ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def apply_message(state, message):
+    # Для клиентов: ключевой кадр заменяет состояние, дельта дополняет
+    if message["type"] == "key":
+        state.clear()
+    state.update(message["state"])
+    return state
+
+
+def websocket_frame(payload, opcode=0x1):
+    length = len(payload)
+    if length < 126:
+        header = struct.pack("!BB", 0x80 | opcode, length)
+    elif length < 65536:
+        header = struct.pack("!BBH", 0x80 | opcode, 126, length)
+    else:
+        header = struct.pack("!BBQ", 0x80 | opcode, 127, length)
+    return header + payload
+
+
+class Spectator(asyncio.Protocol):
+    def __init__(self, server):
+        self.server = server
+        self.transport = None
+        self.paused = False
+        self.stale = True
+        self.ready = False
+
+    def connection_made(self, transport):
+        self.transport = transport
+        transport.set_write_buffer_limits(high=self.server.write_buffer_limit)
+        sock = transport.get_extra_info("socket")
+        if sock is not None:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            if self.server.send_buffer:
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, self.server.send_buffer)
+        self.server.clients.add(self)
+        self.on_connected()
+
+    def on_connected(self):
+        self.ready = True
+        self.server.send_keyframe(self)
+
+    def connection_lost(self, exc):
+        self.server.clients.discard(self)
+
+    def pause_writing(self):
+        self.paused = True
+        self.stale = True
+        self.server.dropped += 1
+
+    def resume_writing(self):
+        # Ключевой кадр сразу, не дожидаясь следующего кадра игры: после
+        # конца боя его может и не быть
+        self.paused = False
+        if self.stale and self.ready:
+            self.server.send_keyframe(self)
+
+    def data_received(self, data):
+        # TCP-зрителю говорить нечего, входящие данные игнорируются
+        pass
+
+    def send(self, message):
+        self.transport.write(message + b"\n")
+
+
+class WebSocketSpectator(Spectator):
+    # Минимальный сервер RFC 6455: рукопожатие, текстовые кадры от сервера,
+    # ответ на ping и закрытие. Сообщения зрителя не нужны
+    def __init__(self, server):
+        super().__init__(server)
+        self.buffer = b""
+
+    def on_connected(self):
+        pass
+
+    def data_received(self, data):
+        self.buffer += data
+        if not self.ready:
+            head, sep, rest = self.buffer.partition(b"\r\n\r\n")
+            if not sep:
+                if len(self.buffer) > 8192:
+                    self.transport.close()
+                return
+            self.buffer = rest
+            self.handshake(head.decode("latin-1"))
+            if not self.ready:
+                return
+        self.read_frames()
+
+    def handshake(self, request):
+        headers = {}
+        for line in request.split("\r\n")[1:]:
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+        key = headers.get("sec-websocket-key")
+        if not key:
+            self.transport.write(b"HTTP/1.1 400 Bad Request\r\nContent-Length: 0\r\n\r\n")
+            self.transport.close()
+            return
+        accept = base64.b64encode(hashlib.sha1((key + WS_GUID).encode()).digest()).decode()
+        self.transport.write(("HTTP/1.1 101 Switching Protocols\r\n"
+                              "Upgrade: websocket\r\n"
+                              "Connection: Upgrade\r\n"
+                              f"Sec-WebSocket-Accept: {accept}\r\n\r\n").encode())
+        self.ready = True
+        self.server.send_keyframe(self)
+
+    def read_frames(self):
+        while len(self.buffer) >= 2:
+            first, second = self.buffer[0], self.buffer[1]
+            opcode = first & 0x0F
+            length = second & 0x7F
+            offset = 2
+            if length == 126:
+                if len(self.buffer) < 4:
+                    return
+                length = struct.unpack("!H", self.buffer[2:4])[0]
+                offset = 4
+            elif length == 127:
+                if len(self.buffer) < 10:
+                    return
+                length = struct.unpack("!Q", self.buffer[2:10])[0]
+                offset = 10
+            masked = second & 0x80
+            mask = self.buffer[offset:offset + 4] if masked else b""
+            offset += len(mask)
+            if len(self.buffer) < offset + length:
+                return
+            payload = self.buffer[offset:offset + length]
+            self.buffer = self.buffer[offset + length:]
+            if masked:
+                payload = bytes(b ^ mask[i % 4] for i, b in enumerate(payload))
+
+            if opcode == 0x8:
+                self.transport.write(websocket_frame(payload[:2], 0x8))
+                self.transport.close()
+                return
+            if opcode == 0x9:
+                self.transport.write(websocket_frame(payload, 0xA))
+
+    def send(self, message):
+        self.transport.write(websocket_frame(message))
+
+
+class SpectatorServer:
+    def __init__(self, host="0.0.0.0", port=DEFAULT_PORT, ws_port=None,
+                 keyframe_interval=KEYFRAME_INTERVAL, write_buffer_limit=WRITE_BUFFER_LIMIT, send_buffer=None):
+        self.host = host
+        self.port = port
+        self.ws_port = port + 1 if ws_port is None else ws_port
+        self.keyframe_interval = keyframe_interval
+        self.write_buffer_limit = write_buffer_limit
+        # SO_SNDBUF сокета зрителя; None — как решит система (на loopback
+        # ядро растит буфер до мегабайт, и pause_writing почти не бывает)
+        self.send_buffer = send_buffer
+
+        self.clients = set()
+        self.loop = None
+        self.thread = None
+        self.servers = []
+        self.ready = threading.Event()
+        self.error = None
+
+        # Передача снимка из игры: последний кадр и флаг «разбудить сервер»
+        self.latest = None
+        self.latest_frame = 0
+        self.wake_pending = False
+
+        # Состояние, которое уже есть у синхронных зрителей
+        self.sent = {}
+        self.sent_frame = 0
+        self.keyframe = None
+        self.frames_since_key = 0
+
+        self.dropped = 0
+        self.messages = 0
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, name="spectator-server", daemon=True)
+        self.thread.start()
+        self.ready.wait(5)
+        if self.error:
+            raise self.error
+        return self
+
+    def run(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        try:
+            self.loop.run_until_complete(self.listen())
+        except OSError as e:
+            self.error = e
+            self.ready.set()
+            self.loop.close()
+            return
+        self.ready.set()
+        try:
+            self.loop.run_forever()
+        finally:
+            for server in self.servers:
+                server.close()
+            for client in list(self.clients):
+                client.transport.abort()
+            self.loop.run_until_complete(asyncio.sleep(0))
+            self.loop.close()
+
+    async def listen(self):
+        # Порт 0 — любой свободный (для проверок), тогда и для WebSocket тоже
+        ephemeral = self.port == 0
+        tcp = await self.loop.create_server(lambda: Spectator(self), self.host, self.port)
+        self.servers.append(tcp)
+        self.port = tcp.sockets[0].getsockname()[1]
+        if self.ws_port is not False:
+            ws = await self.loop.create_server(lambda: WebSocketSpectator(self), self.host,
+                                               0 if ephemeral else self.ws_port)
+            self.servers.append(ws)
+            self.ws_port = ws.sockets[0].getsockname()[1]
+
+    def stop(self):
+        if self.loop and self.loop.is_running():
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.thread.join(5)
+
+    # ---------- поток игры ----------
+    def publish(self, fight, frame=None):
+        # Дёшево: снимок нескольких полей и, если сервер ещё не разбужен,
+        # одно пробуждение цикла. Если сервер отстал, промежуточные кадры
+        # склеиваются в одну дельту
+        self.latest = fight_state(fight)
+        self.latest_frame = self.latest_frame + 1 if frame is None else frame
+        if not self.wake_pending and self.loop is not None:
+            self.wake_pending = True
+            self.loop.call_soon_threadsafe(self.flush)
+
+    # ---------- поток сервера ----------
+    def flush(self):
+        self.wake_pending = False
+        state, frame = self.latest, self.latest_frame
+        if state is None:
+            return
+
+        self.frames_since_key += 1
+        if self.frames_since_key >= self.keyframe_interval:
+            delta = None
+        else:
+            delta = {k: v for k, v in state.items() if k not in self.sent or self.sent[k] != v}
+        self.sent = state
+        self.sent_frame = frame
+        self.keyframe = None
+
+        if delta is None:
+            self.frames_since_key = 0
+            message = self.current_keyframe()
+            for client in self.clients:
+                if client.ready and not client.paused:
+                    client.stale = False
+                    client.send(message)
+                    self.messages += 1
+            return
+
+        message = encode("delta", frame, delta) if delta else None
+        for client in self.clients:
+            if not client.ready or client.paused:
+                continue
+            if client.stale:
+                self.send_keyframe(client)
+            elif message is not None:
+                client.send(message)
+                self.messages += 1
+
+    def current_keyframe(self):
+        if self.keyframe is None:
+            self.keyframe = encode("key", self.sent_frame, self.sent)
+        return self.keyframe
+
+    def send_keyframe(self, client):
+        if not self.sent:
+            # Игра ещё ничего не прислала: первым сообщением будет ключевой
+            # кадр, как только придёт снимок
+            return
+        client.stale = False
+        client.send(self.current_keyframe())
+        self.messages += 1
+
+
+# =================== LOAD TEST ===================
+class CountingClient(asyncio.Protocol):
+    # Зритель для нагрузочной проверки: собирает состояние из потока
+    def __init__(self, slow=False):
+        self.state = {}
+        self.frame = 0
+        self.buffer = b""
+        self.slow = slow
+        self.transport = None
+        self.keyframes = 0
+
+    def connection_made(self, transport):
+        self.transport = transport
+        if self.slow:
+            transport.pause_reading()
+
+    def data_received(self, data):
+        self.buffer += data
+        *lines, self.buffer = self.buffer.split(b"\n")
+        for line in lines:
+            message = json.loads(line)
+            apply_message(self.state, message)
+            self.frame = message["frame"]
+            self.keyframes += message["type"] == "key"
+
+
+def run_clients(port, count, slow, stop, ready, out):
+    loop = asyncio.new_event_loop()
+
+    async def connect():
+        clients = []
+        for i in range(count):
+            sock = socket.socket()
+            if i < slow:
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4096)
+            sock.connect(("127.0.0.1", port))
+            sock.setblocking(False)
+            _, client = await loop.create_connection(lambda: CountingClient(i < slow), sock=sock)
+            clients.append(client)
+        out.extend(clients)
+        ready.set()
+        while not stop.is_set():
+            await asyncio.sleep(0.01)
+        # Медленные зрители наконец читают всё, что им прислали
+        for client in clients[:slow]:
+            client.transport.resume_reading()
+        await asyncio.sleep(0.5)
+
+    loop.run_until_complete(connect())
+    loop.close()
+
+
+def load_test(clients, slow, frames, seed=1):
+    import main
+
+    def play(server):
+        rng = random.Random(seed)
+        fight = main.HeadlessFight()
+        keys = list(fight.p1.controls.values()) + list(fight.p2.controls.values())
+        times = []
+        next_frame = time.perf_counter()
+        for frame in range(frames):
+            if frame % 6 == 0:
+                key = rng.choice(keys)
+                if key in fight.keys:
+                    fight.release(key)
+                else:
+                    fight.press(key)
+            start = time.perf_counter()
+            if not fight.step():
+                fight.reset()
+            if server:
+                server.publish(fight, frame)
+            times.append(time.perf_counter() - start)
+            # Темп 60 кадров/с, как у игры: сервер работает между кадрами
+            next_frame += 1 / 60
+            time.sleep(max(0.0, next_frame - time.perf_counter()))
+        return times, fight
+
+    base, _ = play(None)
+
+    # Маленькие буферы отправки, чтобы медленные зрители переполняли их и за
+    # короткий прогон: иначе пауз не будет и обратное давление не проверено
+    server = SpectatorServer("127.0.0.1", 0, ws_port=False, write_buffer_limit=LOAD_TEST_BUFFER_LIMIT,
+                             send_buffer=LOAD_TEST_BUFFER_LIMIT).start()
+    stop, ready, connected = threading.Event(), threading.Event(), []
+    thread = threading.Thread(target=run_clients, args=(server.port, clients, slow, stop, ready, connected))
+    thread.start()
+    ready.wait(30)
+    with_server, fight = play(server)
+    time.sleep(0.2)
+    final = dict(server.sent)
+    stop.set()
+    thread.join()
+    server.stop()
+
+    def p99(values):
+        return sorted(values)[int(len(values) * 0.99)] * 1000
+
+    in_sync = sum(c.state == final for c in connected)
+    print(f"Зрителей: {clients} (медленных: {slow}), кадров: {frames}")
+    print(f"Кадр без сервера:  среднее {statistics.mean(base) * 1000:.3f} мс, p99 {p99(base):.3f} мс")
+    print(f"Кадр с сервером:   среднее {statistics.mean(with_server) * 1000:.3f} мс, "
+          f"p99 {p99(with_server):.3f} мс")
+    print(f"Добавлено к кадру: {(statistics.mean(with_server) - statistics.mean(base)) * 1000:.3f} мс")
+    print(f"Сообщений: {server.messages}, пауз из-за переполнения: {server.dropped}")
+    print(f"Состояние совпало у {in_sync} из {len(connected)} зрителей")
+    if slow and not server.dropped:
+        print("Медленные зрители ни разу не переполнили буфер: обратное давление не проверено")
+        return False
+    return in_sync == len(connected)
+
+
+def main_cli(argv=None):
+    parser = argparse.ArgumentParser(description="Сервер трансляции боя для зрителей")
+    parser.add_argument("--load-test", action="store_true",
+                        help="бой без окна и N зрителей в этом же процессе")
+    parser.add_argument("--clients", type=int, default=120)
+    parser.add_argument("--slow", type=int, default=10, help="зрителей, которые не читают поток")
+    parser.add_argument("--frames", type=int, default=600)
+    args = parser.parse_args(argv)
+
+    if args.load_test:
+        return 0 if load_test(args.clients, args.slow, args.frames) else 1
+    parser.print_help()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
@@ -0,0 +1,174 @@
+import argparse
+import json
+import socket
+import sys
+import threading
+import time
+
+from spectator import DEFAULT_PORT, apply_message
+
+# =================== SPECTATOR CLIENT ===================
+# Эталонный зритель: читает поток сервера трансляции по TCP, собирает
+# состояние из ключевых кадров и дельт и рисует бой человечками (текстуры
+# игры ему не нужны). С --text печатает состояние в консоль.
+
+SCREEN_WIDTH = 1000
+SCREEN_HEIGHT = 650
+GROUND_Y = 120
+COLORS = {"p1": (70, 130, 255), "p2": (235, 70, 70)}
+
+
+class StreamReader:
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.state = {}
+        self.frame = 0
+        self.messages = 0
+        self.connected = False
+        self.lock = threading.Lock()
+        self.stopped = False
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def run(self):
+        # Переподключаемся, пока игра не запущена или её перезапускают
+        while not self.stopped:
+            try:
+                with socket.create_connection((self.host, self.port), timeout=2) as sock:
+                    sock.settimeout(None)
+                    self.connected = True
+                    for line in sock.makefile("rb"):
+                        message = json.loads(line)
+                        with self.lock:
+                            apply_message(self.state, message)
+                            self.frame = message["frame"]
+                            self.messages += 1
+            except OSError:
+                pass
+            self.connected = False
+            time.sleep(1)
+
+    def snapshot(self):
+        with self.lock:
+            return dict(self.state), self.frame
+
+
+def run_text(reader):
+    last = None
+    while True:
+        state, frame = reader.snapshot()
+        if state:
+            line = (f"[{frame}] {state['state']} {state['round_time_left']}с | "
+                    f"{state['p1.name']}: {state['p1.health']} {state['p1.state']} | "
+                    f"{state['p2.name']}: {state['p2.health']} {state['p2.state']}")
+            if state.get("winner"):
+                line += f" | победил {state['winner']}"
+            if line != last:
+                print(line)
+                last = line
+        elif not reader.connected:
+            print("Нет соединения с игрой...")
+        time.sleep(0.5)
+
+
+def run_window(reader):
+    import arcade
+
+    class SpectatorWindow(arcade.Window):
+        def __init__(self):
+            super().__init__(SCREEN_WIDTH, SCREEN_HEIGHT, "Stickman Fighter — зритель")
+            arcade.set_background_color((25, 25, 35))
+
+        def on_draw(self):
+            self.clear()
+            state, frame = reader.snapshot()
+            if not state:
+                text = "Ожидание трансляции..." if reader.connected else "Нет соединения с игрой..."
+                arcade.draw_text(text, SCREEN_WIDTH / 2, SCREEN_HEIGHT / 2, arcade.color.WHITE, 20,
+                                 anchor_x="center")
+                return
+
+            # Камера по середине между бойцами, как в игре
+            offset = SCREEN_WIDTH / 2 - (state["p1.x"] + state["p2.x"]) / 2
+            arcade.draw_line(0, GROUND_Y, SCREEN_WIDTH, GROUND_Y, arcade.color.GRAY, 3)
+            for prefix in ("p1", "p2"):
+                self.draw_fighter(state, prefix, offset)
+
+            for prefix, x, anchor in (("p1", 30, "left"), ("p2", SCREEN_WIDTH - 30, "right")):
+                ratio = max(0, min(1, state[prefix + ".health"] / state[prefix + ".max_health"]))
+                left = x if anchor == "left" else x - 300
+                arcade.draw_lrbt_rectangle_filled(left, left + 300, 590, 610, arcade.color.DARK_GRAY)
+                fill_left = left if anchor == "left" else left + 300 * (1 - ratio)
+                arcade.draw_lrbt_rectangle_filled(fill_left, fill_left + 300 * ratio, 590, 610,
+                                                  COLORS[prefix])
+                label = state[prefix + ".name"]
+                if state[prefix + ".combo"] > 1:
+                    label += f"  x{state[prefix + '.combo']}"
+                arcade.draw_text(label, x, 565, arcade.color.WHITE, 14, anchor_x=anchor)
+
+            arcade.draw_text(str(state["round_time_left"]), SCREEN_WIDTH / 2, 585, arcade.color.WHITE, 26,
+                             anchor_x="center")
+            if state["state"] == "RESULTS":
+                winner = state.get("winner") or "Ничья"
+                arcade.draw_text(f"Победитель: {winner}", SCREEN_WIDTH / 2, SCREEN_HEIGHT / 2,
+                                 arcade.color.GOLD, 30, anchor_x="center")
+            elif state["state"] == "COUNTDOWN":
+                arcade.draw_text("Приготовьтесь!", SCREEN_WIDTH / 2, SCREEN_HEIGHT / 2,
+                                 arcade.color.WHITE, 30, anchor_x="center")
+
+        def draw_fighter(self, state, prefix, offset):
+            x = state[prefix + ".x"] + offset
+            y = state[prefix + ".y"]
+            pose = state[prefix + ".state"]
+            facing = 1 if state[prefix + ".facing_right"] else -1
+            color = COLORS[prefix]
+
+            if pose in ("fatality", "dead"):
+                arcade.draw_line(x - 45, y - 40, x + 35, y - 40, color, 4)
+                arcade.draw_circle_outline(x + 45, y - 38, 9, color, 3)
+                return
+
+            arcade.draw_circle_outline(x, y + 35, 10, color, 3)
+            arcade.draw_line(x, y + 25, x, y - 10, color, 4)
+            arcade.draw_line(x, y - 10, x - 14, y - 50, color, 4)
+            arcade.draw_line(x, y - 10, x + 14, y - 50, color, 4)
+            if pose == "attack":
+                arcade.draw_line(x, y + 15, x + facing * 45, y + 15, color, 4)
+            elif pose == "block":
+                arcade.draw_line(x, y + 15, x + facing * 15, y + 30, color, 4)
+                arcade.draw_line(x + facing * 15, y + 30, x + facing * 15, y, color, 4)
+            else:
+                arcade.draw_line(x, y + 15, x - 18, y - 10, color, 4)
+                arcade.draw_line(x, y + 15, x + 18, y - 10, color, 4)
+            if pose == "hit":
+                arcade.draw_circle_outline(x, y + 35, 16, arcade.color.WHITE, 2)
+
+    SpectatorWindow()
+    arcade.run()
+
+
+def main_cli(argv=None):
+    parser = argparse.ArgumentParser(description="Зритель трансляции Stickman Fighter")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--text", action="store_true", help="печатать состояние вместо окна")
+    args = parser.parse_args(argv)
+
+    reader = StreamReader(args.host, args.port).start()
+    try:
+        if args.text:
+            run_text(reader)
+        else:
+            run_window(reader)
+    except KeyboardInterrupt:
+        pass
+    reader.stopped = True
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
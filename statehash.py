@@ -0,0 +1,148 @@
+import base64
+import json
+import operator
+import struct
+import zlib
+
+# =================== STATE HASH ===================
+# Контрольная сумма полного состояния боя в начале каждого кадра: оба
+# бойца (положение, скорости, таймеры, состояние, комбо, фаталити),
+# hit_stop, slow_motion, таймер раунда. Поля упаковываются struct в байты
+# одного формата на любой машине (little-endian, float — точными битами)
+# и считаются crc32: несколько микросекунд на кадр. Поток хэшей пишется в
+# запись боя, fingerprint — crc32 всех кадров подряд, один на бой.
+# desync.py сравнивает потоки двух запусков, находит первый разошедшийся
+# кадр и показывает разницу по полям. Модуль не импортирует main.
+
+STATE_HASH_VERSION = 1
+
+STATES = ["idle", "run", "jump", "attack", "block", "dash", "slide", "hit", "fatality", "dead"]
+ATTACK_TYPES = [None, "punch", "kick"]
+UNKNOWN = 255
+
+FIGHT_FIELDS = [
+    ("frame", "q"), ("hit_stop", "i"), ("slow_motion", "i"),
+    ("round_time_left", "i"), ("round_frame_timer", "i"),
+]
+PLAYER_FIELDS = [
+    ("center_x", "d"), ("center_y", "d"), ("change_x", "d"), ("change_y", "d"),
+    ("fatality_velocity_y", "d"), ("slide_direction", "d"), ("dash_direction", "d"),
+    ("health", "i"), ("facing_right", "?"), ("on_ground", "?"),
+    ("walking_left", "?"), ("walking_right", "?"), ("just_landed", "?"), ("last_move_time", "i"),
+    ("attacking", "?"), ("attack_timer", "i"), ("attack_index", "i"),
+    ("hit_stun_timer", "i"), ("hit_flash_timer", "i"),
+    ("blocking", "?"), ("block_timer", "i"), ("block_cooldown", "i"), ("parry_window", "?"),
+    ("stunned", "?"), ("stun_timer", "i"),
+    ("dashing", "?"), ("dash_timer", "i"), ("dash_cooldown", "i"), ("dash_invulnerable", "?"),
+    ("sliding", "?"), ("slide_timer", "i"),
+    ("combo_counter", "i"), ("combo_timer", "i"), ("show_combo", "?"),
+    ("fatality_phase", "i"), ("fatality_timer", "i"), ("bounce_count", "i"),
+    ("fatality_ground_bounce_timer", "i"),
+    ("stats_hits", "i"), ("stats_combos", "i"),
+]
+# Строковые поля — номером в списке
+PLAYER_ENUMS = [("state", STATES), ("attack_type", ATTACK_TYPES)]
+
+FIELD_NAMES = ([name for name, _ in FIGHT_FIELDS] +
+               [f"{prefix}.{name}" for prefix in ("p1", "p2")
+                for name in [n for n, _ in PLAYER_FIELDS] + [n for n, _ in PLAYER_ENUMS]])
+LAYOUT = struct.Struct("<" + "".join(f for _, f in FIGHT_FIELDS) +
+                       2 * ("".join(f for _, f in PLAYER_FIELDS) + "B" * len(PLAYER_ENUMS)))
+
+fight_values = operator.attrgetter(*[name for name, _ in FIGHT_FIELDS])
+player_values = operator.attrgetter(*[name for name, _ in PLAYER_FIELDS])
+ENUM_CODES = [(name, {value: i for i, value in enumerate(values)}) for name, values in PLAYER_ENUMS]
+
+
+def pack_state(fight):
+    values = list(fight_values(fight))
+    for p in (fight.p1, fight.p2):
+        values += player_values(p)
+        values += [codes.get(getattr(p, name), UNKNOWN) for name, codes in ENUM_CODES]
+    return LAYOUT.pack(*values)
+
+
+def unpack_state(data):
+    values = list(LAYOUT.unpack(data))
+    state = dict(zip(FIELD_NAMES, values))
+    for prefix in ("p1", "p2"):
+        for name, names in PLAYER_ENUMS:
+            code = state[f"{prefix}.{name}"]
+            state[f"{prefix}.{name}"] = names[code] if code < len(names) else f"?{code}"
+    return state
+
+
+def diff_states(a, b):
+    a, b = unpack_state(a), unpack_state(b)
+    return [(name, a[name], b[name]) for name in FIELD_NAMES if a[name] != b[name]]
+
+
+class StateHasher:
+    def __init__(self, keep_states=False):
+        self.hashes = []
+        # Сами упакованные состояния — только для desync.py: разница по полям
+        self.states = [] if keep_states else None
+        self.fingerprint = 0
+
+    def record(self, fight):
+        data = pack_state(fight)
+        self.hashes.append(zlib.crc32(data))
+        self.fingerprint = zlib.crc32(data, self.fingerprint)
+        if self.states is not None:
+            self.states.append(data)
+
+    def to_json(self):
+        data = {
+            "hash_version": STATE_HASH_VERSION,
+            "fingerprint": self.fingerprint,
+            "hashes": encode_hashes(self.hashes),
+        }
+        if self.states is not None:
+            data["states"] = base64.b64encode(b"".join(self.states)).decode("ascii")
+        return data
+
+
+def encode_hashes(hashes):
+    return base64.b64encode(struct.pack(f"<{len(hashes)}I", *hashes)).decode("ascii")
+
+
+def decode_hashes(text):
+    raw = base64.b64decode(text)
+    return list(struct.unpack(f"<{len(raw) // 4}I", raw))
+
+
+def decode_states(text):
+    raw = base64.b64decode(text)
+    size = LAYOUT.size
+    return [raw[i:i + size] for i in range(0, len(raw), size)]
+
+
+def first_divergence(a, b):
+    # Номер первого кадра, где потоки расходятся; None — совпали целиком.
+    # Если один поток — начало другого, расхождение на конце короткого
+    for i, (x, y) in enumerate(zip(a, b)):
+        if x != y:
+            return i
+    return None if len(a) == len(b) else min(len(a), len(b))
+
+
+def save_stream(hasher, path, meta=None):
+    data = dict(meta or {}, **hasher.to_json())
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+
+
+def load_stream(path):
+    # Поток desync.py или запись боя (replays/*.json) с хэшами
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    if "hashes" not in data:
+        raise ValueError(f"{path}: нет хэшей состояния (запись старой версии?)")
+    if data.get("hash_version") != STATE_HASH_VERSION:
+        raise ValueError(f"{path}: неподдерживаемая версия хэшей: {data.get('hash_version')}")
+    return {
+        "hashes": decode_hashes(data["hashes"]),
+        "states": decode_states(data["states"]) if "states" in data else None,
+        "fingerprint": data.get("fingerprint"),
+        "data": data,
+    }
@@ -0,0 +1,159 @@
+import datetime
+import json
+import os
+
+import numpy as np
+
+# =================== TELEMETRY ===================
+# Покадровая телеметрия боя для аналитики (telemetry_analysis.py).
+# Каждый кадр пишется в заранее выделенные столбцы NumPy: по бойцу
+# позиция, скорость, здоровье, состояние, комбо; отдельной таблицей —
+# события: попадания, блоки, парирования, рывки, цепочки комбо. В конце
+# боя столбцы уходят в сжатый .npz в потоке записи игры, кадр игры не
+# ждёт диска. Модуль не импортирует main, как и replay.py.
+
+TELEMETRY_DIR = "telemetry"
+TELEMETRY_VERSION = 1
+TELEMETRY_KEEP = 5000
+EVENT_CAPACITY = 512
+
+STATES = ["idle", "run", "jump", "attack", "block", "dash", "slide", "hit", "fatality", "dead"]
+STATE_CODES = {name: i for i, name in enumerate(STATES)}
+UNKNOWN_STATE = 255
+
+EVENT_KINDS = ["hit", "block", "parry", "fatality", "evade", "dash", "combo"]
+EVENT_CODES = {name: i for i, name in enumerate(EVENT_KINDS)}
+
+FIGHT_COLUMNS = [("frame", np.int32), ("hit_stop", np.uint8), ("slow_motion", np.uint8)]
+PLAYER_COLUMNS = [
+    ("x", np.float32), ("y", np.float32), ("vx", np.float32), ("vy", np.float32),
+    ("health", np.int16), ("state", np.uint8), ("facing_right", np.bool_), ("combo", np.uint16),
+    ("blocking", np.bool_), ("dashing", np.bool_),
+]
+# player — кто действует (бьёт, рвётся, набрал комбо), value — урон или
+# длина комбо, distance — расстояние между бойцами по x, timing — сколько
+# кадров цель уже держала блок (для блока и парирования), иначе -1
+EVENT_COLUMNS = [
+    ("frame", np.int32), ("kind", np.uint8), ("player", np.uint8), ("value", np.int16),
+    ("distance", np.float32), ("timing", np.int16),
+]
+
+
+class TelemetryRecorder:
+    def __init__(self, fight, capacity):
+        self.players = (fight.p1, fight.p2)
+        self.meta = {
+            "version": TELEMETRY_VERSION,
+            "date": datetime.datetime.now().isoformat(timespec="seconds"),
+            "level": fight.selected_level,
+            "names": [p.name for p in self.players],
+            "cpu": [getattr(p.cpu, "level", None) for p in self.players],
+            "states": STATES,
+            "events": EVENT_KINDS,
+            "winner": None,
+        }
+        self.frames = self.allocate(FIGHT_COLUMNS, capacity)
+        for prefix in ("p1_", "p2_"):
+            self.frames.update(self.allocate(PLAYER_COLUMNS, capacity, prefix))
+        self.events = self.allocate(EVENT_COLUMNS, EVENT_CAPACITY, "ev_")
+        self.count = 0
+        self.event_count = 0
+        self.last_combo = [0, 0]
+        self.columns = None
+
+    @staticmethod
+    def allocate(columns, capacity, prefix=""):
+        return {prefix + name: np.zeros(capacity, dtype) for name, dtype in columns}
+
+    @staticmethod
+    def grow(buffers):
+        # Бой дольше ожидаемого (много hit_stop) — столбцы вдвое длиннее
+        for name, column in buffers.items():
+            grown = np.zeros(len(column) * 2, column.dtype)
+            grown[:len(column)] = column
+            buffers[name] = grown
+
+    def record(self, fight):
+        i = self.count
+        frames = self.frames
+        if i == len(frames["frame"]):
+            self.grow(frames)
+        frames["frame"][i] = fight.frame
+        frames["hit_stop"][i] = fight.hit_stop
+        frames["slow_motion"][i] = fight.slow_motion
+        for index, (prefix, p) in enumerate((("p1_", self.players[0]), ("p2_", self.players[1]))):
+            frames[prefix + "x"][i] = p.center_x
+            frames[prefix + "y"][i] = p.center_y
+            frames[prefix + "vx"][i] = p.change_x
+            frames[prefix + "vy"][i] = p.change_y
+            frames[prefix + "health"][i] = p.health
+            frames[prefix + "state"][i] = STATE_CODES.get(p.state, UNKNOWN_STATE)
+            frames[prefix + "facing_right"][i] = p.facing_right
+            frames[prefix + "combo"][i] = p.combo_counter
+            frames[prefix + "blocking"][i] = p.blocking
+            frames[prefix + "dashing"][i] = p.dashing
+
+            # Цепочка комбо закончилась, когда счётчик упал
+            if p.combo_counter < self.last_combo[index] and self.last_combo[index] > 1:
+                self.event(fight.frame, "combo", index, self.last_combo[index])
+            self.last_combo[index] = p.combo_counter
+        self.count += 1
+
+    def event(self, frame, kind, player, value=0, distance=None, timing=-1):
+        i = self.event_count
+        events = self.events
+        if i == len(events["ev_frame"]):
+            self.grow(events)
+        if distance is None:
+            distance = abs(self.players[0].center_x - self.players[1].center_x)
+        events["ev_frame"][i] = frame
+        events["ev_kind"][i] = EVENT_CODES[kind]
+        events["ev_player"][i] = player
+        events["ev_value"][i] = value
+        events["ev_distance"][i] = distance
+        events["ev_timing"][i] = timing
+        self.event_count += 1
+
+    def finish(self, fight, winner):
+        self.record(fight)
+        for index, combo in enumerate(self.last_combo):
+            if combo > 1:
+                self.event(fight.frame, "combo", index, combo)
+        self.meta["winner"] = winner
+        self.meta["frames"] = self.count
+        self.columns = {name: column[:self.count] for name, column in self.frames.items()}
+        self.columns.update({name: column[:self.event_count] for name, column in self.events.items()})
+        return self.columns
+
+    def save(self, directory=TELEMETRY_DIR):
+        # Игра зовёт из своего потока записи (DISK_WRITER в persist.py)
+        stamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+        path = os.path.join(directory, f"fight_{stamp}.npz")
+        save_telemetry(self.columns, self.meta, path)
+        return path
+
+
+def save_telemetry(columns, meta, path):
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    # Пишем во временный файл и переименовываем: анализ не увидит недописанный
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        np.savez_compressed(f, meta=np.array(json.dumps(meta, ensure_ascii=False)), **columns)
+    os.replace(tmp, path)
+
+    fights = sorted(f for f in os.listdir(directory) if f.startswith("fight_") and f.endswith(".npz"))
+    for old in fights[:-TELEMETRY_KEEP]:
+        try:
+            os.remove(os.path.join(directory, old))
+        except OSError:
+            pass
+
+
+def load_telemetry(path):
+    with np.load(path) as data:
+        fight = {name: data[name] for name in data.files}
+    fight["meta"] = json.loads(str(fight["meta"]))
+    if fight["meta"].get("version") != TELEMETRY_VERSION:
+        raise ValueError(f"Неподдерживаемая версия телеметрии: {fight['meta'].get('version')}")
+    return fight
@@ -0,0 +1,186 @@
+import argparse
+import glob
+import os
+import random
+import sys
+import time
+
+import numpy as np
+
+from telemetry import EVENT_CODES, STATES, TELEMETRY_DIR, load_telemetry
+
+# =================== TELEMETRY ANALYSIS ===================
+# Сводка по тысячам сохранённых боёв (telemetry/*.npz): тепловая карта
+# позиций, гистограмма дистанций попаданий, распределение времени
+# парирования и длины цепочек комбо. Все бои склеиваются в общие столбцы
+# и считаются векторно, без циклов по кадрам.
+# С --generate сначала наигрывает бои HeadlessFight со случайным вводом.
+
+HEATMAP_BINS = (60, 20)
+DISTANCE_BINS = np.arange(0, 161, 10)
+SHADES = " .:-=+*#%@"
+
+
+def load_fights(directory=TELEMETRY_DIR, limit=None):
+    paths = sorted(glob.glob(os.path.join(directory, "fight_*.npz")))
+    if limit:
+        paths = paths[-limit:]
+    return [load_telemetry(path) for path in paths]
+
+
+def column(fights, name):
+    return np.concatenate([f[name] for f in fights]) if fights else np.zeros(0)
+
+
+def events(fights, kind):
+    kinds = column(fights, "ev_kind")
+    mask = kinds == EVENT_CODES[kind]
+    return {name: column(fights, "ev_" + name)[mask] for name in ("frame", "player", "value", "distance", "timing")}
+
+
+def position_heatmap(fights, bins=HEATMAP_BINS):
+    # Обе стороны вместе: где на уровне проходят бои
+    x = np.concatenate([column(fights, "p1_x"), column(fights, "p2_x")])
+    y = np.concatenate([column(fights, "p1_y"), column(fights, "p2_y")])
+    if not len(x):
+        return np.zeros(bins), None, None
+    heat, x_edges, y_edges = np.histogram2d(x, y, bins=bins)
+    return heat, x_edges, y_edges
+
+
+def hit_distances(fights, bins=DISTANCE_BINS):
+    hits = np.concatenate([events(fights, kind)["distance"] for kind in ("hit", "block", "fatality")])
+    return np.histogram(hits, bins=bins)
+
+
+def parry_timings(fights):
+    timing = events(fights, "parry")["timing"]
+    timing = timing[timing >= 0]
+    if not len(timing):
+        return np.zeros(1, np.int64)
+    return np.bincount(timing.astype(np.int64))
+
+
+def combo_lengths(fights):
+    lengths = events(fights, "combo")["value"].astype(np.int64)
+    return np.bincount(lengths) if len(lengths) else np.zeros(1, np.int64)
+
+
+def summary(fights):
+    winners = [f["meta"]["winner"] for f in fights]
+    states = np.concatenate([column(fights, "p1_state"), column(fights, "p2_state")])
+    state_share = np.bincount(states[states < len(STATES)], minlength=len(STATES)) / max(1, len(states))
+    counts = {kind: int((column(fights, "ev_kind") == code).sum()) for kind, code in EVENT_CODES.items()}
+    return {
+        "fights": len(fights),
+        "frames": int(sum(len(f["frame"]) for f in fights)),
+        "p1_wins": winners.count(0),
+        "p2_wins": winners.count(1),
+        "draws": winners.count(None),
+        "events": counts,
+        "states": dict(zip(STATES, state_share.round(3).tolist())),
+    }
+
+
+def draw_heatmap(heat):
+    # Строки сверху вниз — по высоте, столбцы — по x; логарифм, чтобы
+    # кроме земли было видно и платформы
+    if not heat.any():
+        return []
+    scaled = np.log1p(heat) / np.log1p(heat.max())
+    levels = np.minimum((scaled * len(SHADES)).astype(int), len(SHADES) - 1)
+    return ["|" + "".join(SHADES[v] for v in row) + "|" for row in levels.T[::-1]]
+
+
+def draw_histogram(counts, labels, width=40):
+    top = max(1, int(np.max(counts))) if len(counts) else 1
+    return [f"{label:>9} {'#' * int(round(count / top * width)):<{width}} {int(count)}"
+            for label, count in zip(labels, counts)]
+
+
+def save_heatmap_png(heat, path):
+    from PIL import Image
+    scaled = np.log1p(heat) / max(1e-9, np.log1p(heat.max()))
+    pixels = (scaled.T[::-1] * 255).astype(np.uint8)
+    Image.fromarray(pixels).resize((pixels.shape[1] * 8, pixels.shape[0] * 8), Image.NEAREST).save(path)
+
+
+def generate(count, directory, frames_limit=None, seed=1):
+    # Бои без окна со случайным вводом, как в bench.py, с записью телеметрии
+    import main
+    from bench import drive_scripted_input
+    from telemetry import TelemetryRecorder, save_telemetry
+
+    rng = random.Random(seed)
+    fight = main.HeadlessFight(input_buffer_frames=main.INPUT_BUFFER_FRAMES)
+    keys = list(fight.p1.controls.values()) + list(fight.p2.controls.values())
+    for i in range(count):
+        fight.reset()
+        fight.telemetry = TelemetryRecorder(fight, (main.ROUND_TIME + 10) * 60)
+        fight.finished_telemetry = None
+        held = set()
+        frame = 0
+        while fight.step():
+            drive_scripted_input(fight.press, fight.release, held, keys, rng, frame)
+            frame += 1
+            if frames_limit and frame >= frames_limit:
+                fight.end_fight(None)
+        recorder = fight.finished_telemetry
+        save_telemetry(recorder.columns, recorder.meta, os.path.join(directory, f"fight_gen_{seed}_{i:06d}.npz"))
+
+
+def main_cli(argv=None):
+    parser = argparse.ArgumentParser(description="Аналитика телеметрии боёв")
+    parser.add_argument("--dir", default=TELEMETRY_DIR)
+    parser.add_argument("--limit", type=int, help="только последние N боёв")
+    parser.add_argument("--png", help="сохранить тепловую карту позиций в PNG")
+    parser.add_argument("--generate", type=int, default=0, help="сначала наиграть N боёв без окна")
+    parser.add_argument("--generate-frames", type=int, help="обрывать сгенерированные бои после N кадров")
+    args = parser.parse_args(argv)
+
+    if args.generate:
+        started = time.perf_counter()
+        generate(args.generate, args.dir, args.generate_frames)
+        print(f"Сгенерировано боёв: {args.generate} за {time.perf_counter() - started:.1f} с")
+
+    started = time.perf_counter()
+    fights = load_fights(args.dir, args.limit)
+    if not fights:
+        print(f"Нет телеметрии в {args.dir} (включите telemetry=True в game_settings.txt)")
+        return 1
+    loaded = time.perf_counter() - started
+
+    info = summary(fights)
+    heat, x_edges, y_edges = position_heatmap(fights)
+    distance_counts, distance_edges = hit_distances(fights)
+    parry = parry_timings(fights)
+    combos = combo_lengths(fights)
+    elapsed = time.perf_counter() - started
+
+    print(f"Боёв: {info['fights']}, кадров: {info['frames']} (загрузка {loaded:.2f} с, всего {elapsed:.2f} с)")
+    print(f"Победы P1/P2/ничьи: {info['p1_wins']}/{info['p2_wins']}/{info['draws']}")
+    print("События: " + ", ".join(f"{k} {v}" for k, v in info["events"].items()))
+    print("Доля кадров по состояниям: " + ", ".join(f"{k} {v:.1%}" for k, v in info["states"].items() if v))
+
+    if x_edges is not None:
+        print(f"\nТепловая карта позиций: x {x_edges[0]:.0f}..{x_edges[-1]:.0f}, "
+              f"y {y_edges[0]:.0f}..{y_edges[-1]:.0f}")
+        print("\n".join(draw_heatmap(heat)))
+        if args.png:
+            save_heatmap_png(heat, args.png)
+            print(f"PNG: {args.png}")
+
+    print("\nДистанция попаданий (по x между бойцами):")
+    labels = [f"{int(a)}-{int(b)}" for a, b in zip(distance_edges[:-1], distance_edges[1:])]
+    print("\n".join(draw_histogram(distance_counts, labels)))
+
+    print("\nПарирование: через сколько кадров после начала блока")
+    print("\n".join(draw_histogram(parry, [str(i) for i in range(len(parry))])))
+
+    print("\nДлина цепочек комбо")
+    print("\n".join(draw_histogram(combos[2:], [str(i) for i in range(2, len(combos))])))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())